@@ -43,7 +43,7 @@ async function cargarGaleriaPublica() {
     
     try {
         console.log('📡 Cargando imágenes desde:', API_BASE);
-        const response = await fetch(`${API_BASE}/list-images`);
+        const response = await fetch(`${API_BASE}/list-images?estado=publicada,activo&tipo_publicacion=galeria`);
         
         if (!response.ok) {
             throw new Error(`Error HTTP: ${response.status}`);
@@ -91,7 +91,7 @@ function mostrarGaleria(imagenes) {
     container.innerHTML = imagenes.map((imagen, index) => `
         <div class="col-md-6 col-lg-4">
             <div class="card h-100" onclick="abrirModal(${index})">
-                <img src="${imagen.url_imagen}" class="card-img-top" 
+                <img src="${urlMiniatura(imagen)}" class="card-img-top" 
                      alt="${imagen.planta_id || 'Imagen de planta'}"
                      loading="lazy"
                      onerror="this.src='https://via.placeholder.com/400x250/4a7c59/ffffff?text=Imagen+no+disponible'">
@@ -196,6 +196,12 @@ function actualizarModal() {
 }
 
 // ========== UTILIDADES ==========
+// Miniatura generada por el backend (si existe) en lugar del original
+function urlMiniatura(imagen) {
+    const thumb = imagen.variantes && imagen.variantes.thumb;
+    return (thumb && (thumb.webp || thumb.jpeg)) || imagen.url_imagen;
+}
+
 function formatearFecha(fechaString) {
     try {
         const fecha = new Date(fechaString);
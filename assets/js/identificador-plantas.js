@@ -1,12 +1,16 @@
 // assets/js/identificador-plantas.js
 
-// Variables para las API keys (se obtendrán del backend)
-let PLANT_ID_API_KEY = null;
-let DEEPSEEK_API_KEY = null;
+// URL del backend (identifica con PlantNet y guarda la imagen en una sola petición)
+const API_BASE = 'http://localhost:8002';
 
 // Variables globales para almacenar datos de la planta identificada
 let currentPlantData = null;
 let currentPlantImage = null;
+let currentSavedImage = null;
+
+// Clave de idempotencia de la foto seleccionada: los reintentos no duplican la imagen
+let currentUploadKey = null;
+const MAX_REINTENTOS = 3;
 
 // Fuentes confiables para consultar información
 const TRUSTED_SOURCES = [
@@ -47,36 +51,10 @@ const savePlantBtn = document.getElementById('savePlantBtn');
 document.addEventListener('DOMContentLoaded', async function() {
     localStorage.clear();
     
-    // Obtener las API keys del backend antes de inicializar
-    await obtenerApiKeysDelBackend();
-    
     initializeEventListeners();
     console.log('🚀 Identificador de plantas inicializado');
 });
 
-// ========== OBTENER API KEYS DEL BACKEND ==========
-async function obtenerApiKeysDelBackend() {
-    try {
-        const response = await fetch('http://localhost:8002/api/keys');
-        
-        if (!response.ok) {
-            throw new Error('Error al obtener API keys del backend');
-        }
-        
-        const keys = await response.json();
-        
-        // Asignar las API keys obtenidas del backend
-        PLANT_ID_API_KEY = keys.PLANT_ID_API_KEY;
-        DEEPSEEK_API_KEY = keys.DEEPSEEK_API_KEY;
-        
-        console.log('✅ API keys cargadas correctamente desde el backend');
-        
-    } catch (error) {
-        console.error('❌ Error cargando API keys:', error);
-        showError('Error de configuración. Por favor, recarga la página.');
-    }
-}
-
 // ========== EVENT LISTENERS ==========
 function initializeEventListeners() {
     // Eventos para el área de subida
@@ -109,6 +87,11 @@ function handleFileSelect() {
     if (fileInput.files && fileInput.files[0]) {
         const file = fileInput.files[0];
         
+        // Foto nueva = clave nueva (los reintentos de esta foto reutilizan la misma)
+        currentUploadKey = crypto.randomUUID();
+        currentSavedImage = null;
+        currentPlantData = null;
+        
         // Mostrar vista previa
         const reader = new FileReader();
         reader.onload = function(e) {
@@ -137,12 +120,6 @@ async function identifyPlant() {
         return;
     }
     
-    // Verificar que las API keys estén cargadas
-    if (!PLANT_ID_API_KEY) {
-        showError('Error de configuración. Las API keys no están disponibles.');
-        return;
-    }
-    
     // Mostrar indicador de carga
     loading.style.display = 'flex';
     identifyBtn.disabled = true;
@@ -153,28 +130,20 @@ async function identifyPlant() {
     savePlantBtn.style.display = 'none';
     
     try {
-        // 1. Identificar la planta con Plant.id API
-        const plantIdResponse = await fetch('https://my-api.plantnet.org/v2/identify/all?api-key=' + PLANT_ID_API_KEY, {
-            method: 'POST',
-            body: (() => {
-                const formData = new FormData();
-                formData.append('images', fileInput.files[0]);
-                formData.append('organs', 'auto');
-                return formData;
-            })()
-        });
-        
-        const plantIdData = await plantIdResponse.json();
+        // 1. Identificar y guardar la planta en el backend (la imagen se envía una sola vez)
+        const result = await identificarYGuardar(fileInput.files[0]);
+        currentSavedImage = result;
+        const identification = result.identification;
         
-        if (!plantIdResponse.ok) {
-            throw new Error(plantIdData.error || 'Error al identificar la planta');
+        if (!identification.success) {
+            throw new Error(`${identification.error}. La imagen se guardó y se identificará más tarde.`);
         }
         
-        if (!plantIdData.results || plantIdData.results.length === 0) {
-            throw new Error('No se pudo identificar la planta. Intenta con otra imagen más clara.');
+        if (!identification.best_match) {
+            throw new Error('No se pudo identificar la planta. La imagen se guardó sin especie; intenta con otra imagen más clara.');
         }
         
-        const bestMatch = plantIdData.results[0];
+        const bestMatch = identification.best_match;
         currentPlantData = bestMatch;
         const scientificName = bestMatch.species.scientificName || 'Planta desconocida';
         
@@ -196,6 +165,46 @@ async function identifyPlant() {
     }
 }
 
+// Enviar la foto a /identify-and-save, reintentando con la misma Idempotency-Key
+async function identificarYGuardar(file) {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('organ', 'auto');
+    formData.append('nombre_usuario', 'usuario_web');
+    
+    for (let intento = 1; ; intento++) {
+        let response;
+        try {
+            response = await fetch(`${API_BASE}/identify-and-save`, {
+                method: 'POST',
+                headers: { 'Idempotency-Key': currentUploadKey },
+                body: formData
+            });
+        } catch (error) {
+            // Error de red (conexión lenta o cortada): reintentar sin duplicar la imagen
+            if (intento >= MAX_REINTENTOS) throw new Error('No se pudo conectar con el servidor');
+            await esperar(1000 * intento);
+            continue;
+        }
+        
+        // 409: la petición anterior con esta clave sigue en curso
+        if (response.status === 409 && intento < MAX_REINTENTOS) {
+            await esperar(1000 * (parseInt(response.headers.get('Retry-After')) || 2));
+            continue;
+        }
+        
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.detail || 'Error al identificar la planta');
+        }
+        return data;
+    }
+}
+
+function esperar(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
 // Función para obtener descripción de la planta
 async function getPlantDescription(plantName) {
     try {
@@ -294,6 +303,12 @@ async function saveWithoutIdentification() {
         savedPlants.unshift(plantToSave);
         localStorage.setItem('savedPlants', JSON.stringify(savedPlants));
         
+        // Si ya se envió al identificarla, la imagen está guardada: no se sube otra vez
+        if (currentSavedImage) {
+            showSuccess('¡Imagen guardada correctamente en Supabase! La imagen se ha almacenado exitosamente.');
+            return;
+        }
+        
         // Guardar en Supabase usando el endpoint corregido
         const formData = new FormData();
         formData.append('file', fileInput.files[0]);
@@ -301,7 +316,7 @@ async function saveWithoutIdentification() {
         formData.append('nombre_usuario', 'usuario_web');
         formData.append('description', 'Planta sin identificar - guardada desde la galería');
         
-        const response = await fetch('http://localhost:8002/upload', {
+        const response = await fetch(`${API_BASE}/upload`, {
             method: 'POST',
             body: formData
         });
@@ -311,7 +326,7 @@ async function saveWithoutIdentification() {
             throw new Error(errorData.detail || 'Error al guardar en Supabase');
         }
         
-        const result = await response.json();
+        currentSavedImage = await response.json();
         
         // Mostrar mensaje de éxito
         showSuccess('¡Imagen guardada correctamente en Supabase! La imagen se ha almacenado exitosamente.');
@@ -346,6 +361,7 @@ async function savePlant() {
             name: currentPlantData.species.scientificName,
             commonName: currentPlantData.species.commonNames?.[0] || 'Sin nombre común',
             image: currentPlantImage,
+            imageId: currentSavedImage?.image_id,
             dateSaved: new Date().toISOString(),
             probability: currentPlantData.score,
             sources: TRUSTED_SOURCES.map(source => ({
@@ -358,25 +374,11 @@ async function savePlant() {
         savedPlants.unshift(plantToSave);
         localStorage.setItem('savedPlants', JSON.stringify(savedPlants));
         
-        // 2. Guardar en Supabase usando el endpoint corregido
-        const formData = new FormData();
-        formData.append('file', fileInput.files[0]);
-        formData.append('planta_id', currentPlantData.species.scientificName || 'planta-desconocida');
-        formData.append('nombre_usuario', 'usuario_web');
-        formData.append('description', `Planta identificada: ${currentPlantData.species.scientificName}`);
-        
-        const response = await fetch('http://localhost:8002/upload', {
-            method: 'POST',
-            body: formData
-        });
-        
-        if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.detail || 'Error al guardar en Supabase');
+        // 2. La imagen ya quedó guardada en Supabase al identificarla (/identify-and-save)
+        if (!currentSavedImage) {
+            throw new Error('La imagen no se ha guardado en el servidor');
         }
         
-        const result = await response.json();
-        
         // Mostrar mensaje de éxito
         showSuccess('¡Planta guardada correctamente en Supabase! La imagen y los datos se han almacenado exitosamente.');
         
@@ -431,4 +433,6 @@ function resetForm() {
     savePlantBtn.style.display = 'none';
     currentPlantData = null;
     currentPlantImage = null;
+    currentSavedImage = null;
+    currentUploadKey = null;
 }
\ No newline at end of file
@@ -14,7 +14,7 @@ async function cargarUltimasImagenes() {
         </div>`;
     
     try {
-        const response = await fetch('http://localhost:8002/list-images');
+        const response = await fetch('http://localhost:8002/list-images?estado=publicada&limit=3');
         const data = await response.json();
         
         if (data.images && data.images.length > 0) {
@@ -50,7 +50,7 @@ async function cargarNoticias() {
         </div>`;
     
     try {
-        const response = await fetch('http://localhost:8002/list-images');
+        const response = await fetch('http://localhost:8002/list-images?estado=publicada&tipo_publicacion=noticias');
         const data = await response.json();
         
         if (data.images && data.images.length > 0) {
@@ -97,20 +97,24 @@ async function login() {
     try {
         console.log('🔐 Intentando login para usuario:', username);
         
-        // Llamar función RPC de Supabase para verificar credenciales
-        const { data, error } = await supabaseClient.rpc('verify_password', {
-            p_username: username,
-            p_password: password
+        // Verificar credenciales en el backend y obtener token JWT
+        const formData = new FormData();
+        formData.append('nombre_usuario', username);
+        formData.append('contraseña', password);
+
+        const response = await fetch('http://localhost:8002/login', {
+            method: 'POST',
+            body: formData
         });
+        const data = await response.json();
 
-        console.log('📨 Respuesta del servidor:', data, 'Error:', error);
-
-        if (error) {
-            console.error('❌ Error en RPC:', error);
-            throw new Error('Error del servidor: ' + error.message);
+        if (response.status === 429) {
+            throw new Error(data.detail || 'Demasiados intentos, espere un momento');
         }
 
-        if (data === true) {
+        if (response.ok && data.access_token) {
+            // El panel de administración envía este token en cada petición
+            sessionStorage.setItem('admin_token', data.access_token);
             console.log('✅ Login exitoso! Redirigiendo...');
             messageDiv.innerHTML = '<div class="success">✓ Login exitoso</div>';
             
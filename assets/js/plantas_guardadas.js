@@ -20,11 +20,23 @@ const API_BASE = 'http://localhost:8002';
 let todasLasImagenes = [];
 let todosLosSuscriptores = [];
 
+/**
+ * Cabecera Authorization con el token JWT obtenido en el login
+ */
+function authHeaders() {
+    const token = sessionStorage.getItem('admin_token');
+    return token ? { 'Authorization': `Bearer ${token}` } : {};
+}
+
 // =============================================
 // INICIALIZACIÓN - CUANDO EL DOM ESTÉ LISTO
 // =============================================
 document.addEventListener('DOMContentLoaded', function() {
     console.log('🚀 Inicializando Panel de Administración...');
+    if (!sessionStorage.getItem('admin_token')) {
+        window.location.href = 'login.html';
+        return;
+    }
     inicializarEventListeners();
     cargarImagenes();
     cargarSuscriptores(); // 🆕 Cargar suscriptores desde Supabase
@@ -60,16 +72,26 @@ function inicializarEventListeners() {
  */
 async function cargarSuscriptores() {
     try {
-        const response = await fetch(`${API_BASE}/suscriptores`);
-        
-        if (!response.ok) {
-            throw new Error(`Error ${response.status}: ${response.statusText}`);
-        }
-        
-        const data = await response.json();
+        // La API devuelve páginas: se recorren con next_cursor
+        let suscriptores = [];
+        let cursor = null;
+        let data;
+        do {
+            const url = cursor === null ? `${API_BASE}/suscriptores` : `${API_BASE}/suscriptores?cursor=${cursor}`;
+            const response = await fetch(url, { headers: authHeaders() });
+            
+            if (!response.ok) {
+                throw new Error(`Error ${response.status}: ${response.statusText}`);
+            }
+            
+            data = await response.json();
+            if (!data.success) break;
+            suscriptores = suscriptores.concat(data.suscriptores);
+            cursor = data.next_cursor;
+        } while (cursor !== null && cursor !== undefined);
         
         if (data.success) {
-            todosLosSuscriptores = data.suscriptores;
+            todosLosSuscriptores = suscriptores;
             console.log(`📧 Suscriptores cargados: ${todosLosSuscriptores.length}`);
             actualizarContadorSuscriptores();
         } else {
@@ -191,7 +213,8 @@ async function eliminarSuscriptor(suscriptorId, nombre) {
 
     try {
         const response = await fetch(`${API_BASE}/eliminar-suscriptor/${suscriptorId}`, {
-            method: 'DELETE'
+            method: 'DELETE',
+            headers: authHeaders()
         });
         
         if (!response.ok) {
@@ -243,7 +266,8 @@ async function eliminarTodosSuscriptores() {
         for (const suscriptor of suscriptoresActivos) {
             try {
                 const response = await fetch(`${API_BASE}/eliminar-suscriptor/${suscriptor.id}`, {
-                    method: 'DELETE'
+                    method: 'DELETE',
+                    headers: authHeaders()
                 });
                 
                 if (response.ok) {
@@ -285,7 +309,9 @@ async function eliminarTodosSuscriptores() {
 // =============================================
 
 /**
- * Envía notificaciones por email a todos los suscriptores
+ * Envía una notificación por email a todos los suscriptores activos.
+ * El backend la encola y la envía por SMTP (las noticias publicadas se
+ * notifican automáticamente al publicarse).
  */
 async function enviarNotificacionATodos() {
     const suscriptoresActivos = todosLosSuscriptores.filter(s => s.activo !== false);
@@ -295,46 +321,28 @@ async function enviarNotificacionATodos() {
         return;
     }
 
-    console.log("📧 Enviando notificaciones a suscriptores:", suscriptoresActivos);
-
     if (!confirm(`¿Enviar notificación a ${suscriptoresActivos.length} suscriptores activos?`)) return;
 
-    let exitosos = 0;
-    let fallidos = 0;
-    const progressToast = mostrarProgresoNotificacion(suscriptoresActivos.length);
-
-    for (const [index, suscriptor] of suscriptoresActivos.entries()) {
-        try {
-            console.log(`📧 Enviando a: ${suscriptor.email}`);
-            
-            const params = {
-                to_name: suscriptor.nombre,
-                to_email: suscriptor.email,
-                from_name: "Cuenca Ubaté",
-                email: "cuencaubate@gmail.com",
-                message: "🌿 ¡Nueva publicación! Se ha agregado nuevo contenido a la App Web de la Cuenca Alta del Río Ubaté. Visita nuestra galería para descubrir las últimas plantas identificadas y actualizaciones sobre nuestra biodiversidad.",
-                date: new Date().toLocaleDateString('es-ES')
-            };
-
-            const result = await emailjs.send("service_y08wpag", "template_oh29c2d", params);
-            console.log(`✅ Éxito enviando a ${suscriptor.email}`);
-            exitosos++;
-            
-            actualizarProgresoNotificacion(progressToast, index + 1, suscriptoresActivos.length);
-            await new Promise(resolve => setTimeout(resolve, 800));
-            
-        } catch (error) {
-            console.error(`❌ Error enviando a ${suscriptor.email}:`, error);
-            fallidos++;
+    try {
+        const response = await fetch(`${API_BASE}/admin/notificaciones`, {
+            method: 'POST',
+            headers: { ...authHeaders(), 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                asunto: '🌿 ¡Nueva publicación en la Cuenca Ubaté!',
+                mensaje: '🌿 ¡Nueva publicación! Se ha agregado nuevo contenido a la App Web de la Cuenca Alta del Río Ubaté. Visita nuestra galería para descubrir las últimas plantas identificadas y actualizaciones sobre nuestra biodiversidad.'
+            })
+        });
+        
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            throw new Error(errorData.detail || `Error ${response.status}: ${response.statusText}`);
         }
+        
+        mostrarMensaje(`Notificación en cola para ${suscriptoresActivos.length} suscriptores. Se enviará en segundo plano.`, 'success');
+    } catch (error) {
+        console.error('❌ Error encolando notificación:', error);
+        mostrarMensaje('Error al enviar notificación: ' + error.message, 'error');
     }
-
-    cerrarProgresoNotificacion(progressToast);
-    
-    mostrarMensaje(
-        `Notificaciones enviadas: ${exitosos} exitosas, ${fallidos} fallidas`,
-        exitosos > 0 ? 'success' : 'error'
-    );
 }
 
 // =============================================
@@ -390,6 +398,14 @@ function generarUrlPlaceholder(imagen) {
     return `https://via.placeholder.com/400x200/${color}/ffffff?text=${encodeURIComponent(nombrePlanta)}`;
 }
 
+/**
+ * Devuelve la miniatura generada por el backend, o el original si no existe
+ */
+function urlMiniatura(imagen) {
+    const thumb = imagen.variantes && imagen.variantes.thumb;
+    return (thumb && (thumb.webp || thumb.jpeg)) || imagen.url_imagen;
+}
+
 /**
  * Actualiza las estadísticas en el dashboard
  */
@@ -454,7 +470,13 @@ function mostrarImagenes(imagenes) {
                     ${getTipoPublicacionTexto(imagen.tipo_publicacion)}
                 </span>
                 
-                <img src="${imagen.url_imagen}" class="image-preview w-100" 
+                <!-- Posible duplicado de otra imagen ya guardada (hash perceptual) -->
+                ${imagen.duplicado_de ? `
+                <span class="badge badge-estado bg-warning text-dark" style="top: 80px;" title="Casi igual a la imagen #${imagen.duplicado_de}">
+                    <i class="fas fa-clone"></i> Posible duplicado
+                </span>` : ''}
+                
+                <img src="${urlMiniatura(imagen)}" class="image-preview w-100" 
                      alt="${imagen.planta_id || 'Imagen de planta'}"
                      onerror="this.src='https://via.placeholder.com/400x200/4a7c59/ffffff?text=Imagen+no+disponible'">
                 <div class="card-body">
@@ -554,7 +576,8 @@ async function cambiarEstado(imageId, nuevoEstado) {
 
     try {
         const response = await fetch(`${API_BASE}/cambiar-estado/${imageId}?nuevo_estado=${nuevoEstado}`, {
-            method: 'PUT'
+            method: 'PUT',
+            headers: authHeaders()
         });
         
         if (!response.ok) {
@@ -567,8 +590,9 @@ async function cambiarEstado(imageId, nuevoEstado) {
             mostrarMensaje(`Estado cambiado a ${getEstadoTexto(nuevoEstado)}`, 'success');
             cargarImagenes();
             
-            // Ofrecer enviar notificación si se publica
-            if (nuevoEstado === 'publicada') {
+            // Ofrecer enviar notificación si se publica (las noticias se notifican solas en el backend)
+            const imagen = todasLasImagenes.find(img => img.id === imageId);
+            if (nuevoEstado === 'publicada' && imagen?.tipo_publicacion !== 'noticias') {
                 setTimeout(() => {
                     if (confirm('¿Quieres enviar una notificación a todos los suscriptores sobre esta nueva publicación?')) {
                         enviarNotificacionATodos();
@@ -644,7 +668,7 @@ async function guardarEdicion() {
 
         console.log('🔧 URL de edición:', url);
 
-        const response = await fetch(url, { method: 'PUT' });
+        const response = await fetch(url, { method: 'PUT', headers: authHeaders() });
         
         if (!response.ok) {
             const errorText = await response.text();
@@ -674,7 +698,7 @@ async function eliminarImagen(id) {
     if (!confirm('¿Eliminar esta imagen permanentemente?')) return;
 
     try {
-        const response = await fetch(`${API_BASE}/delete-image/${id}`, {method: 'DELETE'});
+        const response = await fetch(`${API_BASE}/delete-image/${id}`, {method: 'DELETE', headers: authHeaders()});
         
         if (!response.ok) {
             throw new Error(`Error ${response.status}: ${response.statusText}`);
@@ -798,52 +822,4 @@ function mostrarMensaje(mensaje, tipo) {
             toast.parentNode.removeChild(toast);
         }
     }, 5000);
-}
-
-/**
- * Muestra la barra de progreso para notificaciones
- * @param {number} total - Total de notificaciones a enviar
- * @returns {HTMLElement} Elemento toast del progreso
- */
-function mostrarProgresoNotificacion(total) {
-    const toast = document.createElement('div');
-    toast.className = 'alert alert-info alert-dismissible fade show position-fixed';
-    toast.style.cssText = 'top: 20px; right: 20px; z-index: 1050; min-width: 350px;';
-    toast.innerHTML = `
-        <h6><i class="fas fa-paper-plane me-2"></i>Enviando Notificaciones</h6>
-        <div class="progress mt-2" style="height: 10px;">
-            <div class="progress-bar progress-bar-striped progress-bar-animated" id="notificacionProgress" style="width: 0%"></div>
-        </div>
-        <div class="mt-2 small" id="notificacionContador">0/${total} enviados</div>
-    `;
-    
-    document.body.appendChild(toast);
-    return toast;
-}
-
-/**
- * Actualiza la barra de progreso de notificaciones
- * @param {HTMLElement} toast - Elemento toast del progreso
- * @param {number} actual - Número actual de notificaciones enviadas
- * @param {number} total - Total de notificaciones a enviar
- */
-function actualizarProgresoNotificacion(toast, actual, total) {
-    const progressBar = toast.querySelector('#notificacionProgress');
-    const contador = toast.querySelector('#notificacionContador');
-    const porcentaje = (actual / total) * 100;
-    
-    progressBar.style.width = `${porcentaje}%`;
-    contador.textContent = `${actual}/${total} enviados`;
-}
-
-/**
- * Cierra la barra de progreso de notificaciones
- * @param {HTMLElement} toast - Elemento toast del progreso
- */
-function cerrarProgresoNotificacion(toast) {
-    setTimeout(() => {
-        if (toast.parentNode) {
-            toast.parentNode.removeChild(toast);
-        }
-    }, 2000);
 }
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+🔢 Relleno de la columna `phash` para imágenes antiguas
+
+Descarga del almacenamiento las imágenes sin hash perceptual, calcula el dHash
+en un pool de procesos y actualiza `imagenes`. Las descargas y las
+actualizaciones van en paralelo (hilos) con un máximo de `--concurrency`
+imágenes en curso. Se puede interrumpir y volver a lanzar: solo procesa
+filas con `phash` vacío. Al terminar, POST /admin/schema/refresh hace que la
+API en marcha recargue sus índices con los hashes nuevos.
+
+Uso (desde backend/, con las mismas variables de entorno que la API):
+    python backfill_phash.py --concurrency 16 --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+from supabase import ClientOptions, create_client
+
+from db import DB_TIMEOUT
+from logging_config import configure_logging
+from perceptual_hash import dhash_bytes, to_hex
+from storage import create_storage
+
+BUCKET_NAME = "images"
+
+logger = logging.getLogger("backfill_phash")
+
+
+def pending_rows(client, after_id: int, page_size: int) -> list:
+    """Siguiente página de imágenes sin hash, en orden de id"""
+    response = (
+        client.table("imagenes")
+        .select("id,filename")
+        .is_("phash", "null")
+        .gt("id", after_id)
+        .order("id")
+        .limit(page_size)
+        .execute()
+    )
+    return response.data
+
+
+async def backfill(
+    client,
+    storage,
+    concurrency: int = 8,
+    workers: Optional[int] = None,
+    page_size: int = 500,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+) -> dict:
+    """Procesa todas las filas pendientes; devuelve los contadores"""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"hashed": 0, "failed": 0}
+    start = time.perf_counter()
+
+    async def process(row: dict, pool: ProcessPoolExecutor):
+        async with semaphore:
+            try:
+                content = await asyncio.to_thread(storage.download, f"public/{row['filename']}")
+                value = to_hex(await loop.run_in_executor(pool, dhash_bytes, content))
+                if not dry_run:
+                    await asyncio.to_thread(
+                        lambda: client.table("imagenes").update({"phash": value}).eq("id", row["id"]).execute()
+                    )
+                counts["hashed"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                logger.warning("No se pudo calcular el hash", extra={"image_id": row["id"], "error": str(e)})
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        after_id = 0
+        seen = 0
+        while limit is None or seen < limit:
+            size = page_size if limit is None else min(page_size, limit - seen)
+            rows = await asyncio.to_thread(pending_rows, client, after_id, size)
+            if not rows:
+                break
+            after_id = rows[-1]["id"]
+            seen += len(rows)
+            await asyncio.gather(*(process(row, pool) for row in rows))
+            logger.info("Página procesada", extra={"last_id": after_id, **counts})
+
+    counts["seconds"] = round(time.perf_counter() - start, 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula el phash de las imágenes que aún no lo tienen")
+    parser.add_argument("--concurrency", type=int, default=8, help="Imágenes descargándose a la vez")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para calcular hashes (por defecto, CPUs)")
+    parser.add_argument("--page-size", type=int, default=500, help="Filas por consulta")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de imágenes a procesar")
+    parser.add_argument("--dry-run", action="store_true", help="Calcular sin escribir en la base de datos")
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_logging()
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise SystemExit("Supabase no configurado - variables faltantes")
+    client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=DB_TIMEOUT))
+    storage = create_storage(client, BUCKET_NAME)
+
+    counts = asyncio.run(backfill(
+        client, storage,
+        concurrency=args.concurrency,
+        workers=args.workers,
+        page_size=args.page_size,
+        limit=args.limit,
+        dry_run=args.dry_run,
+    ))
+    logger.info("Relleno de phash terminado", extra=counts)
+
+
+if __name__ == "__main__":
+    main()
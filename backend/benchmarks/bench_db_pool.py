@@ -0,0 +1,72 @@
+"""
+🗄️ Prueba de carga: escalado con la concurrencia de la capa de datos (db.Database)
+
+Lanza consultas concurrentes a `imagenes` contra un PostgREST local con
+latencia simulada y compara:
+- antes: el cliente síncrono llamado directamente desde el event loop
+  (las consultas se ejecutan de una en una)
+- ahora: Database.execute con pools de distinto tamaño
+Muestra consultas por segundo y p50/p99 del histograma de la capa de datos.
+
+Uso (desde backend/):
+    python benchmarks/bench_db_pool.py --queries 400 --concurrency 50 --db-latency 0.02
+"""
+import argparse
+import asyncio
+import time
+
+from postgrest_standin import PostgrestStandIn
+
+from db import Database
+
+ROWS = [{"id": i, "estado": "publicada", "planta_id": f"especie-{i % 50}"} for i in range(1, 201)]
+
+
+async def run_concurrently(call, queries: int, concurrency: int) -> float:
+    remaining = iter(range(queries))
+
+    async def worker():
+        for _ in remaining:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return queries / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--db-latency", type=float, default=0.02, help="Segundos por consulta en el servidor")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 4, 10, 20])
+    args = parser.parse_args()
+
+    with PostgrestStandIn({"imagenes": ROWS}, latency=args.db_latency) as server:
+        client = server.client()
+        query = lambda: client.table("imagenes").select("id,planta_id").eq("estado", "publicada").limit(20)
+        print(f"{args.queries} consultas, {args.concurrency} concurrentes, "
+              f"{args.db_latency * 1000:g} ms de latencia por consulta")
+        print(f"{'modo':<32}{'consultas/s':>12}{'p50 ms':>9}{'p99 ms':>9}")
+
+        async def blocking():
+            query().execute()  # bloquea el event loop, como antes de la capa de datos
+
+        rate = asyncio.run(run_concurrently(blocking, args.queries, args.concurrency))
+        print(f"{'antes (síncrono en el loop)':<32}{rate:>12,.0f}{'-':>9}{'-':>9}")
+
+        for pool_size in args.pool_sizes:
+            db = Database(pool_size=pool_size)
+
+            async def pooled():
+                await db.execute("imagenes.select", query())
+
+            rate = asyncio.run(run_concurrently(pooled, args.queries, args.concurrency))
+            stats = db.stats()["operations"]["imagenes.select"]
+            db.close()
+            print(f"{f'Database(pool_size={pool_size})':<32}{rate:>12,.0f}"
+                  f"{stats['p50_ms']:>9g}{stats['p99_ms']:>9g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+📋 Benchmark: filtros en la base de datos frente a `select("*")` + filtrado en Python
+
+Mide bytes transferidos y latencia de /map-images y /imagenes-noticias con
+10k y 100k filas en `imagenes`, contra un PostgREST local (postgrest_standin).
+- antes: select("*") de toda la tabla y filtro en una comprensión de listas
+- ahora: select_images() con filtros (y proyección opcional) en la consulta
+
+Uso (desde backend/):
+    python benchmarks/bench_image_queries.py --rows 10000 100000 --repeat 5
+"""
+import argparse
+import random
+import statistics
+import time
+
+from postgrest_standin import PostgrestStandIn
+
+from image_queries import select_images
+from thumbnails import VARIANT_FORMATS, VARIANT_SIZES, variant_path
+
+MAP_FIELDS = "id,planta_id,url_imagen,lat,lng"
+PUBLIC_URL = "https://example.supabase.co/storage/v1/object/public/images"
+
+
+def make_rows(count: int, seed: int = 1) -> list:
+    """
+    Filas con las columnas reales de `imagenes` (las que escribe registrar_imagen
+    y el trabajo de variantes): ~30% publicadas, ~40% con coordenadas,
+    ~5% noticias (el resto `galeria`), ~60% con descripción
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, count + 1):
+        geotagged = rng.random() < 0.4
+        filename = f"{i:08x}-foto.jpg"
+        rows.append({
+            "id": i,
+            "filename": filename,
+            "nombre_usuario": f"usuario{rng.randrange(500)}",
+            "planta_id": f"especie-{rng.randrange(2000)}",
+            "url_imagen": f"{PUBLIC_URL}/public/{filename}",
+            "estado": "publicada" if rng.random() < 0.3 else "pendiente",
+            "fecha_subida": f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}T10:00:{i % 60:02d}",
+            "lat": 5.3 + rng.random() * 0.2 if geotagged else None,
+            "lng": -73.8 + rng.random() * 0.2 if geotagged else None,
+            "tipo_publicacion": "noticias" if rng.random() < 0.05 else "galeria",
+            "description": "Observación de campo en la cuenca alta del río Ubaté " * 2 if rng.random() < 0.6 else None,
+            "variantes": {
+                variant: {fmt: f"{PUBLIC_URL}/{variant_path(filename, variant, fmt)}" for fmt in VARIANT_FORMATS}
+                for variant in VARIANT_SIZES
+            },
+            "phash": f"{rng.getrandbits(64):016x}",
+            "duplicado_de": None,
+        })
+    return rows
+
+
+def legacy_map(client):
+    rows = client.table("imagenes").select("*").execute().data
+    return [r for r in rows if r.get("lat") is not None and r.get("lng") is not None and r.get("estado") == "publicada"]
+
+
+def legacy_noticias(client):
+    rows = client.table("imagenes").select("*").execute().data
+    return [r for r in rows if r.get("tipo_publicacion") == "noticias" and r.get("estado") == "publicada"]
+
+
+CASES = [
+    ("map-images  antes (select * + Python)", legacy_map),
+    ("map-images  ahora (filtros en BD)", lambda c: select_images(c, estado="publicada", with_coordinates=True)[0]),
+    ("map-images  ahora + fields", lambda c: select_images(c, fields=MAP_FIELDS, estado="publicada", with_coordinates=True)[0]),
+    ("noticias    antes (select * + Python)", legacy_noticias),
+    ("noticias    ahora (filtros en BD)", lambda c: select_images(c, estado="publicada", tipo_publicacion="noticias")[0]),
+]
+
+
+def run(rows: int, repeat: int):
+    with PostgrestStandIn({"imagenes": make_rows(rows)}) as server:
+        client = server.client()
+        print(f"\n{rows:,} filas")
+        print(f"{'caso':<40}{'filas':>8}{'KB/petición':>14}{'p50 ms':>10}{'máx ms':>10}")
+        for name, case in CASES:
+            case(client)  # calentamiento
+            server.reset_counters()
+            latencies = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = case(client)
+                latencies.append((time.perf_counter() - start) * 1000)
+            kb = server.bytes_sent / server.requests / 1024
+            print(f"{name:<40}{len(result):>8}{kb:>14,.0f}{statistics.median(latencies):>10.1f}{max(latencies):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
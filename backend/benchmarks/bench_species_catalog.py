@@ -0,0 +1,81 @@
+"""
+🌿 Benchmark: catálogo de especies (GET /plantas y autocompletado por prefijo)
+
+Compara, con 10k y 100k imágenes:
+- antes: recorrer todas las filas `planta_id` y deduplicar con set() en cada petición
+  (sin contar la descarga de la columna desde la base de datos, que también se pagaba)
+- ahora: SpeciesCatalog en memoria (lista completa y búsqueda por prefijo con bisect)
+También mide la carga inicial y el coste de una actualización incremental.
+
+Uso (desde backend/):
+    python benchmarks/bench_species_catalog.py --rows 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from species_catalog import SpeciesCatalog  # noqa: E402
+
+GENERA = ["Espeletia", "Quercus", "Weinmannia", "Miconia", "Hypericum", "Puya", "Clusia",
+          "Baccharis", "Vaccinium", "Gaultheria", "Pentacalia", "Diplostephium"]
+
+
+def make_rows(count: int, species: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    names = [f"{GENERA[i % len(GENERA)]} sp{i}" for i in range(species)]
+    return [{
+        "id": i,
+        "planta_id": rng.choice(names),
+        "estado": "publicada" if rng.random() < 0.3 else "pendiente",
+        "fecha_subida": f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+    } for i in range(1, count + 1)]
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def run(rows_count: int, species: int):
+    rows = make_rows(rows_count, species)
+    catalog = SpeciesCatalog()
+    load_ms = min(timeit.repeat(lambda: catalog.load(rows), number=1, repeat=3)) * 1000
+
+    def legacy_list():
+        return sorted(set(r["planta_id"] for r in rows if r.get("planta_id")))
+
+    def legacy_prefix(prefix="esp"):
+        return [n for n in legacy_list() if n.lower().startswith(prefix)][:10]
+
+    row = dict(rows[0])
+    def incremental():
+        row["estado"] = "publicada" if row["estado"] == "pendiente" else "pendiente"
+        catalog.upsert(row)
+
+    print(f"\n{rows_count:,} imágenes, {species:,} especies (carga inicial {load_ms:.1f} ms)")
+    print(f"{'caso':<46}{'µs/llamada':>12}")
+    for name, func, number in [
+        ("lista completa  antes (set sobre filas)", legacy_list, 5),
+        ("lista completa  ahora (catálogo)", catalog.species, 20),
+        ("prefijo 'esp'   antes (set + startswith)", legacy_prefix, 5),
+        ("prefijo 'esp'   ahora (bisect, limit=10)", lambda: catalog.species("esp", limit=10), 5000),
+        ("prefijo 'quercus sp1' ahora (bisect)", lambda: catalog.species("quercus sp1", limit=10), 5000),
+        ("actualización incremental (upsert)", incremental, 5000),
+    ]:
+        print(f"{name:<46}{per_call_us(func, number):>12,.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--species", type=int, default=1500, help="Especies distintas")
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.species)
+
+
+if __name__ == "__main__":
+    main()
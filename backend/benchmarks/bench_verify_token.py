@@ -0,0 +1,66 @@
+"""
+🔐 Benchmark: GET /verify-token con y sin caché de administradores
+
+Lanza peticiones concurrentes a /verify-token (ASGI en proceso, sin red) con
+`usuarios_administradores` servida por un PostgREST local con latencia
+simulada (--db-latency). Sin caché cada verificación consulta la base de
+datos; con caché solo la primera de cada admin dentro del TTL.
+
+Uso (desde backend/):
+    python benchmarks/bench_verify_token.py --requests 2000 --concurrency 50 --db-latency 0.005
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from postgrest_standin import PostgrestStandIn
+
+async def hammer(app, token: str, requests: int, concurrency: int) -> float:
+    """Peticiones por segundo con `concurrency` clientes simultáneos"""
+    remaining = iter(range(requests))
+
+    async def client_loop(client: httpx.AsyncClient):
+        for _ in remaining:
+            response = await client.get("/verify-token", params={"token": token})
+            assert response.status_code == 200, response.text
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Segundos por consulta a la base de datos")
+    args = parser.parse_args()
+
+    # La API guarda colas SQLite en el directorio actual: se usa uno temporal
+    os.chdir(tempfile.mkdtemp(prefix="bench-verify-"))
+    os.environ.update(STORAGE_BACKEND="local", LOG_LEVEL="ERROR")
+    os.environ.pop("SUPABASE_URL", None)
+    import main as api
+    from principal_cache import PrincipalCache
+
+    admins = [{"id": 1, "nombre de usuario": "admin"}]
+    with PostgrestStandIn({"usuarios_administradores": admins}, latency=args.db_latency) as server:
+        api.usar_supabase(server.client())
+        token = api.create_access_token({"sub": "admin", "id": 1})
+        print(f"{args.requests} peticiones, {args.concurrency} concurrentes, "
+              f"{args.db_latency * 1000:g} ms por consulta (pool de BD: {api.db.pool_size} hilos)")
+        for name, cache in (("sin caché (TTL 0)", PrincipalCache(ttl=0)), ("con caché", PrincipalCache())):
+            api.principal_cache = cache
+            server.reset_counters()
+            rate = asyncio.run(hammer(api.app, token, args.requests, args.concurrency))
+            print(f"{name:<20}{rate:>10,.0f} verificaciones/s   consultas a la BD: {server.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+🧪 Servidor local que imita a PostgREST para los benchmarks
+
+Implementa lo que usa la API sobre `GET /rest/v1/<tabla>`: `select=`, filtros
+`eq`, `neq`, `in`, `is`, `not.is`, `lt`, `gt`, `lte`, `gte`, `order=` (NULLs
+primero en DESC, como PostgreSQL) y `limit=`. Las filas viven en memoria; la
+latencia de cada petición se puede simular con `latency` (sin bloquear el
+servidor). Cuenta los bytes de respuesta para medir la transferencia.
+
+Uso:
+    with PostgrestStandIn({"imagenes": rows}, latency=0.02) as server:
+        client = server.client()   # cliente de supabase-py apuntando al servidor
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset"}
+
+
+def _coerce(raw: str, sample):
+    if isinstance(sample, bool):
+        return raw == "true"
+    if isinstance(sample, (int, float)):
+        return float(raw)
+    return raw
+
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition(".")
+    value = row.get(column)
+    if op == "is":
+        result = value is None if raw == "null" else value is (raw == "true")
+    elif op == "in":
+        result = str(value) in raw.strip("()").split(",")
+    elif value is None:
+        result = False
+    elif op == "eq":
+        result = value == _coerce(raw, value)
+    elif op == "neq":
+        result = value != _coerce(raw, value)
+    else:
+        target = _coerce(raw.strip('"'), value)
+        result = {"lt": value < target, "gt": value > target,
+                  "lte": value <= target, "gte": value >= target}[op]
+    return result != negate
+
+
+def _sort(rows: List[dict], order: str) -> List[dict]:
+    """Orden estable columna a columna; reverse=True deja los NULL primero (DESC NULLS FIRST)"""
+    for part in reversed(order.split(",")):
+        column, _, direction = part.partition(".")
+        rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)),
+                      reverse=direction.startswith("desc"))
+    return rows
+
+
+class PostgrestStandIn:
+    """PostgREST mínimo en un hilo con su propio event loop"""
+
+    def __init__(self, tables: Dict[str, List[dict]], latency: float = 0.0):
+        self.tables = tables
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self.url = ""
+
+    async def _handle(self, request: Request) -> Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        rows = self.tables.get(request.path_params["table"], [])
+        params = request.query_params
+        for column, expression in params.multi_items():
+            if column not in RESERVED_PARAMS:
+                rows = [row for row in rows if _matches(row, column, expression)]
+        if "order" in params:
+            rows = _sort(rows, params["order"])
+        if "limit" in params:
+            rows = rows[int(params.get("offset", 0)):][:int(params["limit"])]
+        select = params.get("select", "*")
+        if select != "*":
+            columns = select.split(",")
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        body = json.dumps(rows, default=str).encode()
+        self.requests += 1
+        self.bytes_sent += len(body)
+        return Response(body, media_type="application/json")
+
+    def reset_counters(self):
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def client(self, timeout: float = 30):
+        from supabase import ClientOptions, create_client
+        return create_client(self.url, "standin.key.bench", options=ClientOptions(postgrest_client_timeout=timeout))
+
+    def __enter__(self) -> "PostgrestStandIn":
+        app = Starlette(routes=[Route("/rest/v1/{table}", self._handle)])
+        sock = socket.socket()
+        # Sin esto, Nagle + ACK retardado añaden ~40 ms a cada respuesta en loopback
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.bind(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        config = uvicorn.Config(app, log_level="error", access_log=False, backlog=2048)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [sock]}, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
@@ -0,0 +1,81 @@
+"""
+⏱️ Presupuesto de arranque en frío
+
+Importa la API en un proceso nuevo, arranca el lifespan y hace la primera
+petición (/health/live) con Supabase apuntando a un puerto que no responde:
+así se comprueba que ni la importación ni el arranque esperan a la red.
+Cada ejecución usa una carpeta temporal (colas SQLite, media, spool) para no
+tocar los datos de la API. Sale con código 1 si alguna fase supera el
+presupuesto en la peor de las ejecuciones.
+
+Uso (desde backend/):
+    python check_startup.py --budget 3 --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = """
+import json, sys
+sys.path.insert(0, {backend!r})
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/health/live")
+print(json.dumps(main.startup_timer.snapshot()))
+"""
+
+
+def measure(budget: float) -> dict:
+    """Un arranque en frío en un proceso nuevo; devuelve las fases en segundos"""
+    env = {
+        **os.environ,
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        "SUPABASE_KEY": "check-startup",
+        "STARTUP_CONNECT_WAIT": "0",
+        "STARTUP_BUDGET_SECONDS": str(budget),
+        "STORAGE_BACKEND": "local",
+        "LOG_LEVEL": "ERROR",
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD.format(backend=BACKEND_DIR)],
+            cwd=workdir, env=env, capture_output=True, text=True, timeout=120,
+        )
+    if result.returncode != 0:
+        raise SystemExit(f"La API no arrancó:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])["phases"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el arranque en frío de la API y lo compara con un presupuesto")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", "3")),
+                        help="Segundos máximos por fase")
+    parser.add_argument("--runs", type=int, default=3, help="Arranques a medir (se toma el peor)")
+    args = parser.parse_args()
+
+    worst: dict = {}
+    for _ in range(args.runs):
+        for phase, seconds in measure(args.budget).items():
+            worst[phase] = max(worst.get(phase, 0.0), seconds)
+
+    over = False
+    for phase in ("import", "ready", "first_request"):
+        seconds = worst.get(phase)
+        if seconds is None:
+            print(f"{phase:<14} sin medir")
+            over = True
+            continue
+        status = "ok" if seconds <= args.budget else "EXCEDIDO"
+        over = over or seconds > args.budget
+        print(f"{phase:<14} {seconds:7.3f} s  (presupuesto {args.budget:g} s)  {status}")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+🔌 Circuit breaker para servicios externos (PlantNet)
+
+- Ventana deslizante por tiempo con el resultado y la duración de cada llamada
+- Se abre si la tasa de errores o de llamadas lentas supera el umbral
+  (con un mínimo de llamadas en la ventana)
+- Abierto: se rechaza al instante durante `open_seconds`
+- Semiabierto: se deja pasar una llamada de prueba; si va bien se cierra,
+  si falla vuelve a abrirse
+- Latencias p50/p95/p99 de la ventana para /health
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_WINDOW_SECONDS = float(os.getenv("PLANTNET_BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("PLANTNET_BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("PLANTNET_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("PLANTNET_BREAKER_SLOW_SECONDS", "10"))
+BREAKER_SLOW_RATE = float(os.getenv("PLANTNET_BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("PLANTNET_BREAKER_OPEN_SECONDS", "30"))
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def _percentile(sorted_values, q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class CircuitBreaker:
+    """Circuit breaker con ventana deslizante de errores y latencia"""
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = BREAKER_WINDOW_SECONDS,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_seconds: float = BREAKER_SLOW_SECONDS,
+        slow_rate: float = BREAKER_SLOW_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        max_samples: int = 1000,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self._calls: Deque[Tuple[float, float, bool]] = deque(maxlen=max_samples)  # (fin, duración, ok)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def retry_after(self) -> float:
+        """Segundos hasta la próxima llamada de prueba"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Reserva permiso para llamar; en semiabierto solo una llamada a la vez"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Devuelve el permiso de allow() sin registrar resultado (llamada cancelada)"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record(self, duration: float, ok: bool):
+        """Registra el resultado de una llamada permitida por allow()"""
+        now = time.monotonic()
+        with self._lock:
+            self._calls.append((now, duration, ok))
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok and duration < self.slow_seconds:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+            if state == CLOSED:
+                self._trim(now)
+                total = len(self._calls)
+                if total < self.min_calls:
+                    return
+                errors = sum(1 for _, _, success in self._calls if not success)
+                slow = sum(1 for _, d, _ in self._calls if d >= self.slow_seconds)
+                if errors / total >= self.error_rate or slow / total >= self.slow_rate:
+                    self._open(now)
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self.times_opened += 1
+
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            self._trim(now)
+            durations = sorted(d for _, d, _ in self._calls)
+            errors = sum(1 for _, _, ok in self._calls if not ok)
+            total = len(self._calls)
+        return {
+            "state": state,
+            "window_seconds": self.window_seconds,
+            "calls": total,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "latency_ms": {
+                "p50": _ms(_percentile(durations, 0.50)),
+                "p95": _ms(_percentile(durations, 0.95)),
+                "p99": _ms(_percentile(durations, 0.99)),
+            },
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
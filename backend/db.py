@@ -0,0 +1,92 @@
+"""
+🗄️ Capa de acceso a datos (Supabase / PostgREST)
+
+- El cliente de supabase-py es síncrono: cada consulta se ejecuta en un pool
+  de hilos acotado para no bloquear el event loop
+- Tiempo máximo por consulta (DB_TIMEOUT); al superarlo se lanza DatabaseTimeout
+- Histograma de latencias por operación (incluye la espera por un hilo libre)
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from metrics import LatencyHistogram, observe_dependency
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+
+
+class DatabaseTimeout(Exception):
+    """La consulta no terminó dentro de DB_TIMEOUT"""
+
+
+class Database:
+    """Ejecuta consultas de supabase-py fuera del event loop, con pool y timeout"""
+
+    def __init__(self, pool_size: int = DB_POOL_SIZE, timeout: float = DB_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # El pool se crea en la primera consulta y close() lo descarta: un nuevo
+        # lifespan en el mismo proceso vuelve a tener hilos
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.timeouts = 0
+
+    async def execute(self, op: str, query) -> Any:
+        """Ejecuta un query builder de supabase-py (sin llamar a .execute())"""
+        return await self.run(op, query.execute)
+
+    async def run(self, op: str, func: Callable, *args, **kwargs) -> Any:
+        """Ejecuta cualquier función síncrona que consulte la base de datos"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self.in_flight += 1
+        error = True
+        try:
+            future = loop.run_in_executor(self._executor(), functools.partial(func, *args, **kwargs))
+            result = await asyncio.wait_for(future, self.timeout)
+            error = False
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise DatabaseTimeout(f"La consulta '{op}' superó {self.timeout:g}s")
+        finally:
+            self.in_flight -= 1
+            self._observe(op, time.perf_counter() - start, error)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="db")
+            return self._pool
+
+    def _observe(self, op: str, seconds: float, error: bool):
+        observe_dependency("supabase", op, seconds, "error" if error else "ok")
+        with self._lock:
+            histogram = self._histograms.get(op)
+            if histogram is None:
+                histogram = self._histograms[op] = LatencyHistogram()
+            histogram.observe(seconds, error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            operations = {op: h.snapshot() for op, h in sorted(self._histograms.items())}
+        return {
+            "pool_size": self.pool_size,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "timeouts": self.timeouts,
+            "operations": operations,
+        }
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
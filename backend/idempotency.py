@@ -0,0 +1,141 @@
+"""
+🔁 Claves de idempotencia (SQLite)
+
+- El cliente envía `Idempotency-Key`; la primera petición con esa clave reserva
+  el registro y la respuesta se guarda al terminar
+- Reintentos con la misma clave devuelven la respuesta guardada sin repetir
+  efectos (filas, objetos en el almacenamiento, trabajos)
+- Mientras la primera petición sigue en curso, los reintentos reciben `in_progress`
+- Si la clave llega con otro contenido (otra foto, otros campos): `mismatch`
+- Una reserva vencida o fallida se puede retomar (`resumed`): el endpoint debe
+  comprobar qué efectos llegaron a aplicarse antes de repetirlos
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+from sqlite_store import SQLiteStore
+
+IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB", "idempotency.db")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Resultados de begin()
+NEW = "new"
+RESUMED = "resumed"
+REPLAY = "replay"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
+
+
+def fingerprint(content: bytes, *fields) -> str:
+    """Huella de la petición: contenido del archivo + campos del formulario"""
+    digest = hashlib.sha256(hashlib.sha256(content).digest())
+    digest.update(json.dumps(fields, default=str).encode())
+    return digest.hexdigest()
+
+
+class IdempotencyStore(SQLiteStore):
+    """Registro clave -> respuesta sobre una tabla SQLite"""
+
+    def __init__(
+        self,
+        db_path: str = IDEMPOTENCY_DB,
+        ttl: float = IDEMPOTENCY_TTL,
+        lease_seconds: float = IDEMPOTENCY_LEASE_SECONDS,
+    ):
+        super().__init__(db_path)
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.replays = 0
+        self.conflicts = 0
+
+    def _create_schema(self, db: sqlite3.Connection):
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS idempotencia (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                status TEXT NOT NULL,
+                status_code INTEGER,
+                response TEXT,
+                updated_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_idempotencia_expires ON idempotencia (expires_at)")
+
+    def begin(self, key: str, request_fingerprint: str) -> Tuple[str, Optional[Tuple[int, dict]]]:
+        """
+        Reserva la clave. Devuelve (estado, respuesta guardada):
+        NEW / RESUMED -> procesar; REPLAY -> (status_code, cuerpo); IN_PROGRESS / MISMATCH -> rechazar
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM idempotencia WHERE expires_at <= ?", (now,))
+                row = self._db.execute(
+                    "SELECT fingerprint, status, status_code, response, updated_at FROM idempotencia WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    state = NEW
+                elif row[0] != request_fingerprint:
+                    state = MISMATCH
+                elif row[1] == "done":
+                    state = REPLAY
+                elif row[1] == "running" and row[4] > now - self.lease_seconds:
+                    state = IN_PROGRESS
+                else:
+                    state = RESUMED  # reserva vencida o intento anterior fallido
+
+                if state in (NEW, RESUMED):
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO idempotencia (key, fingerprint, status, updated_at, expires_at) "
+                        "VALUES (?, ?, 'running', ?, ?)",
+                        (key, request_fingerprint, now, now + self.ttl),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+        if state == REPLAY:
+            self.replays += 1
+            return state, (row[2], json.loads(row[3]))
+        if state in (IN_PROGRESS, MISMATCH):
+            self.conflicts += 1
+        return state, None
+
+    def complete(self, key: str, status_code: int, response: dict):
+        """Guarda la respuesta final de la clave"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE idempotencia SET status = 'done', status_code = ?, response = ?, updated_at = ? WHERE key = ?",
+                (status_code, json.dumps(response, ensure_ascii=False), time.time(), key),
+            )
+
+    def fail(self, key: str):
+        """Marca el intento como fallido: el siguiente reintento lo retoma"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE idempotencia SET status = 'failed', updated_at = ? WHERE key = ? AND status = 'running'",
+                (time.time(), key),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM idempotencia GROUP BY status").fetchall())
+        return {
+            "keys": counts,
+            "replays": self.replays,
+            "conflicts": self.conflicts,
+            "ttl_seconds": self.ttl,
+            "lease_seconds": self.lease_seconds,
+        }
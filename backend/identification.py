@@ -0,0 +1,271 @@
+"""
+🔀 Motores de identificación de plantas
+
+- Interfaz común: `identify(images, organs)` devuelve la respuesta con el formato
+  de PlantNet ({"results": [{"score", "species": {...}}]})
+- PlantNetBackend: la API de PlantNet (límite global de llamadas + circuit breaker)
+- LocalBackend: vecinos más cercanos por hash perceptual sobre nuestras propias
+  imágenes publicadas. Solo reconoce fotos casi iguales a las ya guardadas
+  (mismo ejemplar, mismo sitio), pero responde en milisegundos y sin gastar cuota
+- IdentificationRouter: usa el motor local si tiene confianza alta o si
+  PlantNet no está disponible; en otro caso consulta PlantNet
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from circuit_breaker import OPEN, CircuitBreaker
+from perceptual_hash import HASH_BITS, dhash_bytes, from_hex, hamming
+from plantnet import ImageFile, PlantNetClient, PlantNetError
+
+# Columnas necesarias para construir el índice local
+LOCAL_INDEX_COLUMNS = ("id", "planta_id", "estado", "phash")
+
+LOCAL_MAX_DISTANCE = int(os.getenv("LOCAL_ID_MAX_DISTANCE", "10"))
+LOCAL_NEIGHBOURS = int(os.getenv("LOCAL_ID_NEIGHBOURS", "5"))
+LOCAL_CONFIDENT_SCORE = float(os.getenv("LOCAL_ID_CONFIDENT_SCORE", "0.9"))
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSpeciesIndex:
+    """Hashes perceptuales de las imágenes publicadas con especie conocida"""
+
+    def __init__(self, excluded_species: Iterable[str] = ("planta-desconocida",)):
+        self.loaded = False
+        self.excluded_species = set(excluded_species)
+        self._entries: Dict[int, Tuple[int, str]] = {}  # image_id -> (hash, planta_id)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry(self, row: dict) -> Optional[Tuple[int, str]]:
+        name = row.get("planta_id")
+        value = from_hex(row.get("phash"))
+        if row.get("estado") != "publicada" or not name or name in self.excluded_species or value is None:
+            return None
+        return value, name
+
+    def load(self, rows: Iterable[dict]):
+        with self._lock:
+            self._entries = {}
+            for row in rows:
+                entry = self._entry(row)
+                if entry is not None and row.get("id") is not None:
+                    self._entries[row["id"]] = entry
+            self.loaded = True
+
+    def upsert(self, row: dict):
+        """Alta o cambio de una imagen (sale del índice si deja de estar publicada)"""
+        if not self.loaded or row.get("id") is None:
+            return
+        with self._lock:
+            previous = self._entries.get(row["id"])
+            if "phash" not in row and previous is not None:
+                row = {**row, "phash": f"{previous[0]:016x}"}
+            entry = self._entry(row)
+            if entry is None:
+                self._entries.pop(row["id"], None)
+            else:
+                self._entries[row["id"]] = entry
+
+    def remove(self, image_id: int):
+        with self._lock:
+            self._entries.pop(image_id, None)
+
+    def neighbours(self, value: int, k: int = LOCAL_NEIGHBOURS, max_distance: int = LOCAL_MAX_DISTANCE) -> List[Tuple[int, str, int]]:
+        """Las k imágenes más cercanas: [(distancia, planta_id, image_id)]"""
+        with self._lock:
+            candidates = [
+                (distance, name, image_id)
+                for image_id, (stored, name) in self._entries.items()
+                if (distance := hamming(value, stored)) <= max_distance
+            ]
+        return heapq.nsmallest(k, candidates)
+
+
+class IdentificationBackend:
+    """Interfaz de un motor de identificación"""
+
+    name = ""
+
+    def available(self) -> bool:
+        return True
+
+    async def identify(self, images: Sequence[ImageFile], organs: List[str]) -> dict:
+        raise NotImplementedError
+
+
+class PlantNetBackend(IdentificationBackend):
+    """PlantNet API, bajo el límite global de llamadas y detrás de un circuit breaker"""
+
+    name = "plantnet"
+
+    def __init__(
+        self,
+        client: PlantNetClient,
+        limiter=None,
+        limiter_key: str = "plantnet",
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.client = client
+        self.limiter = limiter
+        self.limiter_key = limiter_key
+        self.breaker = breaker
+
+    def available(self) -> bool:
+        return self.breaker is None or self.breaker.state != OPEN
+
+    async def identify(self, images: Sequence[ImageFile], organs: List[str]) -> dict:
+        if self.limiter is not None:
+            while True:
+                allowed, retry_after = self.limiter.allow(self.limiter_key)
+                if allowed:
+                    break
+                await asyncio.sleep(retry_after)
+        if self.breaker is None:
+            return await self.client.identify(images, organs=organs)
+
+        if not self.breaker.allow():
+            # Fallo inmediato: no se ocupa una conexión esperando a un servicio caído
+            raise PlantNetError(
+                503,
+                "PlantNet no disponible temporalmente (circuito abierto)",
+                retry_after=self.breaker.retry_after(),
+            )
+        start = time.perf_counter()
+        try:
+            result = await self.client.identify(images, organs=organs)
+        except asyncio.CancelledError:
+            # El cliente se desconectó: no dice nada sobre la salud de PlantNet
+            self.breaker.release()
+            raise
+        except PlantNetError as e:
+            # Los 4xx (imagen no válida, etc.) no indican que PlantNet esté degradado
+            self.breaker.record(time.perf_counter() - start, e.status_code != 429 and e.status_code < 500)
+            raise
+        except Exception:
+            self.breaker.record(time.perf_counter() - start, False)
+            raise
+        self.breaker.record(time.perf_counter() - start, True)
+        return result
+
+
+class LocalBackend(IdentificationBackend):
+    """Vecinos más cercanos por hash perceptual (solo CPU, sin red)"""
+
+    name = "local"
+
+    def __init__(self, index: LocalSpeciesIndex, executor: Optional[Callable] = None):
+        self.index = index
+        # Callable que devuelve el executor donde calcular los hashes (None = hilos)
+        self.executor = executor
+
+    def available(self) -> bool:
+        return self.index.loaded and len(self.index) > 0
+
+    async def identify(self, images: Sequence[ImageFile], organs: List[str]) -> dict:
+        loop = asyncio.get_running_loop()
+        executor = self.executor() if self.executor else None
+        hashes = await asyncio.gather(
+            *(loop.run_in_executor(executor, dhash_bytes, content) for _, content, _ in images)
+        )
+        neighbours = [n for value in hashes for n in self.index.neighbours(value)]
+        return {"results": self._score(neighbours)}
+
+    @staticmethod
+    def _score(neighbours: List[Tuple[int, str, int]]) -> List[dict]:
+        """
+        score = proporción de vecinos de la especie (ponderada por cercanía)
+                × cercanía del vecino más próximo de esa especie
+        """
+        if not neighbours:
+            return []
+        weights: Counter = Counter()
+        closest: Dict[str, int] = {}
+        matches: Dict[str, List[int]] = {}
+        for distance, name, image_id in neighbours:
+            weights[name] += 1 - distance / HASH_BITS
+            closest[name] = min(closest.get(name, HASH_BITS), distance)
+            matches.setdefault(name, []).append(image_id)
+        total = sum(weights.values())
+        results = [
+            {
+                "score": round(weight / total * (1 - closest[name] / HASH_BITS), 4),
+                "species": {
+                    "scientificNameWithoutAuthor": name,
+                    "scientificName": name,
+                    "commonNames": [],
+                },
+                "matches": sorted(set(matches[name])),
+            }
+            for name, weight in weights.items()
+        ]
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results
+
+
+def top_score(data: Optional[dict]) -> float:
+    results = (data or {}).get("results") or []
+    return results[0].get("score", 0) if results else 0.0
+
+
+class IdentificationRouter:
+    """Elige el motor para cada consulta y cuenta por dónde se resolvió"""
+
+    def __init__(
+        self,
+        remote: Optional[IdentificationBackend],
+        local: Optional[IdentificationBackend],
+        confident_score: float = LOCAL_CONFIDENT_SCORE,
+    ):
+        self.remote = remote
+        self.local = local
+        self.confident_score = confident_score
+        self.routed: Counter = Counter()
+
+    async def identify(self, images: Sequence[ImageFile], organs: List[str]) -> Tuple[dict, str]:
+        """Devuelve (respuesta, motor); lanza PlantNetError si ningún motor puede responder"""
+        local_data = None
+        if self.local is not None and self.local.available():
+            try:
+                local_data = await self.local.identify(images, organs)
+            except Exception as e:
+                logger.warning("Motor local de identificación falló: %s", e)
+            if top_score(local_data) >= self.confident_score:
+                self.routed["local_confident"] += 1
+                return local_data, self.local.name
+
+        if self.remote is None or not self.remote.available():
+            if top_score(local_data) > 0:
+                self.routed["local_fallback"] += 1
+                return local_data, self.local.name
+            raise PlantNetError(
+                503,
+                "Servicio de identificación no disponible",
+                retry_after=self.remote.breaker.retry_after() if getattr(self.remote, "breaker", None) else None,
+            )
+
+        try:
+            data = await self.remote.identify(images, organs)
+        except PlantNetError as e:
+            # Cuota agotada o PlantNet caído: mejor una respuesta local que un 5xx
+            if (e.status_code == 429 or e.status_code >= 500) and top_score(local_data) > 0:
+                self.routed["local_fallback"] += 1
+                return local_data, self.local.name
+            raise
+        self.routed[self.remote.name] += 1
+        return data, self.remote.name
+
+    def stats(self) -> dict:
+        return {
+            "routed": dict(self.routed),
+            "confident_score": self.confident_score,
+            "local_available": bool(self.local and self.local.available()),
+        }
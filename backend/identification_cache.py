@@ -0,0 +1,134 @@
+"""
+🗃️ Caché de resultados de identificación
+
+- Clave: hash SHA-256 del contenido de las imágenes + órganos
+- Nivel 1: LRU en memoria con TTL
+- Nivel 2 (opcional): SQLite en disco, sobrevive reinicios
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+IDENTIFY_CACHE_SIZE = int(os.getenv("IDENTIFY_CACHE_SIZE", "1000"))
+IDENTIFY_CACHE_TTL = float(os.getenv("IDENTIFY_CACHE_TTL", str(7 * 24 * 3600)))
+IDENTIFY_CACHE_DB = os.getenv("IDENTIFY_CACHE_DB")  # Ruta del archivo SQLite (vacío = sin disco)
+
+
+def cache_key(images: Sequence[bytes], organs: Sequence[str]) -> str:
+    """Clave direccionada por contenido: mismas fotos + mismos órganos = misma clave"""
+    digest = hashlib.sha256()
+    for content, organ in zip(images, organs):
+        digest.update(hashlib.sha256(content).digest())
+        digest.update(organ.encode())
+    return digest.hexdigest()
+
+
+class IdentificationCache:
+    """Caché LRU + TTL con nivel opcional en SQLite"""
+
+    def __init__(
+        self,
+        max_entries: int = IDENTIFY_CACHE_SIZE,
+        ttl: float = IDENTIFY_CACHE_TTL,
+        db_path: Optional[str] = IDENTIFY_CACHE_DB,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        # El nivel en disco se abre en el primer uso, no al crear la caché
+        self.db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        """Conexión al nivel en disco (None si no está configurado); llamar con el lock"""
+        if self._db is None and self.db_path:
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS identificaciones "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_identificaciones_expires ON identificaciones (expires_at)"
+            )
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Busca en memoria y luego en disco; promueve a memoria los aciertos en disco"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            disk = self._disk()
+            if disk is not None:
+                row = disk.execute(
+                    "SELECT value, expires_at FROM identificaciones WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: dict):
+        """Guarda un resultado en ambos niveles"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            disk = self._disk()
+            if disk is not None:
+                disk.execute(
+                    "INSERT OR REPLACE INTO identificaciones (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                disk.execute("DELETE FROM identificaciones WHERE expires_at <= ?", (time.time(),))
+                disk.commit()
+
+    def stats(self) -> dict:
+        """Contadores de aciertos / fallos"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_enabled": bool(self.db_path),
+        }
+
+    def close(self):
+        """Cierra el nivel en disco; se vuelve a abrir en el siguiente uso"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,161 @@
+"""
+📋 Consultas sobre la tabla `imagenes`
+
+- Proyección de columnas (`fields=`) validada contra una lista blanca
+- Filtros por estado, tipo_publicacion, planta_id y coordenadas resueltos en la base de datos
+- Paginación por cursor (keyset) sobre (fecha_subida, id), orden descendente
+  (filas sin fecha primero, como ordena PostgreSQL en DESC)
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+# Columnas que los clientes pueden pedir en `fields=`
+IMAGE_COLUMNS = (
+    "id",
+    "filename",
+    "nombre_usuario",
+    "planta_id",
+    "url_imagen",
+    "estado",
+    "fecha_subida",
+    "lat",
+    "lng",
+    "tipo_publicacion",
+    "description",
+    "variantes",
+    "phash",
+    "duplicado_de",
+)
+
+# Columnas necesarias para construir el cursor
+CURSOR_COLUMNS = ("fecha_subida", "id")
+
+MAX_PAGE_SIZE = 500
+
+
+def parse_fields(fields: Optional[str], missing_columns: Sequence[str] = ()) -> str:
+    """
+    Convierte `fields=a,b,c` en la cadena de select; siempre incluye las columnas del cursor.
+    Las columnas opcionales que no existen en el esquema se omiten.
+    """
+    if not fields:
+        return "*"
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    invalid = [f for f in requested if f not in IMAGE_COLUMNS]
+    if invalid:
+        raise ValueError(f"Campos no válidos: {', '.join(invalid)}")
+    requested = [f for f in requested if f not in missing_columns]
+    for column in CURSOR_COLUMNS:
+        if column not in requested:
+            requested.append(column)
+    return ",".join(requested)
+
+
+def parse_list(value: Optional[str]) -> List[str]:
+    """`publicada,activo` -> ['publicada', 'activo']"""
+    if not value:
+        return []
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def encode_cursor(row: dict) -> str:
+    """Cursor opaco a partir de la última fila de la página"""
+    raw = json.dumps([row.get("fecha_subida"), row.get("id")])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], int]:
+    """
+    Inverso de encode_cursor; ValueError si el cursor no es válido.
+    La fecha se vuelve a serializar desde un datetime: el cursor lo manda el
+    cliente y acaba dentro del filtro de PostgREST
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        fecha_subida, image_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if fecha_subida is not None:
+            if not isinstance(fecha_subida, str):
+                raise ValueError(fecha_subida)
+            fecha_subida = datetime.fromisoformat(fecha_subida).isoformat()
+        if isinstance(image_id, bool) or not isinstance(image_id, int):
+            raise ValueError(image_id)
+        return fecha_subida, image_id
+    except Exception:
+        raise ValueError("Cursor no válido")
+
+
+def _in_or_eq(query, column: str, values: List[str]):
+    if len(values) == 1:
+        return query.eq(column, values[0])
+    return query.in_(column, values)
+
+
+def apply_filters(
+    query,
+    estado: Optional[str] = None,
+    tipo_publicacion: Optional[str] = None,
+    planta_id: Optional[str] = None,
+    with_coordinates: bool = False,
+):
+    """Agrega los filtros a la consulta (valores separados por comas = IN)"""
+    for column, value in (
+        ("estado", estado),
+        ("tipo_publicacion", tipo_publicacion),
+        ("planta_id", planta_id),
+    ):
+        values = parse_list(value)
+        if values:
+            query = _in_or_eq(query, column, values)
+    if with_coordinates:
+        query = query.not_.is_("lat", "null").not_.is_("lng", "null")
+    return query
+
+
+def apply_keyset(query, cursor: Optional[str]):
+    """Orden estable (fecha_subida DESC, id DESC) y salto a la posición del cursor"""
+    if cursor:
+        fecha_subida, image_id = decode_cursor(cursor)
+        if fecha_subida is None:
+            # En orden DESC los NULL van primero: siguen los NULL con id menor y luego todas las fechas
+            query = query.or_(f"and(fecha_subida.is.null,id.lt.{image_id}),fecha_subida.not.is.null")
+        else:
+            query = query.or_(
+                f'fecha_subida.lt."{fecha_subida}",'
+                f'and(fecha_subida.eq."{fecha_subida}",id.lt.{image_id})'
+            )
+    return query.order("fecha_subida", desc=True).order("id", desc=True)
+
+
+def select_images(
+    client,
+    fields: Optional[str] = None,
+    estado: Optional[str] = None,
+    tipo_publicacion: Optional[str] = None,
+    planta_id: Optional[str] = None,
+    with_coordinates: bool = False,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    missing_columns: Sequence[str] = (),
+) -> Tuple[list, Optional[str]]:
+    """
+    Devuelve (filas, next_cursor).
+    Sin `limit` se devuelven todas las filas que cumplen los filtros.
+    """
+    query = client.table("imagenes").select(parse_fields(fields, missing_columns))
+    query = apply_filters(query, estado, tipo_publicacion, planta_id, with_coordinates)
+    query = apply_keyset(query, cursor)
+
+    if limit is None:
+        response = query.execute()
+        return response.data, None
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Se pide una fila extra para saber si hay otra página
+    response = query.limit(limit + 1).execute()
+    rows = response.data
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
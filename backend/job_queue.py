@@ -0,0 +1,277 @@
+"""
+⏳ Cola de trabajos persistente (SQLite)
+
+- Los trabajos sobreviven reinicios: se guardan antes de responder al cliente
+- Reintentos con backoff exponencial + jitter; al agotar intentos pasan a `dead`
+- Trabajos `running` con la concesión vencida se recuperan (caídas del proceso);
+  mientras el handler sigue vivo, el worker renueva la concesión (heartbeat)
+- Varios procesos pueden compartir la misma base (BEGIN IMMEDIATE al reclamar)
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlite_store import SQLiteStore
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+STATUSES = ("queued", "running", "done", "dead")
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class JobQueue(SQLiteStore):
+    """Cola de trabajos sobre una tabla SQLite"""
+
+    row_factory = sqlite3.Row
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB, lease_seconds: float = JOB_LEASE_SECONDS):
+        super().__init__(db_path)
+        self.lease_seconds = lease_seconds
+
+    def _create_schema(self, db: sqlite3.Connection):
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, run_at)")
+
+    def enqueue(self, kind: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS, delay: float = 0) -> int:
+        """Guarda un trabajo nuevo y devuelve su id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (kind, payload, max_attempts, run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), max_attempts, now + delay, now, now),
+            )
+            return cursor.lastrowid
+
+    def enqueue_many(self, kind: str, payloads: List[dict], max_attempts: int = JOB_MAX_ATTEMPTS) -> List[int]:
+        """Guarda varios trabajos en una transacción y devuelve sus ids"""
+        now = time.time()
+        ids = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for payload in payloads:
+                    cursor = self._db.execute(
+                        "INSERT INTO jobs (kind, payload, max_attempts, run_at, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (kind, json.dumps(payload), max_attempts, now, now, now),
+                    )
+                    ids.append(cursor.lastrowid)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return ids
+
+    def claim(self) -> Optional[dict]:
+        """Toma el siguiente trabajo listo (o con concesión vencida) y lo marca como running"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE (status = 'queued' AND run_at <= ?) "
+                    "OR (status = 'running' AND updated_at <= ?) ORDER BY run_at, id LIMIT 1",
+                    (now, now - self.lease_seconds),
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (now, row["id"]),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def heartbeat(self, job_id: int) -> bool:
+        """Renueva la concesión de un trabajo en curso; False si ya no está running"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'",
+                (time.time(), job_id),
+            )
+            return cursor.rowcount > 0
+
+    def complete(self, job_id: int):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+
+    def fail(self, job: dict, error: str):
+        """Reprograma el trabajo con backoff, o lo manda a dead-letter si no quedan intentos"""
+        now = time.time()
+        if job["attempts"] >= job["max_attempts"]:
+            status, run_at = "dead", now
+        else:
+            status = "queued"
+            run_at = now + random.uniform(0, min(300.0, 2.0 ** job["attempts"]))
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, run_at, error[:1000], now, job["id"]),
+            )
+
+    def retry(self, job_id: int) -> bool:
+        """Vuelve a encolar un trabajo de dead-letter"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'dead'",
+                (now, now, job_id),
+            )
+            return cursor.rowcount > 0
+
+    def get(self, job_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[dict]:
+        with self._lock:
+            if status:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job["payload"] = json.loads(job["payload"])
+            jobs.append(job)
+        return jobs
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def ping(self):
+        """Comprueba que la base de la cola responde"""
+        with self._lock:
+            self._db.execute("SELECT 1").fetchone()
+
+    def purge_done(self, older_than: float = 7 * 24 * 3600) -> int:
+        """Borra trabajos completados antiguos"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (time.time() - older_than,)
+            )
+            return cursor.rowcount
+
+
+class JobWorker:
+    """Consume la cola con N tareas asyncio; los handlers son corutinas por tipo de trabajo"""
+
+    def __init__(self, queue: JobQueue, concurrency: int = JOB_WORKERS, poll_interval: float = 1.0):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, Handler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def handler(self, kind: str):
+        """Decorador para registrar el handler de un tipo de trabajo"""
+        def register(func: Handler) -> Handler:
+            self.handlers[kind] = func
+            return func
+        return register
+
+    async def run_one(self) -> bool:
+        """Procesa un trabajo; devuelve False si la cola estaba vacía"""
+        job = await asyncio.to_thread(self.queue.claim)
+        if job is None:
+            return False
+        handler = self.handlers.get(job["kind"])
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            if handler is None:
+                raise RuntimeError(f"Sin handler para el tipo de trabajo '{job['kind']}'")
+            await handler(job["payload"])
+        except Exception as e:
+            logger.warning(
+                "Trabajo %s (%s) falló en el intento %s: %s", job["id"], job["kind"], job["attempts"], e,
+                extra={"job_id": job["id"], "kind": job["kind"], "attempt": job["attempts"]},
+            )
+            await asyncio.to_thread(self.queue.fail, job, str(e))
+        else:
+            await asyncio.to_thread(self.queue.complete, job["id"])
+        finally:
+            heartbeat.cancel()
+        return True
+
+    async def _heartbeat(self, job_id: int):
+        """Renueva la concesión cada tercio de su duración: otro worker no retoma un trabajo vivo"""
+        interval = self.queue.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.queue.heartbeat, job_id)
+            except Exception as e:
+                logger.warning("No se pudo renovar la concesión del trabajo %s: %s", job_id, e,
+                               extra={"job_id": job_id})
+
+    async def _loop(self):
+        while not self._stopping:
+            try:
+                if not await self.run_one():
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error en el worker de trabajos")
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
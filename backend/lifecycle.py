@@ -0,0 +1,206 @@
+"""
+🚀 Arranque en frío y conexión de dependencias
+
+- Importar la aplicación no abre conexiones de red: los clientes se crean en
+  el lifespan de FastAPI
+- Reconnector: conecta una dependencia en segundo plano y, si falla, reintenta
+  con backoff exponencial (con jitter) hasta lograrlo. El arranque solo espera
+  el primer intento unos segundos: si la base de datos no responde, el proceso
+  arranca igual y /health/ready informa 503 hasta que conecte. Ya conectado,
+  comprueba la conexión cada RECONNECT_CHECK_INTERVAL segundos y, tras
+  RECONNECT_FAILURE_THRESHOLD fallos seguidos, vuelve a conectar (el cliente
+  anterior sigue instalado hasta que haya uno nuevo)
+- StartupTimer: mide importación, lifespan y primera petición desde el inicio
+  de la importación y avisa si se supera STARTUP_BUDGET_SECONDS
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3"))
+# Cuánto espera el arranque el primer intento de conexión antes de seguir sin ella
+STARTUP_CONNECT_WAIT = float(os.getenv("STARTUP_CONNECT_WAIT", "3"))
+RECONNECT_INITIAL_DELAY = float(os.getenv("RECONNECT_INITIAL_DELAY", "1"))
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", "60"))
+RECONNECT_CHECK_INTERVAL = float(os.getenv("RECONNECT_CHECK_INTERVAL", "30"))
+RECONNECT_FAILURE_THRESHOLD = int(os.getenv("RECONNECT_FAILURE_THRESHOLD", "3"))
+
+logger = logging.getLogger("lifecycle")
+
+
+class Reconnector:
+    """Conecta una dependencia en segundo plano, reintentando hasta que funcione"""
+
+    def __init__(
+        self,
+        name: str,
+        connect: Callable[[], Awaitable[Any]],
+        on_connect: Callable[[Any], Awaitable[None]],
+        check: Optional[Callable[[Any], Awaitable[None]]] = None,
+        initial_delay: float = RECONNECT_INITIAL_DELAY,
+        max_delay: float = RECONNECT_MAX_DELAY,
+        check_interval: float = RECONNECT_CHECK_INTERVAL,
+        failure_threshold: int = RECONNECT_FAILURE_THRESHOLD,
+    ):
+        self.name = name
+        self.connect = connect
+        self.on_connect = on_connect
+        # check(client) lanza excepción si la conexión ya no sirve; sin check no se vigila
+        self.check = check
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.check_interval = check_interval
+        self.failure_threshold = failure_threshold
+        self.client: Any = None
+        self.connected = False
+        self.attempts = 0
+        self.disconnects = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        # Se crea en start(): pertenece al event loop del lifespan en curso
+        self._connected_event: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def connecting(self) -> bool:
+        return self.running and not self.connected
+
+    def start(self):
+        """Lanza la conexión (o la vigilancia, si ya estaba conectado) en segundo plano (no espera)"""
+        if self.running or (self.connected and self.check is None):
+            return
+        self._connected_event = asyncio.Event()
+        if self.connected:
+            self._connected_event.set()
+        self._task = asyncio.create_task(self._run(), name=f"connect-{self.name}")
+
+    async def wait(self, timeout: float = STARTUP_CONNECT_WAIT) -> bool:
+        """Espera a que conecte como mucho `timeout` segundos; la conexión sigue si no llega"""
+        if self.connecting and self._connected_event is not None:
+            waiter = asyncio.ensure_future(self._connected_event.wait())
+            try:
+                await asyncio.wait({waiter, self._task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+        return self.connected
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            if not self.connected:
+                await self._connect()
+            if self.check is None:
+                return
+            await self._watch()
+
+    async def _connect(self):
+        delay = self.initial_delay
+        while True:
+            self.attempts += 1
+            try:
+                client = await self.connect()
+                await self.on_connect(client)
+            except Exception as e:
+                self.last_error = str(e)[:300] or type(e).__name__
+                logger.warning(
+                    "No se pudo conectar %s; se reintenta en segundo plano", self.name,
+                    extra={"dependency": self.name, "attempt": self.attempts, "error": self.last_error,
+                           "retry_in_seconds": round(delay, 1)},
+                )
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self.max_delay)
+                continue
+            self.client = client
+            self.connected = True
+            self.last_error = None
+            self._connected_event.set()
+            logger.info("Conexión establecida", extra={"dependency": self.name, "attempt": self.attempts})
+            return
+
+    async def _watch(self):
+        """Comprueba la conexión periódicamente; vuelve cuando se da por perdida"""
+        failures = 0
+        while failures < self.failure_threshold:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check(self.client)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self.last_error = str(e)[:300] or type(e).__name__
+                logger.warning(
+                    "Falló la comprobación de %s", self.name,
+                    extra={"dependency": self.name, "failures": failures, "error": self.last_error},
+                )
+        self.connected = False
+        self.disconnects += 1
+        self._connected_event.clear()
+        logger.warning("Conexión perdida; reconectando", extra={"dependency": self.name})
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "connecting": self.connecting,
+            "attempts": self.attempts,
+            "disconnects": self.disconnects,
+            "last_error": self.last_error,
+        }
+
+
+class StartupTimer:
+    """Tiempos del arranque en frío, en segundos desde que empezó la importación"""
+
+    def __init__(self, budget: float = STARTUP_BUDGET_SECONDS):
+        self.budget = budget
+        self._started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        """Registra la fase la primera vez que se alcanza"""
+        if phase not in self.phases:
+            self.phases[phase] = time.perf_counter() - self._started
+            if self.phases[phase] > self.budget:
+                logger.warning(
+                    "Arranque por encima del presupuesto",
+                    extra={"phase": phase, "seconds": round(self.phases[phase], 3), "budget_seconds": self.budget},
+                )
+        return self.phases[phase]
+
+    def within_budget(self) -> bool:
+        return all(seconds <= self.budget for seconds in self.phases.values())
+
+    def snapshot(self) -> dict:
+        return {
+            "budget_seconds": self.budget,
+            "within_budget": self.within_budget(),
+            "phases": {phase: round(seconds, 3) for phase, seconds in self.phases.items()},
+        }
+
+
+class FirstRequestTimer:
+    """Middleware ASGI que marca `first_request` al terminar la primera respuesta HTTP"""
+
+    def __init__(self, app, timer: StartupTimer):
+        self.app = app
+        self.timer = timer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "first_request" in self.timer.phases:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+        self.timer.mark("first_request")
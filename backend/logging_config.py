@@ -0,0 +1,53 @@
+"""
+📝 Configuración de logging
+
+- Nivel con LOG_LEVEL (DEBUG, INFO, WARNING, ...): lo que queda por debajo
+  no se formatea ni se escribe
+- LOG_FORMAT=json (una línea JSON por evento) o text (desarrollo)
+- Los campos pasados en `extra={...}` se incluyen en la salida JSON
+- httpx/httpcore solo desde WARNING (sus URLs llevan la API key de PlantNet)
+"""
+import json
+import logging
+import os
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# Atributos estándar de LogRecord (el resto viene de `extra`)
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                event[key] = value
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Configura el logger raíz una sola vez (idempotente)"""
+    root = logging.getLogger()
+    if getattr(root, "_cuenca_configured", False):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level)
+    # httpx registra cada URL en INFO, incluida la api-key de PlantNet
+    for noisy in ("httpx", "httpcore"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    root._cuenca_configured = True
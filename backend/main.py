@@ -1,12 +1,57 @@
-from typing import Union, Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+# Medición del arranque en frío: empieza antes de importar FastAPI y el resto
+from lifecycle import StartupTimer, Reconnector, FirstRequestTimer
+startup_timer = StartupTimer()
+
+from typing import Union, Optional, List, Tuple
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Query, Depends, Request, BackgroundTasks, Header
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+from passlib.context import CryptContext
+from jose import JWTError, jwt
 import os
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import uuid
-import requests  # 🔥 NUEVA IMPORTACIÓN para llamadas HTTP externas
+import html
+import shutil
+import tempfile
+from pathlib import Path
+import asyncio
+import json
+import logging
+import time
+from plantnet import PlantNetClient, PlantNetError
+from identification_cache import IdentificationCache, cache_key
+from image_queries import select_images
+from spatial_index import SpatialIndex, POINT_COLUMNS
+from species_catalog import SpeciesCatalog, CATALOG_COLUMNS
+from storage import create_storage, spool_upload, UploadRejected, LocalStorage, UPLOAD_SPOOL_DIR
+from thumbnails import generate_variants, all_variant_paths, shutdown_pool, get_pool
+from identification import IdentificationRouter, PlantNetBackend, LocalBackend, LocalSpeciesIndex, LOCAL_INDEX_COLUMNS
+from perceptual_hash import dhash_file, to_hex
+from duplicate_index import DuplicateIndex, DUPLICATE_INDEX_COLUMNS, DUPLICATE_ACTION, DUPLICATE_ACTIONS
+from circuit_breaker import CircuitBreaker, OPEN
+from readiness import ReadinessChecker, DependencyCheck, READINESS_TIMEOUT
+from logging_config import configure_logging
+from metrics import REGISTRY, MetricsMiddleware
+from job_queue import JobQueue, JobWorker, STATUSES
+from schema import SchemaCapabilities
+from db import Database, DB_TIMEOUT
+from response_cache import ResponseCache
+from subscribers import (
+    SUBSCRIBER_COLUMNS, SUBSCRIBER_IMPORT_BATCH, SUBSCRIBER_EXPORT_PAGE, MAX_SUBSCRIBER_PAGE, EXPORT_FORMATS,
+    normalize_email, is_valid_email, missing_unique_constraint, read_csv, validate_row, batched, to_csv, to_ndjson
+)
+from notifications import SMTPPool, DeliveryStore, NotificationDispatcher, RenderedMessage, NOTIFY_PAGE_SIZE
+from idempotency import IdempotencyStore, fingerprint, REPLAY, IN_PROGRESS, MISMATCH, RESUMED, IDEMPOTENCY_KEY_MAX_LENGTH
+from principal_cache import PrincipalCache
+from rate_limit import TokenBucketLimiter
+import httpx
 
 # =============================================================================
 # CONFIGURACIÓN INICIAL Y VARIABLES DE ENTORNO
@@ -15,11 +60,27 @@ import requests  # 🔥 NUEVA IMPORTACIÓN para llamadas HTTP externas
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
 
+# Logging estructurado (LOG_LEVEL / LOG_FORMAT)
+configure_logging()
+logger = logging.getLogger("cuenca_ubate")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque y parada de dependencias (importar el módulo no abre conexiones)"""
+    await iniciar_dependencias()
+    startup_timer.mark("ready")
+    logger.info("Aplicación lista", extra=startup_timer.snapshot())
+    try:
+        yield
+    finally:
+        await detener_dependencias()
+
 # Crear aplicación FastAPI
 app = FastAPI(
     title="Cuenca Ubate API", 
     version="1.0.0",
-    description="API para identificación y gestión de plantas de la Cuenca Ubaté"
+    description="API para identificación y gestión de plantas de la Cuenca Ubaté",
+    lifespan=lifespan
 )
 
 # =============================================================================
@@ -34,6 +95,12 @@ app.add_middleware(
     allow_headers=["*"],   # Permite todos los headers
 )
 
+# Métricas por ruta: peticiones, latencia, tamaños y peticiones en curso
+app.add_middleware(MetricsMiddleware)
+
+# Tiempo hasta la primera respuesta (parte del arranque en frío)
+app.add_middleware(FirstRequestTimer, timer=startup_timer)
+
 # =============================================================================
 # CONFIGURACIÓN SUPABASE (Base de Datos)
 # =============================================================================
@@ -43,39 +110,108 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 BUCKET_NAME = "images"  # Bucket de almacenamiento en Supabase
 
-print("🔧 Configurando Supabase...")
-print(f"📋 SUPABASE_URL: {'✅' if SUPABASE_URL else '❌'}")
-print(f"🔑 SUPABASE_KEY: {'✅' if SUPABASE_KEY else '❌'}")
+logger.info(
+    "Configurando Supabase",
+    extra={"supabase_url": bool(SUPABASE_URL), "supabase_key": bool(SUPABASE_KEY)}
+)
+
+if not (SUPABASE_URL and SUPABASE_KEY):
+    logger.warning("Supabase no configurado - variables faltantes")
 
-# Conexión a Supabase
+# Conexión a Supabase: se crea en el lifespan, en segundo plano y con reintentos.
+# Las pruebas pueden instalar un cliente falso con usar_supabase() antes de arrancar
 supabase = None
-if SUPABASE_URL and SUPABASE_KEY:
+
+# Consultas a tablas: pool de hilos acotado, timeout e histogramas de latencia
+db = Database()
+
+# Columnas opcionales de `imagenes` (se detectan al conectar)
+schema = SchemaCapabilities()
+
+# Backend de almacenamiento de imágenes (carpeta local ya; Supabase Storage al conectar).
+# La carpeta local se crea en el lifespan (storage.prepare), no al importar
+storage = create_storage(None, BUCKET_NAME)
+if isinstance(storage, LocalStorage):
+    from fastapi.staticfiles import StaticFiles
+    app.mount("/media", StaticFiles(directory=storage.root, check_dir=False), name="media")
+
+def crear_cliente_supabase():
+    """Crea el cliente y comprueba la conexión con una consulta mínima (bloqueante)"""
+    # Import diferido: supabase-py tarda ~0.3 s en importarse
+    from supabase import create_client, ClientOptions
+    client = create_client(
+        SUPABASE_URL, SUPABASE_KEY,
+        options=ClientOptions(postgrest_client_timeout=DB_TIMEOUT)
+    )
+    client.table("imagenes").select("id").limit(1).execute()
+    return client
+
+def usar_supabase(client, storage_backend=None):
+    """Instala el cliente de Supabase (real o un doble de pruebas) y el almacenamiento que depende de él"""
+    global supabase, storage
+    supabase = client
+    if storage_backend is not None:
+        storage = storage_backend
+    elif not isinstance(storage, LocalStorage):
+        storage = create_storage(client, BUCKET_NAME)
+
+async def detectar_esquema():
+    """Detecta una vez qué columnas opcionales existen en la tabla imagenes"""
     try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        # Probar conexión con una consulta simple
-        result = supabase.table("imagenes").select("*").limit(1).execute()
-        print("✅ Conexión a Supabase establecida correctamente")
+        columns = await db.run("imagenes.schema", schema.detect, supabase)
+        logger.info("Columnas opcionales de imagenes detectadas", extra={"columns": columns})
     except Exception as e:
-        print(f"❌ Error conectando a Supabase: {e}")
-        supabase = None
-else:
-    print("⚠️  Supabase no configurado - variables faltantes")
+        logger.warning("No se pudo detectar el esquema de imagenes: %s", e)
+
+async def conectar_supabase():
+    return await db.run("supabase.connect", crear_cliente_supabase)
+
+async def al_conectar_supabase(client):
+    usar_supabase(client)
+    await detectar_esquema()
+
+async def comprobar_supabase(client):
+    """Consulta mínima para saber si la conexión sigue viva (la usa el Reconnector)"""
+    await db.execute("supabase.check", client.table("imagenes").select("id").limit(1))
+
+supabase_connector = Reconnector("supabase", conectar_supabase, al_conectar_supabase, check=comprobar_supabase)
 
 # =============================================================================
 # CONFIGURACIÓN AUTENTICACIÓN JWT
 # =============================================================================
 
-from passlib.context import CryptContext
-from datetime import timedelta
-from jose import JWTError, jwt
-
 # Configuración para JWT (JSON Web Tokens)
 SECRET_KEY = os.getenv("SECRET_KEY", "clave-secreta-temporal-cambiar-en-produccion")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Contexto para hashing de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Contexto para hashing de contraseñas (se crea al arrancar, en paralelo con la conexión)
+_pwd_context: Optional[CryptContext] = None
+
+def get_pwd_context() -> CryptContext:
+    """Devuelve el contexto de bcrypt compartido"""
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+# Pool acotado para bcrypt: el hashing no bloquea el event loop
+# y una ráfaga de logins no puede ocupar más de estos hilos
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+_password_pool: Optional[ThreadPoolExecutor] = None
+
+def get_password_pool() -> ThreadPoolExecutor:
+    """Pool de bcrypt; se crea al primer uso y se vuelve a crear tras detener_dependencias()"""
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _password_pool
+
+# Límites de intentos de login (token bucket por IP y por usuario)
+LOGIN_ATTEMPTS_PER_MINUTE_IP = float(os.getenv("LOGIN_ATTEMPTS_PER_MINUTE_IP", "10"))
+LOGIN_ATTEMPTS_PER_MINUTE_USER = float(os.getenv("LOGIN_ATTEMPTS_PER_MINUTE_USER", "5"))
+login_ip_limiter = TokenBucketLimiter(LOGIN_ATTEMPTS_PER_MINUTE_IP / 60, LOGIN_ATTEMPTS_PER_MINUTE_IP)
+login_user_limiter = TokenBucketLimiter(LOGIN_ATTEMPTS_PER_MINUTE_USER / 60, LOGIN_ATTEMPTS_PER_MINUTE_USER)
 
 # =============================================================================
 # FUNCIONES AUXILIARES DE AUTENTICACIÓN
@@ -83,11 +219,11 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica si una contraseña plana coincide con el hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Genera hash seguro de una contraseña"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Crea un token JWT con expiración"""
@@ -100,11 +236,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(username: str, password: str) -> Optional[dict]:
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password en el pool de bcrypt"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_pool(), verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash en el pool de bcrypt"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_pool(), get_password_hash, password)
+
+async def authenticate_user(username: str, password: str) -> Optional[dict]:
     """Autentica un usuario contra la base de datos"""
     try:
-        # Buscar usuario en la tabla de administradores
-        response = supabase.table("usuarios_administradores").select("*").eq("nombre de usuario", username).execute()
+        # Buscar usuario en la tabla de administradores (fuera del event loop)
+        response = await db.execute(
+            "usuarios_administradores.select",
+            supabase.table("usuarios_administradores").select("*").eq("nombre de usuario", username)
+        )
         
         if hasattr(response, 'error') and response.error:
             return None
@@ -114,18 +263,111 @@ def authenticate_user(username: str, password: str) -> Optional[dict]:
         
         user = response.data[0]
         # Verificar contraseña
-        if not verify_password(password, user["contraseña_hash"]):
+        if not await verify_password_async(password, user["contraseña_hash"]):
             return None
         
         return user
     except Exception as e:
-        print(f"Error en autenticación: {e}")
+        logger.error("Error en autenticación: %s", e)
         return None
 
+# Admins ya verificados contra la base de datos (TTL corto)
+principal_cache = PrincipalCache()
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def get_admin_principal(token: str) -> dict:
+    """Valida el JWT y devuelve el admin, desde la caché o la base de datos"""
+    credentials_error = HTTPException(
+        status_code=401,
+        detail="Token inválido o expirado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_error
+    
+    username = payload.get("sub")
+    user_id = payload.get("id")
+    if username is None or user_id is None:
+        raise credentials_error
+    
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        if not supabase:
+            raise HTTPException(status_code=500, detail="Supabase no configurado")
+        # Verificar que el usuario aún existe
+        response = await db.execute("usuarios_administradores.select", supabase.table("usuarios_administradores").select("id").eq("id", user_id))
+        if not response.data:
+            raise HTTPException(status_code=401, detail="Usuario no encontrado")
+        principal = {"id": user_id, "nombre_usuario": username}
+        principal_cache.set(user_id, principal, payload.get("exp"))
+    return principal
+
+async def require_admin(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> dict:
+    """Dependencia para endpoints de administración: exige 'Authorization: Bearer <token>'"""
+    if credentials is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Se requiere autenticación",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_admin_principal(credentials.credentials)
+
+def invalidate_admin(user_id: Optional[int] = None):
+    """Llamar cuando un admin cambia o se elimina (None = todos)"""
+    principal_cache.invalidate(user_id)
+
 # =============================================================================
 # ENDPOINTS PÚBLICOS
 # =============================================================================
 
+# Sondas de salud: liveness sin dependencias, readiness con comprobaciones reales
+STARTED_AT = time.time()
+
+async def check_database():
+    if not supabase:
+        if supabase_connector.connecting:
+            error = supabase_connector.last_error
+            raise RuntimeError(f"Conectando con Supabase (intento {supabase_connector.attempts})" + (f": {error}" if error else ""))
+        raise RuntimeError("Supabase no configurado")
+    await db.execute("health.select", supabase.table("imagenes").select("id").limit(1))
+    return {"pool_in_flight": db.in_flight}
+
+async def check_storage():
+    if not storage:
+        raise RuntimeError("Almacenamiento no configurado")
+    await asyncio.to_thread(storage.ping)
+    return {"backend": storage.name}
+
+async def check_job_queue():
+    await asyncio.to_thread(job_queue.ping)
+
+async def check_plantnet():
+    plantnet = get_plantnet_client()
+    if not plantnet:
+        raise RuntimeError("API Key no configurada")
+    # Sin API key: comprueba la red sin gastar cuota
+    status_code = await plantnet.ping(timeout=READINESS_TIMEOUT)
+    return {"http_status": status_code, "breaker": plantnet_breaker.state}
+
+# PlantNet no es crítica: si cae, se responde con el motor local o con 503
+readiness = ReadinessChecker([
+    DependencyCheck("database", check_database),
+    DependencyCheck("storage", check_storage),
+    DependencyCheck("job_queue", check_job_queue),
+    DependencyCheck("plantnet", check_plantnet, critical=False),
+])
+
+def estado_base_datos() -> str:
+    """Estado de la base de datos según la última comprobación (sin consultar)"""
+    last = readiness.last()
+    if last is None:
+        return "unknown" if supabase else "disconnected"
+    return "connected" if last["dependencies"]["database"]["status"] == "ok" else "disconnected"
+
 @app.get("/")
 def read_root():
     """Endpoint raíz - Estado del servicio"""
@@ -133,32 +375,154 @@ def read_root():
         "message": "API Cuenca Ubate funcionando", 
         "status": "online",
         "timestamp": datetime.now().isoformat(),
-        "database": "connected" if supabase else "disconnected"
+        "database": estado_base_datos()
     }
 
+@app.get("/health/live")
+def liveness():
+    """💓 Liveness: el proceso responde (no consulta dependencias)"""
+    return {
+        "status": "alive",
+        "uptime_seconds": round(time.time() - STARTED_AT, 1),
+        "startup": startup_timer.snapshot()
+    }
+
+@app.get("/health/ready")
+async def readiness_probe(force: bool = Query(False, description="Ignorar el resultado guardado")):
+    """🩺 Readiness: comprueba dependencias en paralelo (resultado guardado unos segundos); 503 si no está listo"""
+    result = await readiness.check(force=force)
+    return JSONResponse(status_code=200 if result["ready"] else 503, content=result)
+
+# Token opcional para /metrics (si se define, el scraper debe enviarlo como Bearer)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+def collect_app_metrics():
+    """Valores que se leen en el momento del scrape"""
+    caches = {"response": response_cache.stats(), "identification": identification_cache.stats()}
+    yield ("cache_hits_total", "counter", "Aciertos de caché",
+           [({"cache": name}, stats["hits"]) for name, stats in caches.items()])
+    yield ("cache_misses_total", "counter", "Fallos de caché",
+           [({"cache": name}, stats["misses"]) for name, stats in caches.items()])
+    yield ("job_queue_jobs", "gauge", "Trabajos en la cola por estado",
+           [({"status": status}, count) for status, count in job_queue.stats().items()])
+    yield ("circuit_breaker_state", "gauge", "Estado del circuit breaker (0=cerrado, 1=semiabierto, 2=abierto)",
+           [({"dependency": "plantnet"}, BREAKER_STATE_VALUES[plantnet_breaker.state])])
+    yield ("db_pool_in_flight", "gauge", "Consultas a Supabase en curso", [({}, db.in_flight)])
+    yield ("startup_seconds", "gauge", "Segundos desde el inicio de la importación hasta cada fase del arranque",
+           [({"phase": phase}, seconds) for phase, seconds in startup_timer.phases.items()])
+    yield ("dependency_connect_attempts_total", "counter", "Intentos de conexión de dependencias al arrancar",
+           [({"dependency": "supabase"}, supabase_connector.attempts)])
+    yield ("dependency_disconnects_total", "counter", "Conexiones perdidas detectadas (seguidas de reconexión)",
+           [({"dependency": "supabase"}, supabase_connector.disconnects)])
+
+REGISTRY.register_collector(collect_app_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)):
+    """📈 Métricas en formato de texto de Prometheus"""
+    if METRICS_TOKEN and (credentials is None or credentials.credentials != METRICS_TOKEN):
+        raise HTTPException(status_code=401, detail="Se requiere autenticación")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check para monitoreo del servicio"""
+    result = await readiness.check()
+    plantnet = plantnet_breaker.snapshot()
+    dependencies = result["dependencies"]
+    status = "healthy" if result["status"] == "ready" and plantnet["state"] != OPEN else (
+        "degraded" if result["ready"] else "unhealthy"
+    )
     return {
-        "status": "healthy",
+        "status": status,
         "timestamp": datetime.now().isoformat(),
         "services": {
             "api": "running",
-            "database": "connected" if supabase else "disconnected"
-        }
+            "database": estado_base_datos(),
+            "storage": dependencies["storage"]["status"],
+            "job_queue": dependencies["job_queue"]["status"],
+            "plantnet": {**plantnet, "reachable": dependencies["plantnet"]["status"] == "ok"}
+        },
+        "dependencies": dependencies
     }
 
 # =============================================================================
 # 🔐 ENDPOINT CLAVE: Identificación de Plantas (SEGURO)
 # =============================================================================
 
+# Cliente PlantNet compartido (se crea en la primera identificación)
+_plantnet_client: Optional[PlantNetClient] = None
+
+def get_plantnet_client() -> Optional[PlantNetClient]:
+    """Devuelve el cliente PlantNet compartido, o None si no hay API Key"""
+    global _plantnet_client
+    if _plantnet_client is None:
+        api_key = os.getenv('PLANT_ID_API_KEY')
+        if not api_key:
+            return None
+        _plantnet_client = PlantNetClient(api_key)
+    return _plantnet_client
+
+# Caché de identificaciones por contenido de imagen + órganos
+identification_cache = IdentificationCache()
+
+# Límite global de llamadas a PlantNet (compartido por todos los endpoints y trabajos)
+PLANTNET_RATE_PER_SECOND = float(os.getenv("PLANTNET_RATE_PER_SECOND", "5"))
+PLANTNET_BURST = float(os.getenv("PLANTNET_BURST", "10"))
+plantnet_limiter = TokenBucketLimiter(PLANTNET_RATE_PER_SECOND, PLANTNET_BURST)
+
+# Circuit breaker de PlantNet: falla al instante mientras el servicio está degradado
+plantnet_breaker = CircuitBreaker("plantnet")
+
+_identification_router: Optional[IdentificationRouter] = None
+
+def get_identification_router() -> Optional[IdentificationRouter]:
+    """Router PlantNet + motor local (hash perceptual), o None si no hay API Key"""
+    global _identification_router
+    if _identification_router is None:
+        plantnet = get_plantnet_client()
+        if not plantnet:
+            return None
+        _identification_router = IdentificationRouter(
+            PlantNetBackend(plantnet, plantnet_limiter, breaker=plantnet_breaker),
+            LocalBackend(local_species_index, executor=get_pool)
+        )
+    return _identification_router
+
+async def identificar(router: IdentificationRouter, images: list, organs: list, no_cache: bool = False):
+    """
+    Identifica un espécimen (una o varias imágenes con su órgano) usando la caché
+    y el router de motores. Devuelve (plant_data, cached, engine); lanza PlantNetError.
+    """
+    key = cache_key([content for _, content, _ in images], organs)
+    # La caché tiene una capa en disco (SQLite): se consulta fuera del event loop
+    plant_data = None if no_cache else await asyncio.to_thread(identification_cache.get, key)
+    if plant_data is not None:
+        return plant_data, True, PlantNetBackend.name
+    
+    try:
+        await ensure_local_index()
+    except Exception as e:
+        logger.warning("No se pudo cargar el índice local de identificación: %s", e)
+    
+    plant_data, engine = await router.identify(images, organs)
+    # Solo se cachean respuestas de PlantNet; el índice local cambia con cada publicación
+    if engine == PlantNetBackend.name:
+        await asyncio.to_thread(identification_cache.set, key, plant_data)
+    return plant_data, False, engine
+
 @app.post("/identify-plant")
-async def identify_plant(file: UploadFile = File(...)):
+async def identify_plant(
+    file: UploadFile = File(...),
+    no_cache: bool = Query(False, description="Ignorar la caché y consultar PlantNet")
+):
     """
     🔍 Identifica plantas usando PlantNet API de forma segura
     - La API Key está protegida en el backend
     - El frontend no necesita conocer la clave
     - Validación de tipos de archivo
+    - Resultados cacheados por contenido de la imagen
     """
     try:
         # 1. VALIDAR TIPO DE ARCHIVO
@@ -169,46 +533,44 @@ async def identify_plant(file: UploadFile = File(...)):
                 detail=f"Tipo de archivo no soportado. Use: {', '.join(allowed_content_types)}"
             )
         
-        # 2. OBTENER API KEY DESDE VARIABLES DE ENTORNO
-        api_key = os.getenv('PLANT_ID_API_KEY')
-        if not api_key:
+        # 2. OBTENER MOTORES DE IDENTIFICACIÓN (API KEY DESDE VARIABLES DE ENTORNO)
+        router = get_identification_router()
+        if not router:
             raise HTTPException(
                 status_code=500, 
                 detail="API Key no configurada en el servidor"
             )
         
-        print(f"🔍 Identificando planta con API Key: {api_key[:10]}...")
-        
         # 3. PREPARAR DATOS PARA PLANTNET API
         file_content = await file.read()
-        files = {
-            'images': (file.filename, file_content, file.content_type)
-        }
-        data = {
-            'organs': 'auto'  # Detección automática de órganos de la planta
-        }
         
-        # 4. LLAMAR A PLANTNET API
-        plantnet_url = f'https://my-api.plantnet.org/v2/identify/all?api-key={api_key}'
-        response = requests.post(plantnet_url, files=files, data=data)
+        organs = ['auto']  # Detección automática de órganos de la planta
         
-        # 5. MANEJAR RESPUESTA
-        if response.status_code != 200:
-            error_detail = response.json().get('error', 'Error desconocido de PlantNet API')
+        # 4. LLAMAR A PLANTNET API (asíncrono, no bloquea el event loop)
+        try:
+            plant_data, cached, engine = await identificar(
+                router,
+                [(file.filename, file_content, file.content_type)],
+                organs,
+                no_cache=no_cache
+            )
+        except PlantNetError as e:
+            # 5. MANEJAR RESPUESTA
             raise HTTPException(
-                status_code=response.status_code, 
-                detail=f"PlantNet API error: {error_detail}"
+                status_code=e.status_code, 
+                detail=f"PlantNet API error: {e.detail}",
+                headers={"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after else None
             )
         
-        plant_data = response.json()
-        
         # 6. VALIDAR RESULTADOS
         if not plant_data.get('results') or len(plant_data['results']) == 0:
             return {
                 "success": True,
                 "message": "No se pudo identificar la planta con certeza",
                 "results": [],
-                "suggestions": "Intente con una imagen más clara o desde otro ángulo"
+                "suggestions": "Intente con una imagen más clara o desde otro ángulo",
+                "cached": cached,
+                "engine": engine
             }
         
         # 7. RETORNAR RESULTADOS
@@ -216,19 +578,167 @@ async def identify_plant(file: UploadFile = File(...)):
             "success": True,
             "message": f"Identificación exitosa. {len(plant_data['results'])} resultados encontrados",
             "results": plant_data['results'],
-            "best_match": plant_data['results'][0]  # El resultado con mayor probabilidad
+            "best_match": plant_data['results'][0],  # El resultado con mayor probabilidad
+            "cached": cached,
+            "engine": engine
         }
         
     except HTTPException:
         # Re-lanzar excepciones HTTP que ya manejamos
         raise
     except Exception as e:
-        print(f"❌ Error en identificación: {str(e)}")
+        logger.exception("Error en identificación")
         raise HTTPException(
             status_code=500, 
             detail=f"Error interno del servidor: {str(e)}"
         )
 
+def copiar_a_temporal(origen, directory: str, suffix: str = "") -> str:
+    """Copia por bloques un archivo de la petición a la carpeta de cola; devuelve la ruta"""
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(origen, out)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def borrar_archivos(paths: List[str]):
+    """Borra archivos temporales que puedan no existir ya"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# Órganos aceptados por PlantNet y máximo de imágenes por consulta
+ORGANOS_VALIDOS = {"auto", "leaf", "flower", "fruit", "bark", "habit", "other"}
+MAX_IMAGENES_POR_ESPECIMEN = 5
+MAX_IMAGENES_POR_LOTE_IDENTIFICACION = int(os.getenv("IDENTIFY_BATCH_MAX_FILES", "200"))
+
+@app.post("/identify-plants")
+async def identify_plants(
+    files: List[UploadFile] = File(..., description="Imágenes a identificar"),
+    organs: Optional[List[str]] = Form(None, description="Órgano de cada imagen (leaf, flower, fruit, bark, habit, other, auto)"),
+    specimens: Optional[List[str]] = Form(None, description="Etiqueta de espécimen de cada imagen; las imágenes con la misma etiqueta se identifican juntas"),
+    no_cache: bool = Query(False, description="Ignorar la caché y consultar PlantNet")
+):
+    """
+    🔍 Identificación de varios especímenes en una sola petición
+    - Cada imagen puede llevar su órgano y su etiqueta de espécimen
+      (sin etiquetas, cada imagen es un espécimen)
+    - Los especímenes se consultan en paralelo bajo el límite global de PlantNet
+    - Respuesta NDJSON: una línea por espécimen en cuanto termina, y una línea final de resumen
+    """
+    # 1. VALIDAR LOTE
+    if len(files) > MAX_IMAGENES_POR_LOTE_IDENTIFICACION:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {MAX_IMAGENES_POR_LOTE_IDENTIFICACION} imágenes por petición"
+        )
+    organs = organs or ['auto'] * len(files)
+    specimens = specimens or [str(i) for i in range(len(files))]
+    if len(organs) != len(files) or len(specimens) != len(files):
+        raise HTTPException(status_code=400, detail="organs y specimens deben tener un valor por imagen")
+    invalidos = set(organs) - ORGANOS_VALIDOS
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Órganos no válidos: {', '.join(sorted(invalidos))}")
+    allowed_content_types = ['image/jpeg', 'image/png', 'image/webp']
+    for file in files:
+        if file.content_type not in allowed_content_types:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tipo de archivo no soportado ({file.filename}). Use: {', '.join(allowed_content_types)}"
+            )
+    
+    # 2. AGRUPAR POR ESPÉCIMEN (respetando el orden de aparición)
+    grupos: dict = {}
+    for file, organ, specimen in zip(files, organs, specimens):
+        grupos.setdefault(specimen, []).append((file, organ))
+    for specimen, imagenes in grupos.items():
+        if len(imagenes) > MAX_IMAGENES_POR_ESPECIMEN:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El espécimen '{specimen}' tiene más de {MAX_IMAGENES_POR_ESPECIMEN} imágenes"
+            )
+    
+    router = get_identification_router()
+    if not router:
+        raise HTTPException(status_code=500, detail="API Key no configurada en el servidor")
+    
+    # 3. COPIAR LOS ARCHIVOS A LA CARPETA DE COLA ANTES DE RESPONDER
+    #    (los UploadFile se cierran al devolver la respuesta, antes de consumir el stream)
+    rutas: List[str] = []
+    try:
+        for specimen, imagenes in grupos.items():
+            copiadas = []
+            for file, organ in imagenes:
+                tmp_path, _, content_type, _ = await spool_upload(file, directory=UPLOAD_SPOOL_DIR)
+                rutas.append(tmp_path)
+                copiadas.append((file.filename, tmp_path, content_type, organ))
+            grupos[specimen] = copiadas
+    except UploadRejected as e:
+        borrar_archivos(rutas)
+        raise HTTPException(status_code=e.status_code, detail=f"{file.filename}: {e.detail}")
+    except Exception:
+        borrar_archivos(rutas)
+        raise
+    
+    async def identificar_especimen(specimen: str, imagenes: list) -> dict:
+        resultado = {"specimen": specimen, "files": [nombre for nombre, *_ in imagenes]}
+        try:
+            # Los archivos se leen aquí para no tener todo el lote en memoria a la vez
+            images = [
+                (nombre, await asyncio.to_thread(Path(ruta).read_bytes), content_type)
+                for nombre, ruta, content_type, _ in imagenes
+            ]
+            plant_data, cached, engine = await identificar(router, images, [o for *_, o in imagenes], no_cache=no_cache)
+        except PlantNetError as e:
+            resultado.update(success=False, status_code=e.status_code, error=f"PlantNet API error: {e.detail}")
+            if e.retry_after:
+                resultado["retry_after"] = round(e.retry_after, 1)
+            return resultado
+        except Exception as e:
+            resultado.update(success=False, status_code=500, error=str(e))
+            return resultado
+        results = plant_data.get('results') or []
+        resultado.update(success=True, cached=cached, engine=engine, results=results, best_match=results[0] if results else None)
+        return resultado
+    
+    # 4. CONSULTAR EN PARALELO Y EMITIR CADA RESULTADO AL TERMINAR
+    async def stream():
+        tareas = [asyncio.create_task(identificar_especimen(s, imgs)) for s, imgs in grupos.items()]
+        correctos = 0
+        try:
+            for siguiente in asyncio.as_completed(tareas):
+                resultado = await siguiente
+                correctos += resultado["success"]
+                yield json.dumps(resultado, ensure_ascii=False) + "\n"
+        finally:
+            # Si el cliente se desconecta se cancelan las consultas pendientes
+            for tarea in tareas:
+                tarea.cancel()
+        yield json.dumps({"done": True, "specimens": len(tareas), "success": correctos, "failed": len(tareas) - correctos}) + "\n"
+    
+    # Las copias se borran al terminar la respuesta (también si el cliente se desconecta)
+    return StreamingResponse(stream(), media_type="application/x-ndjson",
+                             background=BackgroundTask(borrar_archivos, rutas))
+
+@app.get("/identify-plant/cache-stats", dependencies=[Depends(require_admin)])
+async def identify_cache_stats():
+    """📊 Aciertos / fallos de la caché de identificaciones"""
+    return identification_cache.stats()
+
+@app.get("/identify-plant/engine-stats", dependencies=[Depends(require_admin)])
+async def identify_engine_stats():
+    """🔀 Consultas resueltas por cada motor (PlantNet / local) y tamaño del índice local"""
+    router = get_identification_router()
+    stats = router.stats() if router else {"routed": {}}
+    stats["local_index_size"] = len(local_species_index)
+    return stats
+
 # =============================================================================
 # ENDPOINT DE CONFIGURACIÓN PARA FRONTEND
 # =============================================================================
@@ -259,127 +769,637 @@ async def get_api_keys():
     - Se obtienen dinámicamente desde las variables de entorno
     """
     return {
-        "PLANT_ID_API_KEY": os.getenv("PLANT_ID_API_KEY"),
+        # PLANT_ID_API_KEY ya no se expone: la identificación se hace en /identify-and-save
         "DEEPSEEK_API_KEY": os.getenv("DEEPSEEK_API_KEY")
     }
 
+# =============================================================================
+# ÍNDICES EN MEMORIA (MAPA Y CATÁLOGO DE ESPECIES)
+# =============================================================================
+
+# Se cargan en la primera consulta y luego se mantienen con cada escritura
+spatial_index = SpatialIndex()
+species_catalog = SpeciesCatalog()
+
+# Hashes perceptuales de imágenes publicadas (motor de identificación local)
+local_species_index = LocalSpeciesIndex(excluded_species=("planta-desconocida",))
+
+# Hashes perceptuales de todas las imágenes guardadas (detección de duplicados)
+duplicate_index = DuplicateIndex()
+if DUPLICATE_ACTION not in DUPLICATE_ACTIONS:
+    raise RuntimeError(f"DUPLICATE_ACTION debe ser uno de: {', '.join(DUPLICATE_ACTIONS)}")
+
+# Respuestas de los endpoints públicos de lectura (se invalidan con cada escritura)
+response_cache = ResponseCache()
+
+async def ensure_spatial_index():
+    """Carga el índice espacial desde la base de datos si aún no está cargado"""
+    if not spatial_index.loaded:
+        rows, _ = await db.run(
+            "imagenes.select",
+            select_images,
+            supabase,
+            fields=",".join(POINT_COLUMNS + ("estado",)),
+            estado="publicada",
+            with_coordinates=True,
+            missing_columns=schema.missing()
+        )
+        spatial_index.load(rows)
+
+async def ensure_species_catalog():
+    """Carga el catálogo de especies desde la base de datos si aún no está cargado"""
+    if not species_catalog.loaded:
+        rows, _ = await db.run("imagenes.select", select_images, supabase, fields=",".join(CATALOG_COLUMNS))
+        species_catalog.load(rows)
+
+async def ensure_local_index():
+    """Carga el índice de hashes perceptuales si aún no está cargado"""
+    if not local_species_index.loaded and supabase and schema.has("phash"):
+        rows, _ = await db.run(
+            "imagenes.select",
+            select_images,
+            supabase,
+            fields=",".join(LOCAL_INDEX_COLUMNS),
+            estado="publicada"
+        )
+        local_species_index.load(rows)
+
+async def ensure_duplicate_index():
+    """Carga el índice de duplicados (todas las imágenes con hash) si aún no está cargado"""
+    if not duplicate_index.loaded and supabase and schema.has("phash"):
+        rows, _ = await db.run("imagenes.select", select_images, supabase, fields=",".join(DUPLICATE_INDEX_COLUMNS))
+        duplicate_index.load(rows)
+
+def index_image_rows(rows: list):
+    """Actualiza los índices con las filas devueltas por un insert/update"""
+    for row in rows or []:
+        spatial_index.upsert(row)
+        species_catalog.upsert(row)
+        local_species_index.upsert(row)
+        duplicate_index.upsert(row)
+    response_cache.invalidate()
+
+def unindex_image(image_id: int):
+    """Quita una imagen eliminada de los índices"""
+    spatial_index.remove(image_id)
+    species_catalog.remove(image_id)
+    local_species_index.remove(image_id)
+    duplicate_index.remove(image_id)
+    response_cache.invalidate()
+
+# =============================================================================
+# COLA DE TRABAJOS (EFECTOS SECUNDARIOS LENTOS)
+# =============================================================================
+
+# Umbral para aceptar la re-identificación automática de una imagen sin especie
+REIDENTIFY_MIN_SCORE = float(os.getenv("REIDENTIFY_MIN_SCORE", "0.5"))
+PLANTA_DESCONOCIDA = "planta-desconocida"
+
+job_queue = JobQueue()
+job_worker = JobWorker(job_queue)
+
+# Notificaciones por email: conexiones SMTP compartidas y estado por destinatario
+smtp_pool = SMTPPool()
+delivery_store = DeliveryStore()
+notifier = NotificationDispatcher(delivery_store, smtp_pool)
+PUBLIC_SITE_URL = os.getenv("PUBLIC_SITE_URL", "")
+
+@job_worker.handler("process_upload")
+async def process_upload_job(payload: dict):
+    """Sube el original al almacenamiento y genera miniaturas sin EXIF"""
+    src_path = payload["src_path"]
+    filename = payload["filename"]
+    if not os.path.exists(src_path):
+        raise RuntimeError(f"Archivo en cola no encontrado: {src_path}")
+    
+    # 1. ORIGINAL
+    await asyncio.to_thread(storage.upload, f"public/{filename}", src_path, payload["content_type"])
+    
+    # 2. VARIANTES Y HASH PERCEPTUAL (pool de procesos)
+    variantes = await generate_variants(storage, filename, src_path)
+    phash = payload.get("phash")
+    if phash is None:
+        phash = to_hex(await asyncio.get_running_loop().run_in_executor(get_pool(), dhash_file, src_path))
+    update_data = schema.build_payload({"variantes": variantes, "phash": phash})
+    if payload.get("image_id") is not None and update_data:
+        response = await db.execute("imagenes.update", supabase.table("imagenes").update(update_data).eq("id", payload["image_id"]))
+        index_image_rows(response.data)
+    
+    os.remove(src_path)
+    logger.info("Imagen almacenada con variantes", extra={"filename": filename, "image_id": payload.get("image_id")})
+    
+    # 3. RE-IDENTIFICAR SI LLEGÓ SIN ESPECIE
+    if payload.get("reidentify") and payload.get("image_id") is not None:
+        await asyncio.to_thread(job_queue.enqueue, "reidentify", {"image_id": payload["image_id"]})
+
+@job_worker.handler("delete_storage")
+async def delete_storage_job(payload: dict):
+    """Elimina archivos del almacenamiento"""
+    await asyncio.to_thread(storage.remove, payload["paths"])
+
+@job_worker.handler("reidentify")
+async def reidentify_job(payload: dict):
+    """Identifica una imagen guardada sin especie y actualiza planta_id"""
+    router = get_identification_router()
+    if not router:
+        return
+    
+    response = await db.execute("imagenes.select", supabase.table("imagenes").select("id,planta_id,url_imagen,filename").eq("id", payload["image_id"]))
+    if not response.data:
+        return
+    image = response.data[0]
+    
+    async with httpx.AsyncClient(timeout=30) as client:
+        download = await client.get(image["url_imagen"])
+        download.raise_for_status()
+    content = download.content
+    
+    plant_data, _, _ = await identificar(
+        router,
+        [(image["filename"], content, download.headers.get("content-type", "image/jpeg"))],
+        ['auto']
+    )
+    
+    results = plant_data.get("results") or []
+    if not results or results[0].get("score", 0) < REIDENTIFY_MIN_SCORE:
+        return
+    
+    nombre = results[0]["species"]["scientificNameWithoutAuthor"]
+    # Solo se reemplaza si nadie asignó una especie mientras tanto
+    update = await db.execute("imagenes.update", supabase.table("imagenes").update({"planta_id": nombre}).eq("id", image["id"]).eq("planta_id", PLANTA_DESCONOCIDA))
+    index_image_rows(update.data)
+
+def es_noticia_publicada(row: dict) -> bool:
+    return row.get("tipo_publicacion") == "noticias" and row.get("estado") == "publicada"
+
+async def notificar_publicaciones(rows: list):
+    """Encola el aviso a los suscriptores de las noticias recién publicadas (una vez por imagen)"""
+    claves = {
+        f"imagen-{row['id']}": row["id"]
+        for row in rows or []
+        if row.get("id") is not None and es_noticia_publicada(row)
+    }
+    if not claves:
+        return
+    # Un lote de cambios de estado se registra y encola en una transacción por almacén
+    nuevas = await asyncio.to_thread(delivery_store.register_many, list(claves))
+    if nuevas:
+        await asyncio.to_thread(job_queue.enqueue_many, "notify_subscribers", [
+            {"key": key, "image_id": claves[key]} for key in nuevas
+        ])
+
+def mensaje_noticia(image: dict) -> RenderedMessage:
+    """Correo de una noticia publicada (se renderiza una vez para todos los destinatarios)"""
+    titulo = image.get("planta_id") or "Nueva publicación"
+    descripcion = image.get("description") or ""
+    enlace = f"{PUBLIC_SITE_URL.rstrip('/')}/index.html" if PUBLIC_SITE_URL else ""
+    text = "\n\n".join(p for p in (
+        f"🌿 Nueva noticia en la Cuenca Alta del Río Ubaté: {titulo}",
+        descripcion,
+        image.get("url_imagen") or "",
+        f"Más información: {enlace}" if enlace else "",
+    ) if p)
+    html_body = (
+        f"<h2>🌿 {html.escape(titulo)}</h2>"
+        + (f"<p>{html.escape(descripcion)}</p>" if descripcion else "")
+        + (f'<p><img src="{html.escape(image["url_imagen"])}" alt="{html.escape(titulo)}" style="max-width:100%"></p>'
+           if image.get("url_imagen") else "")
+        + (f'<p><a href="{html.escape(enlace)}">Ver en la App Web de la Cuenca Ubaté</a></p>' if enlace else "")
+    )
+    return RenderedMessage(f"🌿 Nueva noticia: {titulo}", text, html_body)
+
+async def paginas_suscriptores():
+    """Emails de los suscriptores activos, por páginas de id (NOTIFY_PAGE_SIZE)"""
+    ultimo_id = 0
+    while True:
+        response = await db.execute(
+            "suscriptores.select",
+            supabase.table("suscriptores").select("id,email").eq("activo", True)
+            .gt("id", ultimo_id).order("id").limit(NOTIFY_PAGE_SIZE)
+        )
+        filas = response.data
+        if not filas:
+            return
+        yield [fila["email"] for fila in filas]
+        if len(filas) < NOTIFY_PAGE_SIZE:
+            return
+        ultimo_id = filas[-1]["id"]
+
+@job_worker.handler("notify_subscribers")
+async def notify_subscribers_job(payload: dict):
+    """Envía una notificación a los suscriptores activos; retoma donde quedó si se reintenta"""
+    key = payload["key"]
+    if not smtp_pool.configured:
+        logger.warning("SMTP no configurado; notificación omitida", extra={"key": key})
+        await asyncio.to_thread(delivery_store.set_status, key, "skipped")
+        return
+    
+    if payload.get("image_id") is not None:
+        response = await db.execute("imagenes.select", supabase.table("imagenes").select("*").eq("id", payload["image_id"]))
+        if not response.data or not es_noticia_publicada(response.data[0]):
+            # Se despublicó o se eliminó antes de enviar
+            await asyncio.to_thread(delivery_store.set_status, key, "cancelled")
+            return
+        message = mensaje_noticia(response.data[0])
+    else:
+        message = RenderedMessage(payload["subject"], payload["text"])
+    
+    await notifier.dispatch(key, message, paginas_suscriptores())
+
+async def iniciar_dependencias():
+    """
+    Conecta Supabase, prepara bcrypt y abre los almacenes locales (SQLite,
+    carpeta de medios) en paralelo; después arranca los workers.
+    Si Supabase no responde en STARTUP_CONNECT_WAIT, se arranca sin él y la
+    conexión sigue reintentándose en segundo plano
+    """
+    loop = asyncio.get_running_loop()
+    pending = [
+        loop.run_in_executor(get_password_pool(), get_pwd_context),
+        *(asyncio.to_thread(store.open) for store in (job_queue, delivery_store, idempotency_store)),
+    ]
+    if storage is not None:
+        pending.append(asyncio.to_thread(storage.prepare))
+    if supabase is not None and supabase is not supabase_connector.client:
+        # Cliente instalado con usar_supabase(): no se crea otro ni se vigila
+        pending.append(detectar_esquema())
+    elif SUPABASE_URL and SUPABASE_KEY:
+        # Conecta o, si ya conectó en un arranque anterior, solo reanuda la vigilancia
+        supabase_connector.start()
+        pending.append(supabase_connector.wait())
+    await asyncio.gather(*pending)
+    if supabase is None and supabase_connector.connecting:
+        logger.warning("Arrancando sin conexión a Supabase; se sigue intentando en segundo plano",
+                       extra=supabase_connector.stats())
+    job_worker.start()
+
+async def detener_dependencias():
+    """
+    Detiene la reconexión, los workers y el cliente de PlantNet; cierra pools
+    y almacenes. Todo se vuelve a crear al arrancar otra vez en el mismo proceso
+    """
+    global _plantnet_client, _identification_router, _password_pool
+    await supabase_connector.stop()
+    await job_worker.stop()
+    if _plantnet_client is not None:
+        await _plantnet_client.aclose()
+        # El router guarda el cliente: ambos se vuelven a crear en el siguiente arranque
+        _plantnet_client = None
+        _identification_router = None
+    shutdown_pool()
+    if _password_pool is not None:
+        _password_pool.shutdown(wait=False, cancel_futures=True)
+        _password_pool = None
+    smtp_pool.close()
+    db.close()
+    for store in (job_queue, delivery_store, idempotency_store, identification_cache):
+        store.close()
+
 # =============================================================================
 # GESTIÓN DE IMÁGENES
 # =============================================================================
 
+async def registrar_imagen(
+    tmp_path: str,
+    content_type: str,
+    file_extension: str,
+    planta_id: str,
+    nombre_usuario: str,
+    description: str,
+    lat: Optional[float],
+    lng: Optional[float],
+    unique_filename: Optional[str] = None
+) -> dict:
+    """
+    Guarda los metadatos de una imagen ya leída a la carpeta de cola y encola
+    su subida al almacenamiento. El trabajo se queda con el archivo de la cola.
+    Lanza UploadRejected (409) si es un duplicado y DUPLICATE_ACTION=reject.
+    """
+    # 0. HASH PERCEPTUAL Y BÚSQUEDA DE CASI DUPLICADOS
+    phash, duplicados = await buscar_duplicados(tmp_path)
+    if duplicados and DUPLICATE_ACTION == "reject":
+        raise UploadRejected(
+            409,
+            f"La imagen es casi igual a otra ya guardada (id {duplicados[0]['image_id']}, "
+            f"distancia {duplicados[0]['distance']})"
+        )
+    
+    # 1. NOMBRE ÚNICO (puede venir fijado por una clave de idempotencia)
+    unique_filename = unique_filename or f"{uuid.uuid4()}.{file_extension}"
+    file_path = f"public/{unique_filename}"
+    
+    # 2. URL PÚBLICA (se calcula sin llamar al almacenamiento)
+    public_url = storage.public_url(file_path)
+    
+    # 3. PREPARAR METADATOS
+    image_data = {
+        "filename": unique_filename,
+        "nombre_usuario": nombre_usuario,
+        "planta_id": planta_id,
+        "url_imagen": public_url,
+        "estado": "pendiente",
+        "fecha_subida": datetime.now().isoformat(),
+        "lat": lat,
+        "lng": lng,
+        "tipo_publicacion": "galeria"  # 🆕 Valor por defecto
+    }
+    
+    # 4. AGREGAR DESCRIPCIÓN, HASH Y DUPLICADO SI EXISTEN
+    if description:
+        image_data["description"] = description
+    if phash:
+        image_data["phash"] = phash
+    if duplicados:
+        image_data["duplicado_de"] = duplicados[0]["image_id"]
+    
+    logger.debug("Guardando metadatos: %s", image_data)
+    
+    # 5. GUARDAR EN BASE DE DATOS (solo con las columnas que existen en el esquema)
+    db_response = await db.execute("imagenes.insert", supabase.table("imagenes").insert(schema.build_payload(image_data)))
+    
+    # 6. ACTUALIZAR ÍNDICES EN MEMORIA
+    index_image_rows(db_response.data)
+    
+    # 7. ENCOLAR SUBIDA + MINIATURAS (el trabajo borra el archivo de la cola)
+    image_id = db_response.data[0].get("id") if db_response.data else None
+    job_id = await asyncio.to_thread(job_queue.enqueue, "process_upload", {
+        "image_id": image_id,
+        "filename": unique_filename,
+        "src_path": os.path.abspath(tmp_path),
+        "content_type": content_type,
+        "reidentify": planta_id == PLANTA_DESCONOCIDA,
+        "phash": phash
+    })
+    
+    return {
+        "success": True,
+        "message": f"Imagen guardada para planta {planta_id} (pendiente de revisión)",
+        "image_id": image_id,
+        "planta_id": planta_id,
+        "filename": unique_filename,
+        "public_url": public_url,
+        "estado": "pendiente",
+        "lat": lat,
+        "lng": lng,
+        "job_id": job_id,
+        "duplicates": duplicados
+    }
+
+async def buscar_duplicados(path: str):
+    """Devuelve (phash en hex, [{image_id, distance}]) de una imagen en disco"""
+    try:
+        value = await asyncio.get_running_loop().run_in_executor(get_pool(), dhash_file, path)
+    except Exception as e:
+        logger.warning("No se pudo calcular el hash perceptual: %s", e)
+        return None, []
+    if DUPLICATE_ACTION == "off":
+        return to_hex(value), []
+    try:
+        await ensure_duplicate_index()
+    except Exception as e:
+        logger.warning("No se pudo cargar el índice de duplicados: %s", e)
+    matches = duplicate_index.find(value) if duplicate_index.loaded else []
+    return to_hex(value), [{"image_id": image_id, "distance": distance} for distance, image_id in matches]
+
 @app.post("/upload")
 async def upload_image(
     file: UploadFile = File(...),
-    planta_id: str = Form("planta-desconocida"),
+    planta_id: str = Form(PLANTA_DESCONOCIDA),
     nombre_usuario: str = Form("usuario_web"),
     description: str = Form(""),
     lat: Optional[float] = Form(None),
     lng: Optional[float] = Form(None)
 ):
-    """📤 Sube imagen asociada a una planta específica"""
+    """
+    📤 Sube imagen asociada a una planta específica
+    - El archivo se guarda en disco local y los metadatos en la base de datos
+    - La subida al almacenamiento y las miniaturas se hacen en la cola de trabajos
+    - Las fotos casi iguales a otra guardada se marcan (duplicado_de) o se
+      rechazan con 409, según DUPLICATE_ACTION
+    """
 
-    if not supabase:
+    if not supabase or not storage:
         raise HTTPException(status_code=500, detail="Error de conexión a Supabase")
     
+    tmp_path = None
     try:
-        # 1. GENERAR NOMBRE ÚNICO
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = f"public/{unique_filename}"
-        
-        # 2. LEER CONTENIDO DEL ARCHIVO
-        file_content = await file.read()
+        # LEER EL ARCHIVO POR BLOQUES A LA CARPETA DE COLA (límite de tamaño + magic bytes)
+        tmp_path, file_size, content_type, file_extension = await spool_upload(file, directory=UPLOAD_SPOOL_DIR)
+        logger.info("Imagen recibida", extra={"size_bytes": file_size})
         
-        print(f"📤 Subiendo imagen: {file_path}")
-        
-        # 3. SUBIR A SUPABASE STORAGE
-        upload_response = supabase.storage.from_(BUCKET_NAME).upload(
-            path=file_path,
-            file=file_content
+        resultado = await registrar_imagen(
+            tmp_path, content_type, file_extension, planta_id, nombre_usuario, description, lat, lng
         )
+        tmp_path = None
+        return resultado
         
-        if hasattr(upload_response, 'error') and upload_response.error:
-            raise Exception(f"Error subiendo imagen: {upload_response.error.message}")
-        
-        # 4. OBTENER URL PÚBLICA
-        public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(file_path)
-        
-        # 5. PREPARAR METADATOS
-        image_data = {
-            "filename": unique_filename,
-            "nombre_usuario": nombre_usuario,
-            "planta_id": planta_id,
-            "url_imagen": public_url,
-            "estado": "pendiente",
-            "fecha_subida": datetime.now().isoformat(),
-            "lat": lat,
-            "lng": lng,
-            "tipo_publicacion": "galeria"  # 🆕 Valor por defecto
-        }
-        
-        # 6. AGREGAR DESCRIPCIÓN SI EXISTE
-        if description:
-            image_data["description"] = description
-        
-        print(f"💾 Guardando metadatos: {image_data}")
-        
-        # 7. GUARDAR EN BASE DE DATOS
-        db_response = supabase.table("imagenes").insert(image_data).execute()
-        
-        # 8. MANEJAR ERRORES DE COLUMNAS FALTANTES
-        if hasattr(db_response, 'error') and db_response.error:
-            error_msg = str(db_response.error)
-            
-            # Si falla por description, intentar sin description
-            if "description" in error_msg:
-                print("⚠️  Columna description no existe, guardando sin description...")
-                image_data.pop("description", None)
-                db_response = supabase.table("imagenes").insert(image_data).execute()
-            
-            # Si falla por lat/lng, intentar sin ellas
-            elif "lat" in error_msg or "lng" in error_msg:
-                print("⚠️  Columnas lat/lng no existen, guardando sin coordenadas...")
-                image_data.pop("lat", None)
-                image_data.pop("lng", None)
-                db_response = supabase.table("imagenes").insert(image_data).execute()
-            
-            # Si falla por tipo_publicacion, intentar sin ella
-            elif "tipo_publicacion" in error_msg:
-                print("⚠️  Columna tipo_publicacion no existe, guardando sin tipo...")
-                image_data.pop("tipo_publicacion", None)
-                db_response = supabase.table("imagenes").insert(image_data).execute()
-                
-            if hasattr(db_response, 'error') and db_response.error:
-                raise Exception(f"Error guardando datos: {db_response.error.message}")
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        logger.exception("Error guardando imagen")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+# Respuestas de /identify-and-save por Idempotency-Key
+idempotency_store = IdempotencyStore()
+
+def respuesta_identificacion(plant_data: Optional[dict], cached: bool, engine: Optional[str], error: Optional[dict]) -> dict:
+    """Bloque `identification` de /identify-and-save"""
+    if error:
+        return {"success": False, **error}
+    results = (plant_data or {}).get("results") or []
+    return {
+        "success": True,
+        "results": results,
+        "best_match": results[0] if results else None,
+        "cached": cached,
+        "engine": engine
+    }
+
+@app.post("/identify-and-save")
+async def identify_and_save(
+    file: UploadFile = File(...),
+    organ: str = Form("auto"),
+    nombre_usuario: str = Form("usuario_web"),
+    description: str = Form(""),
+    lat: Optional[float] = Form(None),
+    lng: Optional[float] = Form(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=IDEMPOTENCY_KEY_MAX_LENGTH)
+):
+    """
+    📸 Identifica y guarda una foto en una sola petición
+    - La imagen se envía una sola vez: se identifica y se guarda con la mejor
+      coincidencia como planta_id (planta-desconocida si no hay coincidencias
+      o la identificación falla; en ese caso se re-identifica en la cola)
+    - Con `Idempotency-Key`, un reintento devuelve la respuesta original sin
+      crear otra fila ni otro objeto en el almacenamiento
+    """
+    if not supabase or not storage:
+        raise HTTPException(status_code=500, detail="Error de conexión a Supabase")
+    if organ not in ORGANOS_VALIDOS:
+        raise HTTPException(status_code=400, detail=f"Órgano no válido: {organ}")
+    
+    tmp_path = None
+    reservada = False
+    try:
+        # 1. LEER EL ARCHIVO UNA SOLA VEZ (límite de tamaño + magic bytes)
+        tmp_path, file_size, content_type, file_extension = await spool_upload(file, directory=UPLOAD_SPOOL_DIR)
+        content = await asyncio.to_thread(Path(tmp_path).read_bytes)
+        logger.info("Imagen recibida para identificar y guardar", extra={"size_bytes": file_size})
+        
+        # 2. RESERVAR LA CLAVE DE IDEMPOTENCIA
+        unique_filename = None
+        existente = None
+        if idempotency_key:
+            huella = fingerprint(content, organ, nombre_usuario, description, lat, lng)
+            estado, guardada = await asyncio.to_thread(idempotency_store.begin, idempotency_key, huella)
+            if estado == REPLAY:
+                status_code, body = guardada
+                return JSONResponse(body, status_code=status_code, headers={"Idempotent-Replayed": "true"})
+            if estado == IN_PROGRESS:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Ya hay una petición en curso con esta Idempotency-Key",
+                    headers={"Retry-After": "2"}
+                )
+            if estado == MISMATCH:
+                raise HTTPException(
+                    status_code=422,
+                    detail="La Idempotency-Key ya se usó con otra imagen u otros datos"
+                )
+            reservada = True
+            # Nombre derivado de la clave: un reintento reescribe el mismo objeto
+            unique_filename = f"{uuid.uuid5(uuid.NAMESPACE_URL, 'idempotency:' + idempotency_key)}.{file_extension}"
+            if estado == RESUMED:
+                # El intento anterior pudo llegar a insertar la fila antes de fallar
+                response = await db.execute(
+                    "imagenes.select",
+                    supabase.table("imagenes").select("id,planta_id,url_imagen,estado,lat,lng").eq("filename", unique_filename)
+                )
+                existente = response.data[0] if response.data else None
+        
+        # 3. IDENTIFICAR (un fallo de PlantNet no impide guardar la foto)
+        plant_data, cached, engine, error = None, False, None, None
+        router = get_identification_router()
+        if router:
+            try:
+                plant_data, cached, engine = await identificar(
+                    router, [(file.filename, content, content_type)], [organ]
+                )
+            except PlantNetError as e:
+                error = {"status_code": e.status_code, "error": f"PlantNet API error: {e.detail}"}
+                if e.retry_after:
+                    error["retry_after"] = round(e.retry_after, 1)
+        else:
+            error = {"status_code": 500, "error": "API Key no configurada en el servidor"}
+        identificacion = respuesta_identificacion(plant_data, cached, engine, error)
+        best_match = identificacion.get("best_match")
+        planta_id = best_match["species"]["scientificNameWithoutAuthor"] if best_match else PLANTA_DESCONOCIDA
+        
+        # 4. GUARDAR (o recuperar lo que guardó el intento anterior)
+        if existente:
+            guardado = {
+                "success": True,
+                "message": f"Imagen guardada para planta {existente['planta_id']} (pendiente de revisión)",
+                "image_id": existente["id"],
+                "planta_id": existente["planta_id"],
+                "filename": unique_filename,
+                "public_url": existente["url_imagen"],
+                "estado": existente["estado"],
+                "lat": existente.get("lat"),
+                "lng": existente.get("lng"),
+                # Se vuelve a encolar la subida: reescribe el mismo objeto (upsert)
+                "job_id": await asyncio.to_thread(job_queue.enqueue, "process_upload", {
+                    "image_id": existente["id"],
+                    "filename": unique_filename,
+                    "src_path": os.path.abspath(tmp_path),
+                    "content_type": content_type,
+                    "reidentify": existente["planta_id"] == PLANTA_DESCONOCIDA
+                })
+            }
+        else:
+            if not description and best_match:
+                description = f"Planta identificada: {best_match['species'].get('scientificName') or planta_id}"
+            guardado = await registrar_imagen(
+                tmp_path, content_type, file_extension, planta_id, nombre_usuario, description, lat, lng,
+                unique_filename=unique_filename
+            )
+        tmp_path = None
         
-        return {
-            "success": True,
-            "message": f"Imagen guardada para planta {planta_id} (pendiente de revisión)",
-            "planta_id": planta_id,
-            "filename": unique_filename,
-            "public_url": public_url,
-            "estado": "pendiente",
-            "lat": lat,
-            "lng": lng
-        }
+        resultado = {**guardado, "identification": identificacion}
+        if reservada:
+            await asyncio.to_thread(idempotency_store.complete, idempotency_key, 200, resultado)
+            reservada = False
+        return resultado
         
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
+        logger.exception("Error identificando y guardando imagen")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    finally:
+        if reservada:
+            # El reintento con la misma clave retoma el trabajo donde quedó
+            await asyncio.to_thread(idempotency_store.fail, idempotency_key)
+        if tmp_path:
+            os.remove(tmp_path)
+
+@app.get("/identify-and-save/idempotency-stats", dependencies=[Depends(require_admin)])
+async def idempotency_stats():
+    """🔁 Claves de idempotencia guardadas, respuestas repetidas y conflictos"""
+    return await asyncio.to_thread(idempotency_store.stats)
 
 # =============================================================================
 # ENDPOINTS DE ADMINISTRACIÓN
 # =============================================================================
 
-@app.delete("/delete-image/{image_id}")
+ESTADOS_VALIDOS = ['pendiente', 'publicada', 'rechazada', 'activo']
+MAX_IMAGENES_POR_LOTE = 500
+
+class LoteImagenes(BaseModel):
+    """Cuerpo de las operaciones por lote"""
+    ids: List[int]
+
+class LoteEstado(LoteImagenes):
+    nuevo_estado: str
+
+def validar_lote(ids: List[int]) -> List[int]:
+    """Quita duplicados conservando el orden y valida el tamaño del lote"""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="La lista de ids está vacía")
+    if len(ids) > MAX_IMAGENES_POR_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_IMAGENES_POR_LOTE} imágenes por lote")
+    return ids
+
+def resultados_lote(ids: List[int], exitosos: set) -> dict:
+    """Resultado por id de una operación por lote (admite fallos parciales)"""
+    resultados = [
+        {"id": i, "success": True} if i in exitosos
+        else {"id": i, "success": False, "error": "Imagen no encontrada"}
+        for i in ids
+    ]
+    return {
+        "success": len(exitosos) == len(ids),
+        "total": len(ids),
+        "exitosos": len(exitosos),
+        "fallidos": len(ids) - len(exitosos),
+        "resultados": resultados
+    }
+
+@app.delete("/delete-image/{image_id}", dependencies=[Depends(require_admin)])
 async def delete_image(image_id: int):
     """🗑️ Elimina una imagen y sus metadatos"""
-    if not supabase:
+    if not supabase or not storage:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
     try:
         # 1. OBTENER INFORMACIÓN DE LA IMAGEN
-        image_data = supabase.table("imagenes").select("*").eq("id", image_id).execute()
+        image_data = await db.execute("imagenes.select", supabase.table("imagenes").select("*").eq("id", image_id))
         
         if not image_data.data:
             raise HTTPException(status_code=404, detail="Imagen no encontrada")
@@ -387,11 +1407,12 @@ async def delete_image(image_id: int):
         filename = image_data.data[0]["filename"]
         file_path = f"public/{filename}"
         
-        # 2. ELIMINAR DEL STORAGE
-        storage_response = supabase.storage.from_(BUCKET_NAME).remove([file_path])
+        # 2. ELIMINAR DE LA BASE DE DATOS
+        await db.execute("imagenes.delete", supabase.table("imagenes").delete().eq("id", image_id))
+        unindex_image(image_id)
         
-        # 3. ELIMINAR DE LA BASE DE DATOS
-        db_response = supabase.table("imagenes").delete().eq("id", image_id).execute()
+        # 3. ELIMINAR DEL STORAGE, CON SUS VARIANTES (cola de trabajos)
+        await asyncio.to_thread(job_queue.enqueue, "delete_storage", {"paths": [file_path] + all_variant_paths(filename)})
         
         return {
             "success": True,
@@ -399,10 +1420,69 @@ async def delete_image(image_id: int):
             "deleted_filename": filename
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.put("/cambiar-estado/{image_id}")
+@app.post("/delete-images", dependencies=[Depends(require_admin)])
+async def delete_images(lote: LoteImagenes):
+    """🗑️ Elimina varias imágenes: un select, un delete y un único remove en el almacenamiento"""
+    if not supabase or not storage:
+        raise HTTPException(status_code=500, detail="Supabase no configurado")
+    
+    ids = validar_lote(lote.ids)
+    
+    try:
+        # 1. OBTENER NOMBRES DE ARCHIVO DE LAS IMÁGENES EXISTENTES
+        existentes = await db.execute("imagenes.select", supabase.table("imagenes").select("id,filename").in_("id", ids))
+        archivos = {row["id"]: row["filename"] for row in existentes.data or []}
+        
+        if archivos:
+            # 2. ELIMINAR DE LA BASE DE DATOS EN UNA SOLA SENTENCIA
+            await db.execute("imagenes.delete", supabase.table("imagenes").delete().in_("id", list(archivos)))
+            for image_id in archivos:
+                unindex_image(image_id)
+            
+            # 3. ELIMINAR DEL STORAGE EN UN SOLO REMOVE (cola de trabajos)
+            paths = []
+            for filename in archivos.values():
+                paths.append(f"public/{filename}")
+                paths.extend(all_variant_paths(filename))
+            await asyncio.to_thread(job_queue.enqueue, "delete_storage", {"paths": paths})
+        
+        return resultados_lote(ids, set(archivos))
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error eliminando imágenes: {str(e)}")
+
+@app.put("/cambiar-estado-lote", dependencies=[Depends(require_admin)])
+async def cambiar_estado_lote(lote: LoteEstado):
+    """🔄 Cambia el estado de varias imágenes en una sola sentencia"""
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase no configurado")
+    
+    if lote.nuevo_estado not in ESTADOS_VALIDOS:
+        raise HTTPException(status_code=400, detail="Estado no válido")
+    
+    ids = validar_lote(lote.ids)
+    
+    try:
+        response = await db.execute("imagenes.update", supabase.table("imagenes").update({
+            "estado": lote.nuevo_estado
+        }).in_("id", ids))
+        
+        index_image_rows(response.data)
+        await notificar_publicaciones(response.data)
+        
+        resultado = resultados_lote(ids, {row["id"] for row in response.data or []})
+        resultado["nuevo_estado"] = lote.nuevo_estado
+        return resultado
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error actualizando estados: {str(e)}")
+
+@app.put("/cambiar-estado/{image_id}", dependencies=[Depends(require_admin)])
 async def cambiar_estado_imagen(image_id: int, nuevo_estado: str):
     """🔄 Cambia el estado de una imagen (publicada, rechazada, pendiente)"""
     if not supabase:
@@ -410,17 +1490,19 @@ async def cambiar_estado_imagen(image_id: int, nuevo_estado: str):
     
     try:
         # Validar estado
-        estados_validos = ['pendiente', 'publicada', 'rechazada', 'activo']
-        if nuevo_estado not in estados_validos:
+        if nuevo_estado not in ESTADOS_VALIDOS:
             raise HTTPException(status_code=400, detail="Estado no válido")
         
-        response = supabase.table("imagenes").update({
+        response = await db.execute("imagenes.update", supabase.table("imagenes").update({
             "estado": nuevo_estado
-        }).eq("id", image_id).execute()
+        }).eq("id", image_id))
         
         if hasattr(response, 'error') and response.error:
             raise Exception(f"Error actualizando estado: {response.error.message}")
         
+        index_image_rows(response.data)
+        await notificar_publicaciones(response.data)
+        
         return {
             "success": True,
             "message": f"Estado cambiado a {nuevo_estado}",
@@ -431,7 +1513,7 @@ async def cambiar_estado_imagen(image_id: int, nuevo_estado: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 # 🆕 ENDPOINT ACTUALIZADO: Editar imagen con tipo_publicacion
-@app.put("/editar-imagen/{image_id}")
+@app.put("/editar-imagen/{image_id}", dependencies=[Depends(require_admin)])
 async def editar_imagen(
     image_id: int,
     nuevo_nombre: str,
@@ -462,24 +1544,15 @@ async def editar_imagen(
         # Remover valores None
         update_data = {k: v for k, v in update_data.items() if v is not None}
         
-        print(f"🔧 Actualizando imagen {image_id} con datos: {update_data}")
+        logger.debug("Actualizando imagen %s con datos: %s", image_id, update_data)
         
-        # Actualizar en Supabase
-        response = supabase.table("imagenes").update(update_data).eq("id", image_id).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            error_msg = str(response.error)
-            
-            # Si falla por tipo_publicacion, intentar sin ella
-            if "tipo_publicacion" in error_msg:
-                print("⚠️  Columna tipo_publicacion no existe, actualizando sin tipo...")
-                update_data.pop("tipo_publicacion", None)
-                response = supabase.table("imagenes").update(update_data).eq("id", image_id).execute()
-            
-            if hasattr(response, 'error') and response.error:
-                raise Exception(f"Error actualizando imagen: {response.error.message}")
+        # Actualizar en Supabase (solo con las columnas que existen en el esquema)
+        update_data = schema.build_payload(update_data)
+        response = await db.execute("imagenes.update", supabase.table("imagenes").update(update_data).eq("id", image_id))
         
         if response.data:
+            index_image_rows(response.data)
+            await notificar_publicaciones(response.data)
             return {
                 "success": True, 
                 "message": "Imagen actualizada correctamente",
@@ -489,111 +1562,313 @@ async def editar_imagen(
             return {"success": False, "message": "No se pudo actualizar la imagen"}
             
     except Exception as e:
-        print(f"❌ Error en editar_imagen: {str(e)}")
+        logger.exception("Error en editar_imagen")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@app.get("/admin/schema", dependencies=[Depends(require_admin)])
+async def obtener_esquema():
+    """🧩 Columnas opcionales detectadas y viajes a la base de datos ahorrados por escritura"""
+    return schema.stats()
+
+@app.get("/admin/db-stats", dependencies=[Depends(require_admin)])
+async def estadisticas_db():
+    """🗄️ Pool de consultas, timeouts e histogramas de latencia por operación"""
+    return db.stats()
+
+@app.get("/admin/duplicates-stats", dependencies=[Depends(require_admin)])
+async def estadisticas_duplicados():
+    """🪞 Tamaño del índice de duplicados, búsquedas y tiempo medio por búsqueda"""
+    return {"action": DUPLICATE_ACTION, **duplicate_index.stats()}
+
+@app.post("/admin/schema/refresh", dependencies=[Depends(require_admin)])
+async def refrescar_esquema():
+    """🧩 Vuelve a detectar las columnas opcionales (tras una migración)"""
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase no configurado")
+    
+    try:
+        columns = await db.run("imagenes.schema", schema.detect, supabase)
+        # Los índices se reconstruyen con las columnas nuevas en la próxima consulta
+        spatial_index.loaded = False
+        local_species_index.loaded = False
+        duplicate_index.loaded = False
+        response_cache.invalidate()
+        return {"success": True, "columns": columns}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error detectando esquema: {str(e)}")
+
+@app.post("/reidentificar/{image_id}", dependencies=[Depends(require_admin)])
+async def reidentificar_imagen(image_id: int):
+    """🔍 Encola la re-identificación con PlantNet de una imagen sin especie"""
+    job_id = await asyncio.to_thread(job_queue.enqueue, "reidentify", {"image_id": image_id})
+    return {"success": True, "job_id": job_id}
+
+@app.get("/jobs", dependencies=[Depends(require_admin)])
+async def listar_trabajos(
+    status: Optional[str] = Query(None, description="queued, running, done o dead"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """⏳ Estado de la cola de trabajos (conteos y últimos trabajos)"""
+    if status and status not in STATUSES:
+        raise HTTPException(status_code=400, detail="Estado de trabajo no válido")
+    
+    return {
+        "stats": await asyncio.to_thread(job_queue.stats),
+        "jobs": await asyncio.to_thread(job_queue.list, status=status, limit=limit)
+    }
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(require_admin)])
+async def obtener_trabajo(job_id: int):
+    """⏳ Estado de un trabajo"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+class NotificacionGeneral(BaseModel):
+    asunto: str
+    mensaje: str
+
+@app.get("/admin/notificaciones", dependencies=[Depends(require_admin)])
+async def listar_notificaciones(limit: int = Query(50, ge=1, le=500)):
+    """📬 Notificaciones enviadas y estado de entrega por destinatario"""
+    return {
+        "smtp": smtp_pool.stats(),
+        "notificaciones": await asyncio.to_thread(delivery_store.list, limit)
+    }
+
+@app.post("/admin/notificaciones", dependencies=[Depends(require_admin)])
+async def enviar_notificacion(notificacion: NotificacionGeneral):
+    """📬 Encola un aviso general a todos los suscriptores activos"""
+    if not notificacion.asunto.strip() or not notificacion.mensaje.strip():
+        raise HTTPException(status_code=400, detail="Asunto y mensaje son obligatorios")
+    key = f"general-{uuid.uuid4()}"
+    await asyncio.to_thread(delivery_store.register, key, notificacion.asunto)
+    job_id = await asyncio.to_thread(job_queue.enqueue, "notify_subscribers", {
+        "key": key, "subject": notificacion.asunto, "text": notificacion.mensaje
+    })
+    return {"success": True, "key": key, "job_id": job_id}
+
+@app.post("/admin/notificaciones/imagen/{image_id}", dependencies=[Depends(require_admin)])
+async def reenviar_notificacion_imagen(image_id: int):
+    """📬 (Re)encola el aviso de una noticia; solo reciben el correo quienes aún no lo tienen"""
+    key = f"imagen-{image_id}"
+    if not await asyncio.to_thread(delivery_store.register, key):
+        # Dos envíos a la vez de la misma notificación podrían duplicar correos
+        if await asyncio.to_thread(delivery_store.status, key) in ("queued", "sending", "retrying"):
+            raise HTTPException(status_code=409, detail="La notificación ya está en la cola o enviándose")
+        await asyncio.to_thread(delivery_store.set_status, key, "queued")
+    job_id = await asyncio.to_thread(job_queue.enqueue, "notify_subscribers", {"key": key, "image_id": image_id})
+    return {"success": True, "key": key, "job_id": job_id}
+
+@app.post("/jobs/{job_id}/retry", dependencies=[Depends(require_admin)])
+async def reintentar_trabajo(job_id: int):
+    """🔁 Vuelve a encolar un trabajo que agotó sus intentos (dead-letter)"""
+    if not await asyncio.to_thread(job_queue.retry, job_id):
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado en dead-letter")
+    return {"success": True, "job_id": job_id}
+
 # =============================================================================
 # ENDPOINTS DE CONSULTA
 # =============================================================================
 
 @app.get("/list-images")
-async def list_images():
-    """📋 Lista todas las imágenes de la base de datos"""
+async def list_images(
+    request: Request,
+    estado: Optional[str] = Query(None, description="Filtrar por estado (separar varios con comas)"),
+    tipo_publicacion: Optional[str] = Query(None, description="Filtrar por tipo: galeria, noticias"),
+    planta_id: Optional[str] = Query(None, description="Filtrar por planta"),
+    fields: Optional[str] = Query(None, description="Columnas a devolver, separadas por comas"),
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (sin límite = todas)"),
+    cursor: Optional[str] = Query(None, description="Valor next_cursor de la página anterior")
+):
+    """📋 Lista imágenes de la base de datos (filtros, proyección y paginación por cursor)"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Error de conexión a Supabase")
     
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+    
     try:
-        response = supabase.table("imagenes").select("*").execute()
-        
-        if hasattr(response, 'error') and response.error:
-            raise Exception(f"Error obteniendo imágenes: {response.error.message}")
+        images, next_cursor = await db.run(
+            "imagenes.select",
+            select_images,
+            supabase,
+            fields=fields,
+            estado=estado,
+            tipo_publicacion=tipo_publicacion,
+            planta_id=planta_id,
+            limit=limit,
+            cursor=cursor,
+            missing_columns=schema.missing()
+        )
         
-        return {
-            "count": len(response.data),
-            "images": response.data
-        }
+        return response_cache.store(request, {
+            "count": len(images),
+            "images": images,
+            "next_cursor": next_cursor
+        }, generation)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo imágenes: {str(e)}")
 
 @app.get("/map-images")
-async def get_map_images():
+async def get_map_images(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Columnas a devolver, separadas por comas"),
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (sin límite = todas)"),
+    cursor: Optional[str] = Query(None, description="Valor next_cursor de la página anterior")
+):
     """🗺️ Obtiene imágenes con coordenadas para mostrar en el mapa"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
+    if not (schema.has("lat") and schema.has("lng")):
+        return {"count": 0, "images": [], "next_cursor": None}
+    
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+    
     try:
-        response = supabase.table("imagenes").select("*").execute()
-        
-        if hasattr(response, 'error') and response.error:
-            raise Exception(f"Error obteniendo imágenes: {response.error.message}")
-        
-        # Filtrar imágenes con coordenadas y publicadas
-        imagenes_con_coordenadas = [
-            img for img in response.data 
-            if img.get('lat') is not None and 
-               img.get('lng') is not None and 
-               img.get('estado') == 'publicada'
-        ]
+        # Filtrar imágenes con coordenadas y publicadas (en la base de datos)
+        imagenes_con_coordenadas, next_cursor = await db.run(
+            "imagenes.select",
+            select_images,
+            supabase,
+            fields=fields,
+            estado="publicada",
+            with_coordinates=True,
+            limit=limit,
+            cursor=cursor,
+            missing_columns=schema.missing()
+        )
         
-        return {
+        return response_cache.store(request, {
             "count": len(imagenes_con_coordenadas),
-            "images": imagenes_con_coordenadas
-        }
+            "images": imagenes_con_coordenadas,
+            "next_cursor": next_cursor
+        }, generation)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo imágenes: {str(e)}")
 
 # 🆕 NUEVO ENDPOINT: Obtener imágenes para noticias
 @app.get("/imagenes-noticias")
-async def get_imagenes_noticias():
+async def get_imagenes_noticias(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Columnas a devolver, separadas por comas"),
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (sin límite = todas)"),
+    cursor: Optional[str] = Query(None, description="Valor next_cursor de la página anterior")
+):
     """📰 Obtiene imágenes marcadas como noticias para mostrar en el inicio"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
+    if not schema.has("tipo_publicacion"):
+        return {"count": 0, "images": [], "next_cursor": None}
+    
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+    
     try:
-        response = supabase.table("imagenes").select("*").execute()
+        # Filtrar imágenes marcadas como noticias y publicadas (en la base de datos)
+        imagenes_noticias, next_cursor = await db.run(
+            "imagenes.select",
+            select_images,
+            supabase,
+            fields=fields,
+            estado="publicada",
+            tipo_publicacion="noticias",
+            limit=limit,
+            cursor=cursor,
+            missing_columns=schema.missing()
+        )
         
-        if hasattr(response, 'error') and response.error:
-            raise Exception(f"Error obteniendo imágenes: {response.error.message}")
+        return response_cache.store(request, {
+            "count": len(imagenes_noticias),
+            "images": imagenes_noticias,
+            "next_cursor": next_cursor
+        }, generation)
         
-        # Filtrar imágenes marcadas como noticias y publicadas
-        imagenes_noticias = [
-            img for img in response.data 
-            if img.get('tipo_publicacion') == 'noticias' and 
-               img.get('estado') == 'publicada'
-        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo imágenes noticias: {str(e)}")
+
+@app.get("/map-clusters")
+async def get_map_clusters(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=22)
+):
+    """🗺️ Clusters de imágenes publicadas dentro del bbox (puntos individuales al acercarse)"""
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase no configurado")
+    
+    if min_lat > max_lat or min_lng > max_lng:
+        raise HTTPException(status_code=400, detail="Bounding box no válido")
+    
+    if not (schema.has("lat") and schema.has("lng")):
+        return {"zoom": zoom, "count": 0, "features": []}
+    
+    try:
+        await ensure_spatial_index()
+        features = spatial_index.query(min_lat, min_lng, max_lat, max_lng, zoom)
         
         return {
-            "count": len(imagenes_noticias),
-            "images": imagenes_noticias
+            "zoom": zoom,
+            "count": len(features),
+            "features": features
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo imágenes noticias: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo clusters: {str(e)}")
 
 @app.get("/plantas")
-async def get_plantas():
-    """🌿 Obtiene lista de todas las plantas únicas"""
+async def get_plantas(
+    request: Request,
+    prefix: Optional[str] = Query(None, description="Buscar especies que empiecen así (autocompletado)"),
+    limit: Optional[int] = Query(None, ge=1, description="Máximo de especies a devolver")
+):
+    """🌿 Obtiene el catálogo de plantas únicas con conteos y fechas de avistamiento"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+    
     try:
-        response = supabase.table("imagenes").select("planta_id").execute()
-        
-        if hasattr(response, 'error') and response.error:
-            raise Exception(f"Error: {response.error.message}")
+        await ensure_species_catalog()
+        especies = species_catalog.species(prefix=prefix, limit=limit)
         
-        plantas_unicas = list(set([img['planta_id'] for img in response.data if img['planta_id']]))
-        
-        return {
-            "count": len(plantas_unicas),
-            "plantas": plantas_unicas
-        }
+        return response_cache.store(request, {
+            "count": len(especies),
+            "plantas": [e["planta_id"] for e in especies],
+            "especies": especies
+        }, generation)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache-stats", dependencies=[Depends(require_admin)])
+async def response_cache_stats():
+    """📦 Estadísticas de la caché de respuestas (list-images, map-images, noticias, plantas)"""
+    return response_cache.stats()
+
 # =============================================================================
 # SISTEMA DE SUSCRIPTORES (NUEVO)
 # =============================================================================
@@ -603,26 +1878,20 @@ async def suscribir_usuario(
     nombre: str = Form(...),
     email: str = Form(...)
 ):
-    """📧 Suscribe un usuario a las notificaciones"""
+    """
+    📧 Suscribe un usuario a las notificaciones
+    - Un solo upsert sobre el email único: sin consulta previa y sin
+      duplicados aunque lleguen dos altas a la vez
+    """
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
     try:
         # Validar email
-        if not "@" in email or not "." in email:
+        email = normalize_email(email)
+        if not is_valid_email(email):
             raise HTTPException(status_code=400, detail="Email no válido")
         
-        # Verificar si el email ya existe
-        existing = supabase.table("suscriptores").select("*").eq("email", email).execute()
-        
-        if existing.data:
-            return {
-                "success": False,
-                "message": "Este email ya está suscrito",
-                "email": email
-            }
-        
-        # Insertar nuevo suscriptor
         suscriptor_data = {
             "nombre": nombre,
             "email": email,
@@ -630,10 +1899,29 @@ async def suscribir_usuario(
             "activo": True
         }
         
-        response = supabase.table("suscriptores").insert(suscriptor_data).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            raise Exception(f"Error guardando suscriptor: {response.error.message}")
+        # Insertar si no existe (ON CONFLICT (email) DO NOTHING): solo devuelve filas nuevas
+        try:
+            response = await db.execute(
+                "suscriptores.upsert",
+                supabase.table("suscriptores").upsert(suscriptor_data, on_conflict="email", ignore_duplicates=True)
+            )
+            creado = bool(response.data)
+        except Exception as e:
+            if not missing_unique_constraint(e):
+                raise
+            # Esquema sin la restricción única: consulta + insert (no atómico)
+            logger.warning("suscriptores.email no tiene restricción única; alta en dos pasos")
+            existing = await db.execute("suscriptores.select", supabase.table("suscriptores").select("id").eq("email", email))
+            creado = not existing.data
+            if creado:
+                await db.execute("suscriptores.insert", supabase.table("suscriptores").insert(suscriptor_data))
+        
+        if not creado:
+            return {
+                "success": False,
+                "message": "Este email ya está suscrito",
+                "email": email
+            }
         
         return {
             "success": True,
@@ -650,35 +1938,167 @@ async def suscribir_usuario(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en suscripción: {str(e)}")
 
-@app.get("/suscriptores")
-async def obtener_suscriptores():
-    """📋 Obtiene todos los suscriptores"""
+@app.get("/suscriptores", dependencies=[Depends(require_admin)])
+async def obtener_suscriptores(
+    limit: int = Query(MAX_SUBSCRIBER_PAGE, ge=1, le=MAX_SUBSCRIBER_PAGE, description="Suscriptores por página"),
+    cursor: Optional[int] = Query(None, description="next_cursor de la página anterior")
+):
+    """📋 Obtiene los suscriptores, del más reciente al más antiguo, por páginas"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
     try:
-        response = supabase.table("suscriptores").select("*").order("fecha_registro", desc=True).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            raise Exception(f"Error obteniendo suscriptores: {response.error.message}")
+        query = supabase.table("suscriptores").select(",".join(SUBSCRIBER_COLUMNS)).order("id", desc=True)
+        if cursor is not None:
+            query = query.lt("id", cursor)
+        # Una fila extra para saber si hay otra página
+        response = await db.execute("suscriptores.select", query.limit(limit + 1))
+        rows = response.data
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
         
         return {
             "success": True,
-            "count": len(response.data),
-            "suscriptores": response.data
+            "count": len(rows),
+            "suscriptores": rows,
+            "next_cursor": next_cursor
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo suscriptores: {str(e)}")
 
-@app.delete("/eliminar-suscriptor/{suscriptor_id}")
+@app.post("/suscriptores/importar", dependencies=[Depends(require_admin)])
+async def importar_suscriptores(
+    file: UploadFile = File(..., description="CSV con columnas nombre, email y (opcional) activo")
+):
+    """
+    📥 Importa suscriptores desde un CSV
+    - Se lee fila a fila y se inserta por lotes (SUBSCRIBER_IMPORT_BATCH)
+    - Los emails ya suscritos no se modifican
+    - Respuesta NDJSON: una línea por fila rechazada, una por lote y un resumen final
+    """
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase no configurado")
+    
+    # El UploadFile se cierra al devolver la respuesta, antes de consumir el stream:
+    # se copia a la carpeta de cola y el stream lee la copia
+    csv_path = await asyncio.to_thread(copiar_a_temporal, file.file, UPLOAD_SPOOL_DIR, ".csv")
+    
+    async def insertar(lote: List[Tuple[int, dict]]) -> Tuple[set, List[dict]]:
+        """Devuelve (emails insertados, errores); si el lote falla se reintenta fila a fila"""
+        registros = [registro for _, registro in lote]
+        try:
+            response = await db.execute(
+                "suscriptores.upsert",
+                supabase.table("suscriptores").upsert(registros, on_conflict="email", ignore_duplicates=True)
+            )
+            return {r["email"] for r in response.data}, []
+        except Exception as e:
+            if missing_unique_constraint(e) or len(lote) == 1:
+                return set(), [{"line": n, "email": r["email"], "error": str(e)[:300]} for n, r in lote]
+        insertados, errores = set(), []
+        for fila in lote:
+            ok, error = await insertar([fila])
+            insertados |= ok
+            errores += error
+        return insertados, errores
+    
+    async def stream():
+        totales = {"rows": 0, "inserted": 0, "existing": 0, "failed": 0}
+        fecha_registro = datetime.now().isoformat()
+        vistos: set = set()
+        errores_validacion: List[dict] = []
+        
+        def filas_validas():
+            with open(csv_path, "rb") as csv_file:
+                for linea, fila in read_csv(csv_file):
+                    totales["rows"] += 1
+                    try:
+                        registro = validate_row(fila, fecha_registro)
+                        if registro["email"] in vistos:
+                            raise ValueError("Email repetido en el archivo")
+                    except ValueError as e:
+                        totales["failed"] += 1
+                        errores_validacion.append({"line": linea, "email": fila.get("email"), "error": str(e)})
+                        continue
+                    vistos.add(registro["email"])
+                    yield linea, registro
+        
+        try:
+            for numero, lote in enumerate(batched(filas_validas(), SUBSCRIBER_IMPORT_BATCH), 1):
+                for error in errores_validacion:
+                    yield json.dumps(error, ensure_ascii=False) + "\n"
+                errores_validacion.clear()
+                
+                insertados, errores = await insertar(lote)
+                for error in errores:
+                    yield json.dumps(error, ensure_ascii=False) + "\n"
+                existentes = len(lote) - len(insertados) - len(errores)
+                totales["inserted"] += len(insertados)
+                totales["existing"] += existentes
+                totales["failed"] += len(errores)
+                yield json.dumps({"batch": numero, "inserted": len(insertados), "existing": existentes, "failed": len(errores)}) + "\n"
+        except ValueError as e:
+            # Cabecera inválida o archivo que no es UTF-8
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+        except UnicodeDecodeError:
+            yield json.dumps({"error": "El archivo debe estar en UTF-8"}) + "\n"
+        for error in errores_validacion:
+            yield json.dumps(error, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, **totales}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson",
+                             background=BackgroundTask(borrar_archivos, [csv_path]))
+
+@app.get("/suscriptores/exportar", dependencies=[Depends(require_admin)])
+async def exportar_suscriptores(
+    formato: str = Query("csv", description="csv o ndjson")
+):
+    """
+    📤 Exporta todos los suscriptores en CSV o NDJSON
+    - Se consulta por páginas de id (SUBSCRIBER_EXPORT_PAGE) y cada página se
+      envía en cuanto llega: la memoria no crece con el número de suscriptores
+    """
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase no configurado")
+    if formato not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no válido. Use: {', '.join(EXPORT_FORMATS)}")
+    
+    async def stream():
+        if formato == "csv":
+            yield to_csv([], header=True)
+        ultimo_id = 0
+        while True:
+            response = await db.execute(
+                "suscriptores.select",
+                supabase.table("suscriptores").select(",".join(SUBSCRIBER_COLUMNS))
+                .gt("id", ultimo_id).order("id").limit(SUBSCRIBER_EXPORT_PAGE)
+            )
+            filas = response.data
+            if not filas:
+                break
+            yield to_csv(filas) if formato == "csv" else to_ndjson(filas)
+            if len(filas) < SUBSCRIBER_EXPORT_PAGE:
+                break
+            ultimo_id = filas[-1]["id"]
+    
+    filename = f"suscriptores-{datetime.now():%Y%m%d}.{formato}"
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_FORMATS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.delete("/eliminar-suscriptor/{suscriptor_id}", dependencies=[Depends(require_admin)])
 async def eliminar_suscriptor(suscriptor_id: int):
     """🗑️ Elimina un suscriptor"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
     try:
-        response = supabase.table("suscriptores").delete().eq("id", suscriptor_id).execute()
+        response = await db.execute("suscriptores.delete", supabase.table("suscriptores").delete().eq("id", suscriptor_id))
         
         if hasattr(response, 'error') and response.error:
             raise Exception(f"Error eliminando suscriptor: {response.error.message}")
@@ -691,14 +2111,14 @@ async def eliminar_suscriptor(suscriptor_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error eliminando suscriptor: {str(e)}")
 
-@app.delete("/eliminar-suscriptor-email")
+@app.delete("/eliminar-suscriptor-email", dependencies=[Depends(require_admin)])
 async def eliminar_suscriptor_por_email(email: str):
     """🗑️ Elimina un suscriptor por email"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
     try:
-        response = supabase.table("suscriptores").delete().eq("email", email).execute()
+        response = await db.execute("suscriptores.delete", supabase.table("suscriptores").delete().eq("email", email))
         
         if hasattr(response, 'error') and response.error:
             raise Exception(f"Error eliminando suscriptor: {response.error.message}")
@@ -715,8 +2135,29 @@ async def eliminar_suscriptor_por_email(email: str):
 # SISTEMA DE AUTENTICACIÓN
 # =============================================================================
 
+def check_login_rate(key: str, limiter: TokenBucketLimiter):
+    """Lanza 429 con Retry-After si la clave agotó sus intentos"""
+    allowed, retry_after = limiter.allow(key)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiados intentos de inicio de sesión, espere un momento",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+
+async def registrar_acceso(user_id: int):
+    """Actualiza actualizado_at del admin (tarea en segundo plano)"""
+    try:
+        await db.execute("usuarios_administradores.update", supabase.table("usuarios_administradores").update({
+            "actualizado_at": datetime.now().isoformat()
+        }).eq("id", user_id))
+    except Exception as e:
+        logger.warning("No se pudo actualizar actualizado_at del admin %s: %s", user_id, e)
+
 @app.post("/login")
 async def login_admin(
+    request: Request,
+    background_tasks: BackgroundTasks,
     nombre_usuario: str = Form(...),
     contraseña: str = Form(...)
 ):
@@ -724,9 +2165,14 @@ async def login_admin(
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase no configurado")
     
+    # Limitar intentos antes de gastar CPU en bcrypt
+    client_ip = request.client.host if request.client else "desconocida"
+    check_login_rate(f"ip:{client_ip}", login_ip_limiter)
+    check_login_rate(f"user:{nombre_usuario.lower()}", login_user_limiter)
+    
     try:
         # Autenticar usuario
-        user = authenticate_user(nombre_usuario, contraseña)
+        user = await authenticate_user(nombre_usuario, contraseña)
         if not user:
             raise HTTPException(
                 status_code=401,
@@ -741,10 +2187,12 @@ async def login_admin(
             expires_delta=access_token_expires
         )
         
-        # Actualizar última actualización
-        supabase.table("usuarios_administradores").update({
-            "actualizado_at": datetime.now().isoformat()
-        }).eq("id", user["id"]).execute()
+        # Al iniciar sesión se vuelve a leer el admin desde la base de datos
+        invalidate_admin(user["id"])
+        login_user_limiter.reset(f"user:{nombre_usuario.lower()}")
+        
+        # Actualizar última actualización (después de responder)
+        background_tasks.add_task(registrar_acceso, user["id"])
         
         return {
             "success": True,
@@ -754,53 +2202,43 @@ async def login_admin(
             "id": user["id"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en login: {str(e)}")
 
 @app.get("/verify-token")
 async def verify_token(token: str):
     """✅ Verifica si un token JWT es válido"""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: int = payload.get("id")
-        
-        if username is None or user_id is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
-        
-        # Verificar que el usuario aún existe
-        response = supabase.table("usuarios_administradores").select("*").eq("id", user_id).execute()
-        
-        if not response.data:
-            raise HTTPException(status_code=401, detail="Usuario no encontrado")
-        
-        return {
-            "valid": True,
-            "nombre_usuario": username,
-            "id": user_id
-        }
-        
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    principal = await get_admin_principal(token)
+    return {
+        "valid": True,
+        "nombre_usuario": principal["nombre_usuario"],
+        "id": principal["id"]
+    }
+
+@app.post("/admin/principals/invalidate", dependencies=[Depends(require_admin)])
+async def invalidar_principales(user_id: Optional[int] = None):
+    """🔐 Invalida la caché de un admin (o de todos) tras cambiarlo o eliminarlo"""
+    invalidate_admin(user_id)
+    return {"success": True, "cache": principal_cache.stats()}
 
 # =============================================================================
 # INICIO DEL SERVIDOR
 # =============================================================================
 
+startup_timer.mark("import")
+
 if __name__ == "__main__":
     import uvicorn
     
-    print("\n" + "="*60)
-    print("🚀 INICIANDO SERVIDOR FASTAPI - CUENCA UBATÉ")
-    print("="*60)
-    print("🌐 URL: http://localhost:8002")
-    print("📚 Documentación: http://localhost:8002/docs") 
-    print("❤️  Health Check: http://localhost:8002/health")
-    print("🔐 Login: http://localhost:8002/login")
-    print("🔍 Identificar Plantas: http://localhost:8002/identify-plant")
-    print("🗺️  Map Images: http://localhost:8002/map-images")
-    print("📰 Noticias Images: http://localhost:8002/imagenes-noticias")
-    print("📧 Suscripciones: http://localhost:8002/suscribir")
-    print("👥 Gestión Suscriptores: http://localhost:8002/suscriptores")
-    print("⚙️  Config: http://localhost:8002/config")
+    logger.info(
+        "Iniciando servidor FastAPI - Cuenca Ubaté",
+        extra={
+            "url": "http://localhost:8002",
+            "docs": "http://localhost:8002/docs",
+            "health": "http://localhost:8002/health",
+            "metrics": "http://localhost:8002/metrics",
+        }
+    )
     uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
@@ -0,0 +1,431 @@
+"""
+📬 Notificaciones por email a los suscriptores (SMTP)
+
+- El mensaje se renderiza y serializa una sola vez por notificación; por
+  destinatario solo se anteponen las cabeceras To y Message-ID
+- Conexiones SMTP reutilizadas (pool de SMTP_POOL_SIZE) con límite de envíos
+  por segundo (token bucket) y SMTP_POOL_SIZE envíos en paralelo
+- Estado por destinatario en SQLite (pending -> sending -> sent / failed):
+  si el proceso se reinicia, el trabajo se retoma y no se reenvía a quien ya
+  lo recibió. Cada destinatario se reclama con un UPDATE condicional
+  (pending -> sending): dos despachos a la vez nunca envían al mismo. Un envío interrumpido a mitad (`sending`) queda como `unknown`
+  y no se repite (antes perder un correo que duplicarlo)
+- Errores 4xx / de conexión se reintentan en el siguiente intento del trabajo
+  (backoff de la cola), hasta NOTIFY_MAX_ATTEMPTS; 5xx (dirección rechazada) no
+
+Para probar sin enviar correos reales, un buzón local:
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_SECURITY=none
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from email.errors import HeaderParseError
+from email.headerregistry import Address
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import formataddr, formatdate
+from typing import AsyncIterator, Iterable, List, Optional
+
+from metrics import observe_dependency
+from rate_limit import TokenBucketLimiter
+from sqlite_store import SQLiteStore
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "starttls")  # starttls | ssl | none
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "no-reply@localhost")
+SMTP_FROM_NAME = os.getenv("SMTP_FROM_NAME", "Cuenca Ubaté")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_RATE_PER_SECOND = float(os.getenv("SMTP_RATE_PER_SECOND", "5"))
+
+NOTIFY_DB = os.getenv("NOTIFY_DB", "notifications.db")
+NOTIFY_PAGE_SIZE = int(os.getenv("NOTIFY_PAGE_SIZE", "500"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "3"))
+
+DELIVERY_STATUSES = ("pending", "sending", "sent", "failed", "unknown")
+
+logger = logging.getLogger(__name__)
+
+
+class SendError(Exception):
+    """Fallo al enviar a un destinatario; `permanent` = no reintentar"""
+
+    def __init__(self, message: str, permanent: bool):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class NotificationPending(Exception):
+    """Quedan destinatarios con errores temporales: el trabajo se reintenta más tarde"""
+
+
+# =============================================================================
+# MENSAJE
+# =============================================================================
+
+class RenderedMessage:
+    """Mensaje serializado una vez; por destinatario solo cambian To y Message-ID"""
+
+    def __init__(self, subject: str, text: str, html: Optional[str] = None,
+                 sender: str = SMTP_FROM, sender_name: str = SMTP_FROM_NAME):
+        self.sender = sender
+        self.subject = subject
+        message = EmailMessage(policy=SMTP_POLICY)
+        message["From"] = formataddr((sender_name, sender))
+        message["Subject"] = subject
+        message["Date"] = formatdate(localtime=True)
+        message.set_content(text)
+        if html:
+            message.add_alternative(html, subtype="html")
+        self._raw = message.as_bytes()
+        self._domain = sender.rpartition("@")[2] or "localhost"
+
+    def for_recipient(self, email: str, idstring: str) -> bytes:
+        """Antepone To y Message-ID; SendError permanente si la dirección no es válida"""
+        try:
+            # Address rechaza CR/LF y direcciones que no son un addr-spec completo
+            to = str(Address(addr_spec=email))
+            to.encode("ascii")
+        except (ValueError, IndexError, HeaderParseError):
+            raise SendError(f"Dirección no válida: {email!r}", permanent=True)
+        # Message-ID estable por notificación + destinatario (mismo id si se reintenta)
+        message_id = f"<{hashlib.sha256(idstring.encode()).hexdigest()[:32]}@{self._domain}>"
+        headers = f"To: {to}\r\nMessage-ID: {message_id}\r\n"
+        return headers.encode() + self._raw
+
+
+# =============================================================================
+# POOL DE CONEXIONES SMTP
+# =============================================================================
+
+class SMTPPool:
+    """Conexiones SMTP reutilizables (smtplib es síncrono: usar desde hilos)"""
+
+    def __init__(self, size: int = SMTP_POOL_SIZE, host: Optional[str] = SMTP_HOST, port: int = SMTP_PORT,
+                 user: Optional[str] = SMTP_USER, password: Optional[str] = SMTP_PASSWORD,
+                 security: str = SMTP_SECURITY, timeout: float = SMTP_TIMEOUT):
+        self.size = size
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        self._idle: List[smtplib.SMTP] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host)
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                conn.starttls()
+        if self.user:
+            conn.login(self.user, self.password or "")
+        self.connections_opened += 1
+        return conn
+
+    def send(self, sender: str, recipient: str, raw: bytes):
+        """Envía un mensaje; lanza SendError clasificando el fallo"""
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    conn.sendmail(sender, [recipient], raw)
+                except smtplib.SMTPServerDisconnected:
+                    # Conexión inactiva cerrada por el servidor: una nueva y un reintento
+                    conn = self._discard(conn)
+                    conn = self._connect()
+                    conn.sendmail(sender, [recipient], raw)
+                outcome = "ok"
+            except smtplib.SMTPRecipientsRefused as e:
+                code = next(iter(e.recipients.values()))[0]
+                raise SendError(f"Destinatario rechazado ({code})", permanent=code >= 500)
+            except smtplib.SMTPDataError as e:
+                # Mensaje rechazado para este destinatario (p. ej. 550 buzón no disponible)
+                raise SendError(f"SMTP {e.smtp_code}: {e.smtp_error!r}", permanent=e.smtp_code >= 500)
+            except smtplib.SMTPResponseException as e:
+                # Login, remitente o servidor: no es culpa del destinatario, se reintenta
+                conn = self._discard(conn)
+                raise SendError(f"SMTP {e.smtp_code}: {e.smtp_error!r}", permanent=False)
+            except (smtplib.SMTPException, OSError) as e:
+                conn = self._discard(conn)
+                raise SendError(str(e) or type(e).__name__, permanent=False)
+            finally:
+                observe_dependency("smtp", "send", time.perf_counter() - start, outcome)
+                if conn is not None:
+                    with self._lock:
+                        self._idle.append(conn)
+
+    @staticmethod
+    def _discard(conn: Optional[smtplib.SMTP]) -> None:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return None
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.quit()
+            except Exception:
+                self._discard(conn)
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.configured,
+            "size": self.size,
+            "idle": len(self._idle),
+            "connections_opened": self.connections_opened,
+        }
+
+
+# =============================================================================
+# ESTADO DE ENTREGAS (SQLite)
+# =============================================================================
+
+class DeliveryStore(SQLiteStore):
+    """Notificaciones y estado de entrega por destinatario"""
+
+    row_factory = sqlite3.Row
+
+    def __init__(self, db_path: str = NOTIFY_DB):
+        super().__init__(db_path)
+
+    def _create_schema(self, db: sqlite3.Connection):
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notificaciones (
+                key TEXT PRIMARY KEY,
+                subject TEXT,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entregas (
+                key TEXT NOT NULL,
+                email TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (key, email)
+            )
+            """
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_entregas_status ON entregas (key, status)")
+
+    def register(self, key: str, subject: Optional[str] = None) -> bool:
+        """Crea la notificación; False si ya existía (no se vuelve a encolar)"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO notificaciones (key, subject, status, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?)",
+                (key, subject, now, now),
+            )
+            return cursor.rowcount > 0
+
+    def register_many(self, keys: Iterable[str]) -> List[str]:
+        """Crea varias notificaciones en una transacción; devuelve las claves nuevas"""
+        now = time.time()
+        created = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key in keys:
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO notificaciones (key, subject, status, created_at, updated_at) "
+                        "VALUES (?, NULL, 'queued', ?, ?)",
+                        (key, now, now),
+                    )
+                    if cursor.rowcount > 0:
+                        created.append(key)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return created
+
+    def status(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT status FROM notificaciones WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_status(self, key: str, status: str, subject: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE notificaciones SET status = ?, subject = COALESCE(?, subject), updated_at = ? WHERE key = ?",
+                (status, subject, time.time(), key),
+            )
+
+    def recover(self, key: str) -> int:
+        """Envíos interrumpidos por una caída: no se sabe si llegaron, no se repiten"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE entregas SET status = 'unknown', updated_at = ? WHERE key = ? AND status = 'sending'",
+                (time.time(), key),
+            )
+            return cursor.rowcount
+
+    def add_recipients(self, key: str, emails: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO entregas (key, email, updated_at) VALUES (?, ?, ?)",
+                [(key, email, now) for email in emails],
+            )
+
+    def pending(self, key: str, emails: List[str]) -> List[str]:
+        """De estos emails, los que aún hay que enviar"""
+        if not emails:
+            return []
+        placeholders = ",".join("?" * len(emails))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT email FROM entregas WHERE key = ? AND status = 'pending' AND email IN ({placeholders})",
+                (key, *emails),
+            ).fetchall()
+        return [row["email"] for row in rows]
+
+    def claim(self, key: str, email: str) -> Optional[int]:
+        """
+        Reclama el envío (pending -> sending) y devuelve el número de intento;
+        None si otro despacho ya lo reclamó o el destinatario ya no está pendiente
+        """
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE entregas SET status = 'sending', attempts = attempts + 1, updated_at = ? "
+                "WHERE key = ? AND email = ? AND status = 'pending' RETURNING attempts",
+                (time.time(), key, email),
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark(self, key: str, email: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE entregas SET status = ?, last_error = ?, updated_at = ? WHERE key = ? AND email = ?",
+                (status, error[:500] if error else None, time.time(), key, email),
+            )
+
+    def counts(self, key: str) -> dict:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM entregas WHERE key = ? GROUP BY status", (key,)
+            ).fetchall()
+        counts = {status: 0 for status in DELIVERY_STATUSES}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def list(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM notificaciones ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        notifications = [dict(row) for row in rows]
+        for notification in notifications:
+            notification["deliveries"] = self.counts(notification["key"])
+        return notifications
+
+    def ping(self):
+        with self._lock:
+            self._db.execute("SELECT 1").fetchone()
+
+
+# =============================================================================
+# DESPACHADOR
+# =============================================================================
+
+class NotificationDispatcher:
+    """Envía una notificación a todos los suscriptores, página a página"""
+
+    def __init__(
+        self,
+        store: DeliveryStore,
+        pool: SMTPPool,
+        limiter: Optional[TokenBucketLimiter] = None,
+        max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+    ):
+        self.store = store
+        self.pool = pool
+        self.limiter = limiter or TokenBucketLimiter(SMTP_RATE_PER_SECOND, max(1.0, SMTP_RATE_PER_SECOND))
+        self.max_attempts = max_attempts
+
+    async def _wait_for_token(self):
+        while True:
+            allowed, retry_after = self.limiter.allow("smtp")
+            if allowed:
+                return
+            await asyncio.sleep(retry_after)
+
+    async def _deliver(self, key: str, email: str, message: RenderedMessage):
+        await self._wait_for_token()
+        attempt = await asyncio.to_thread(self.store.claim, key, email)
+        if attempt is None:
+            return
+        try:
+            await asyncio.to_thread(self.pool.send, message.sender, email, message.for_recipient(email, f"{key}.{email}"))
+        except SendError as e:
+            # Los errores temporales vuelven a `pending` para el siguiente intento del trabajo
+            status = "failed" if e.permanent or attempt >= self.max_attempts else "pending"
+            await asyncio.to_thread(self.store.mark, key, email, status, str(e))
+            return
+        await asyncio.to_thread(self.store.mark, key, email, "sent")
+
+    async def dispatch(self, key: str, message: RenderedMessage, pages: AsyncIterator[List[str]]) -> dict:
+        """
+        Registra y envía a los destinatarios de cada página. Lanza NotificationPending
+        si quedan errores temporales (el trabajo de la cola se reintenta con backoff).
+        """
+        recovered = await asyncio.to_thread(self.store.recover, key)
+        if recovered:
+            logger.warning("Envíos interrumpidos marcados como unknown", extra={"key": key, "count": recovered})
+        await asyncio.to_thread(self.store.set_status, key, "sending", message.subject)
+
+        slots = asyncio.Semaphore(self.pool.size)
+
+        async def deliver(email: str):
+            async with slots:
+                await self._deliver(key, email, message)
+
+        async for emails in pages:
+            await asyncio.to_thread(self.store.add_recipients, key, emails)
+            pending = await asyncio.to_thread(self.store.pending, key, emails)
+            await asyncio.gather(*(deliver(email) for email in pending))
+
+        counts = await asyncio.to_thread(self.store.counts, key)
+        if counts["pending"]:
+            await asyncio.to_thread(self.store.set_status, key, "retrying")
+            raise NotificationPending(f"{counts['pending']} destinatarios con errores temporales")
+        await asyncio.to_thread(self.store.set_status, key, "done")
+        logger.info("Notificación enviada", extra={"key": key, **counts})
+        return counts
@@ -0,0 +1,61 @@
+"""
+🔢 Hash perceptual de imágenes (dHash de 64 bits)
+
+- Imágenes casi iguales (recortes leves, recompresión, cambio de tamaño)
+  producen hashes a poca distancia de Hamming
+- Se guarda como 16 caracteres hexadecimales en la columna `phash` de `imagenes`
+- Las funciones son puras: se pueden ejecutar en el pool de procesos
+"""
+import io
+from typing import Optional
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+def _dhash_image(image) -> int:
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image).convert("L")
+    small = image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def dhash_bytes(data: bytes) -> int:
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        # Decodificar JPEG a baja resolución: basta para un hash de 9x8
+        image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        return _dhash_image(image)
+
+
+def dhash_file(path: str) -> int:
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        return _dhash_image(image)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value, 16)
+    except (TypeError, ValueError):
+        return None
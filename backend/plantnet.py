@@ -0,0 +1,173 @@
+"""
+🌿 Cliente asíncrono para PlantNet API
+
+- Un único httpx.AsyncClient compartido (pool de conexiones + keep-alive)
+- Timeout configurable por llamada
+- Límite de llamadas concurrentes hacia PlantNet
+- Reintentos con backoff exponencial y jitter en 429 / 5xx y en respuestas
+  200 que no son JSON válido (al agotarlos: PlantNetError 502)
+"""
+import asyncio
+import os
+import random
+import time
+from typing import List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+from metrics import observe_dependency
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+PLANTNET_URL = os.getenv("PLANTNET_URL", "https://my-api.plantnet.org/v2/identify/all")
+PLANTNET_TIMEOUT = float(os.getenv("PLANTNET_TIMEOUT", "15"))
+PLANTNET_MAX_CONCURRENCY = int(os.getenv("PLANTNET_MAX_CONCURRENCY", "8"))
+PLANTNET_MAX_RETRIES = int(os.getenv("PLANTNET_MAX_RETRIES", "2"))
+
+# Códigos de estado que vale la pena reintentar
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# (nombre_archivo, contenido, content_type)
+ImageFile = Tuple[str, bytes, str]
+
+
+class PlantNetError(Exception):
+    """Error devuelto por PlantNet (o al intentar contactarlo)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def _error_detail(response: httpx.Response) -> str:
+    """Extrae el mensaje de error sin asumir que el cuerpo es JSON"""
+    try:
+        body = response.json()
+        if isinstance(body, dict):
+            return str(body.get("error") or body.get("message") or "Error desconocido de PlantNet API")
+    except ValueError:
+        pass
+    return response.text[:200] or "Error desconocido de PlantNet API"
+
+
+# =============================================================================
+# CLIENTE
+# =============================================================================
+
+class PlantNetClient:
+    """Cliente compartido para la API de identificación de PlantNet"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = PLANTNET_URL,
+        timeout: float = PLANTNET_TIMEOUT,
+        max_concurrency: int = PLANTNET_MAX_CONCURRENCY,
+        max_retries: int = PLANTNET_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            transport=transport,
+        )
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Espera antes del siguiente intento (full jitter, respeta Retry-After)"""
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def identify(
+        self,
+        images: Sequence[ImageFile],
+        organs: Union[str, List[str]] = "auto",
+        timeout: Optional[float] = None,
+    ) -> dict:
+        """
+        Envía una o varias imágenes del mismo espécimen a PlantNet.
+        `organs` puede ser un único valor o uno por imagen.
+        """
+        if isinstance(organs, str):
+            organs = [organs] * len(images)
+
+        files = [("images", image) for image in images]
+        data = {"organs": list(organs)}
+        params = {"api-key": self.api_key}
+        call_timeout = timeout if timeout is not None else self.timeout
+
+        attempt = 0
+        while True:
+            response = None
+            try:
+                async with self._semaphore:
+                    # Se mide solo la llamada HTTP, sin la espera por el semáforo
+                    start = time.perf_counter()
+                    try:
+                        response = await self._client.post(
+                            self.base_url,
+                            params=params,
+                            files=files,
+                            data=data,
+                            timeout=call_timeout,
+                        )
+                    finally:
+                        observe_dependency(
+                            "plantnet", "identify", time.perf_counter() - start,
+                            str(response.status_code) if response is not None else "error",
+                        )
+            except httpx.TimeoutException:
+                if attempt >= self.max_retries:
+                    raise PlantNetError(504, "PlantNet API no respondió a tiempo")
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise PlantNetError(502, f"No se pudo contactar PlantNet API: {e}")
+            else:
+                if response.status_code == 200:
+                    try:
+                        result = response.json()
+                    except ValueError:
+                        # Cuerpo truncado o no JSON: se trata como una respuesta 502 de PlantNet
+                        result = None
+                    if isinstance(result, dict):
+                        return result
+                    if attempt >= self.max_retries:
+                        raise PlantNetError(502, "Respuesta no válida de PlantNet API")
+                # PlantNet responde 404 cuando no reconoce ninguna especie
+                elif response.status_code == 404:
+                    return {"results": []}
+                elif response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    raise PlantNetError(response.status_code, _error_detail(response))
+
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    async def ping(self, timeout: float = 2.0) -> int:
+        """
+        Comprueba que PlantNet responde, sin API key (no consume cuota).
+        Cualquier respuesta HTTP cuenta como alcanzable; devuelve el código.
+        """
+        response = await self._client.get(self.base_url, timeout=timeout)
+        return response.status_code
+
+    async def aclose(self):
+        """Cierra el pool de conexiones"""
+        await self._client.aclose()
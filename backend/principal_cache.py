@@ -0,0 +1,62 @@
+"""
+🔐 Caché de administradores autenticados
+
+- Evita consultar `usuarios_administradores` en cada petición con token
+- TTL corto: un admin eliminado pierde el acceso en segundos aunque su token siga vigente
+- Invalidación explícita por id (o completa) cuando un admin cambia
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+
+class PrincipalCache:
+    """Diccionario id_admin -> (expira, principal) con TTL"""
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def set(self, user_id: int, principal: dict, token_exp: Optional[float] = None):
+        """Guarda el principal; nunca más allá de la expiración del token"""
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[user_id] = (expires_at, principal)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Invalida un admin concreto, o todos si no se indica id"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,80 @@
+"""
+🩺 Sondas de disponibilidad (readiness)
+
+- Cada dependencia se comprueba en paralelo con su propio timeout
+- El resultado se guarda unos segundos: las sondas del orquestador
+  no se convierten en carga para la base de datos
+- Peticiones simultáneas comparten una única comprobación en curso
+- Solo las dependencias críticas deciden si el proceso está listo
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", "2"))
+
+
+class DependencyCheck:
+    """Una dependencia: corutina que lanza excepción si no está disponible"""
+
+    def __init__(self, name: str, check: Callable[[], Awaitable[Optional[dict]]], critical: bool = True,
+                 timeout: float = READINESS_TIMEOUT):
+        self.name = name
+        self.check = check
+        self.critical = critical
+        self.timeout = timeout
+
+    async def run(self) -> dict:
+        start = time.perf_counter()
+        result = {"critical": self.critical}
+        try:
+            extra = await asyncio.wait_for(self.check(), self.timeout)
+            result["status"] = "ok"
+            if extra:
+                result.update(extra)
+        except asyncio.TimeoutError:
+            result.update(status="timeout", error=f"Sin respuesta en {self.timeout:g}s")
+        except Exception as e:
+            result.update(status="error", error=str(e)[:300])
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+
+class ReadinessChecker:
+    """Ejecuta las comprobaciones en paralelo y guarda el resultado unos segundos"""
+
+    def __init__(self, checks: List[DependencyCheck], cache_seconds: float = READINESS_CACHE_SECONDS):
+        self.checks = checks
+        self.cache_seconds = cache_seconds
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def last(self) -> Optional[dict]:
+        """Último resultado, sin volver a comprobar"""
+        return self._result
+
+    async def check(self, force: bool = False) -> dict:
+        if not force and self._fresh():
+            return self._result
+        async with self._lock:
+            # Otra petición pudo completar la comprobación mientras se esperaba el lock
+            if not force and self._fresh():
+                return self._result
+            results = await asyncio.gather(*(c.run() for c in self.checks))
+            dependencies: Dict[str, dict] = {c.name: r for c, r in zip(self.checks, results)}
+            ready = all(r["status"] == "ok" for r in dependencies.values() if r["critical"])
+            degraded = any(r["status"] != "ok" for r in dependencies.values())
+            self._result = {
+                "ready": ready,
+                "status": "ready" if not degraded else ("degraded" if ready else "not_ready"),
+                "checked_at": time.time(),
+                "dependencies": dependencies,
+            }
+            self._checked_at = time.monotonic()
+            return self._result
+
+    def _fresh(self) -> bool:
+        return self._result is not None and time.monotonic() - self._checked_at < self.cache_seconds
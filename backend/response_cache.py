@@ -0,0 +1,131 @@
+"""
+📦 Caché de respuestas para endpoints públicos de lectura
+
+- Guarda el JSON ya serializado por ruta + parámetros
+- ETag fuerte (sha256 del cuerpo) y Last-Modified; responde 304 a
+  If-None-Match / If-Modified-Since
+- Cualquier escritura de imágenes invalida todo (contador de generación:
+  una respuesta calculada antes de la invalidación no se guarda)
+- TTL como red de seguridad cuando hay varios procesos escribiendo
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import NamedTuple, Optional
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+# Obliga al navegador/CDN a revalidar (barato gracias al ETag)
+CACHE_CONTROL = "public, no-cache"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    last_modified: float
+
+
+class ResponseCache:
+    """LRU de respuestas JSON con invalidación por generación"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self.last_modified = time.time()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(request: Request) -> str:
+        """Ruta + parámetros ordenados (el orden en la URL no genera entradas distintas)"""
+        return f"{request.url.path}?{urlencode(sorted(request.query_params.multi_items()))}"
+
+    def lookup(self, request: Request) -> Optional[Response]:
+        """Devuelve la respuesta (o un 304) si está en caché"""
+        key = self.key(request)
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] == self.generation and item[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                entry = item[2]
+            else:
+                if item is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+        return self._respond(request, entry)
+
+    def store(self, request: Request, data, generation: int) -> Response:
+        """Serializa la respuesta, la guarda si no hubo escrituras mientras se calculaba y la devuelve"""
+        body = json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        with self._lock:
+            entry = CachedResponse(body, etag, self.last_modified)
+            if generation == self.generation:
+                self._entries[self.key(request)] = (generation, time.time() + self.ttl, entry)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return self._respond(request, entry)
+
+    def invalidate(self):
+        """Llamar tras cualquier escritura en `imagenes`"""
+        with self._lock:
+            self.generation += 1
+            self.last_modified = time.time()
+            self._entries.clear()
+            self.invalidations += 1
+
+    def _respond(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {
+            "ETag": entry.etag,
+            "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+            "Cache-Control": CACHE_CONTROL,
+        }
+        if self._not_modified(request, entry):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _not_modified(request: Request, entry: CachedResponse) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return "*" in tags or any(t.removeprefix("W/") == entry.etag for t in tags)
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.last_modified) <= since
+        return False
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,114 @@
+"""
+🧩 Detección de columnas opcionales de `imagenes`
+
+- Se consulta el esquema una vez al arrancar (y bajo demanda desde un endpoint admin)
+- Los payloads de insert/update se arman con las columnas que existen,
+  en lugar de insertar, leer el error y reintentar sin la columna
+- La detección prueba todas las columnas en un solo select; cada error
+  42703 nombra la columna que falta y se repite el select sin ella
+- Métricas de escrituras, consultas de detección y viajes ahorrados
+"""
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+# Columnas que pueden faltar en esquemas antiguos
+OPTIONAL_IMAGE_COLUMNS = ("description", "lat", "lng", "tipo_publicacion", "variantes", "phash", "duplicado_de")
+
+# Mensaje de PostgreSQL/PostgREST: column imagenes.lat does not exist
+MISSING_COLUMN_RE = re.compile(r'column "?(?:\w+\.)?(\w+)"? does not exist')
+
+
+def _is_missing_column(error: Exception) -> bool:
+    # PostgREST: 42703 = columna inexistente
+    return "42703" in str(error) or "does not exist" in str(error)
+
+
+class SchemaCapabilities:
+    """Caché de las columnas opcionales disponibles en `imagenes`"""
+
+    def __init__(self, optional_columns: Iterable[str] = OPTIONAL_IMAGE_COLUMNS):
+        self.optional_columns = tuple(optional_columns)
+        self.columns: Dict[str, bool] = {}
+        self.detected_at: Optional[float] = None
+        self.writes = 0
+        self.detect_queries = 0
+        self.round_trips_saved = 0
+        self._lock = threading.Lock()
+
+    def _probe(self, client, columns: Iterable[str]):
+        with self._lock:
+            self.detect_queries += 1
+        client.table("imagenes").select(",".join(columns)).limit(0).execute()
+
+    def detect(self, client) -> Dict[str, bool]:
+        """
+        Prueba las columnas opcionales con un select sin filas (limit 0).
+        Un esquema completo se detecta en una consulta; cada columna que
+        falta cuesta una más. Si el error no nombra la columna, se prueba
+        columna por columna.
+        """
+        columns: Dict[str, bool] = {}
+        pending = list(self.optional_columns)
+        while pending:
+            try:
+                self._probe(client, pending)
+                columns.update((c, True) for c in pending)
+                break
+            except Exception as e:
+                if not _is_missing_column(e):
+                    raise
+                match = MISSING_COLUMN_RE.search(str(e))
+                if not match or match.group(1) not in pending:
+                    columns.update(self._detect_each(client, pending))
+                    break
+                columns[match.group(1)] = False
+                pending.remove(match.group(1))
+        with self._lock:
+            self.columns = {c: columns[c] for c in self.optional_columns}
+            self.detected_at = time.time()
+        return self.columns
+
+    def _detect_each(self, client, pending: Iterable[str]) -> Dict[str, bool]:
+        columns = {}
+        for column in pending:
+            try:
+                self._probe(client, [column])
+                columns[column] = True
+            except Exception as e:
+                if not _is_missing_column(e):
+                    raise
+                columns[column] = False
+        return columns
+
+    def has(self, column: str) -> bool:
+        """Las columnas no opcionales, o sin detectar aún, se asumen presentes"""
+        return self.columns.get(column, True)
+
+    def build_payload(self, data: dict) -> dict:
+        """Quita del payload las columnas opcionales que no existen y cuenta el viaje ahorrado"""
+        payload = {k: v for k, v in data.items() if self.has(k)}
+        with self._lock:
+            self.writes += 1
+            if len(payload) != len(data):
+                # Antes: insert fallido + reintento sin la columna
+                self.round_trips_saved += 1
+        return payload
+
+    def missing(self) -> tuple:
+        """Columnas opcionales que no existen en el esquema"""
+        return tuple(c for c, present in self.columns.items() if not present)
+
+    def available(self, columns: Iterable[str]) -> tuple:
+        """Filtra una lista de columnas a las que existen"""
+        return tuple(c for c in columns if self.has(c))
+
+    def stats(self) -> dict:
+        return {
+            "columns": self.columns,
+            "detected_at": self.detected_at,
+            "writes": self.writes,
+            "detect_queries": self.detect_queries,
+            "round_trips_saved": self.round_trips_saved,
+        }
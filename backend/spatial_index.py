@@ -0,0 +1,183 @@
+"""
+🗺️ Índice espacial en memoria para el mapa
+
+- Rejilla jerárquica: un nivel por zoom (0..CLUSTER_MAX_ZOOM)
+- Cada celda guarda los ids, la suma de coordenadas (centroide) y una imagen representativa
+- Altas, cambios y bajas son incrementales: O(niveles) por imagen
+- Solo se indexan imágenes publicadas con lat/lng
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# A partir de este zoom se devuelven puntos individuales
+CLUSTER_MAX_ZOOM = 16
+
+# Celdas por tesela (256 px / 64 px de radio de agrupación)
+CELLS_PER_TILE = 4
+
+# Columnas que se guardan por punto
+POINT_COLUMNS = ("id", "planta_id", "url_imagen", "description", "fecha_subida", "lat", "lng")
+
+Cell = Tuple[int, int]
+
+
+def cell_size(zoom: int) -> float:
+    """Tamaño de celda en grados para un zoom dado"""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def cell_for(lat: float, lng: float, zoom: int) -> Cell:
+    size = cell_size(zoom)
+    return int((lng + 180.0) // size), int((lat + 90.0) // size)
+
+
+def is_indexable(row: dict) -> bool:
+    return (
+        row.get("estado") == "publicada"
+        and row.get("lat") is not None
+        and row.get("lng") is not None
+    )
+
+
+class _CellData:
+    __slots__ = ("ids", "sum_lat", "sum_lng", "representative")
+
+    def __init__(self):
+        self.ids = set()
+        self.sum_lat = 0.0
+        self.sum_lng = 0.0
+        self.representative: Optional[int] = None
+
+
+class SpatialIndex:
+    """Rejilla multinivel para consultas por bbox + zoom"""
+
+    def __init__(self, max_zoom: int = CLUSTER_MAX_ZOOM):
+        self.max_zoom = max_zoom
+        self.loaded = False
+        self._points: Dict[int, dict] = {}
+        self._levels: List[Dict[Cell, _CellData]] = [dict() for _ in range(max_zoom + 1)]
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # Mantenimiento
+    # -------------------------------------------------------------------------
+
+    def _is_newer(self, a: int, b: Optional[int]) -> bool:
+        if b is None:
+            return True
+        return (self._points[a].get("fecha_subida") or "", a) > (self._points[b].get("fecha_subida") or "", b)
+
+    def _add(self, point: dict):
+        image_id = point["id"]
+        self._points[image_id] = point
+        for zoom, level in enumerate(self._levels):
+            key = cell_for(point["lat"], point["lng"], zoom)
+            data = level.get(key)
+            if data is None:
+                data = level[key] = _CellData()
+            data.ids.add(image_id)
+            data.sum_lat += point["lat"]
+            data.sum_lng += point["lng"]
+            if self._is_newer(image_id, data.representative):
+                data.representative = image_id
+
+    def _remove(self, image_id: int):
+        point = self._points.get(image_id)
+        if point is None:
+            return
+        for zoom, level in enumerate(self._levels):
+            key = cell_for(point["lat"], point["lng"], zoom)
+            data = level.get(key)
+            if data is None:
+                continue
+            data.ids.discard(image_id)
+            if not data.ids:
+                del level[key]
+                continue
+            data.sum_lat -= point["lat"]
+            data.sum_lng -= point["lng"]
+            if data.representative == image_id:
+                data.representative = None
+                for other in data.ids:
+                    if self._is_newer(other, data.representative):
+                        data.representative = other
+        del self._points[image_id]
+
+    def load(self, rows: Iterable[dict]):
+        """Construye el índice completo desde cero"""
+        with self._lock:
+            self._points = {}
+            self._levels = [dict() for _ in range(self.max_zoom + 1)]
+            for row in rows:
+                if is_indexable(row):
+                    self._add({c: row.get(c) for c in POINT_COLUMNS})
+            self.loaded = True
+
+    def upsert(self, row: dict):
+        """Alta o cambio de una imagen; si deja de ser indexable se elimina"""
+        if not self.loaded or row.get("id") is None:
+            return
+        with self._lock:
+            self._remove(row["id"])
+            if is_indexable(row):
+                self._add({c: row.get(c) for c in POINT_COLUMNS})
+
+    def remove(self, image_id: int):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove(image_id)
+
+    def __len__(self):
+        return len(self._points)
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    def query(
+        self,
+        min_lat: float,
+        min_lng: float,
+        max_lat: float,
+        max_lng: float,
+        zoom: int,
+    ) -> List[dict]:
+        """Clusters (o puntos individuales) dentro del bbox para el zoom pedido"""
+        level_zoom = max(0, min(zoom, self.max_zoom))
+        with self._lock:
+            level = self._levels[level_zoom]
+            x0, y0 = cell_for(min_lat, min_lng, level_zoom)
+            x1, y1 = cell_for(max_lat, max_lng, level_zoom)
+
+            # Recorrer la opción más barata: celdas del bbox o celdas no vacías
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(level):
+                cells = (
+                    (key, level[key])
+                    for key in ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+                    if key in level
+                )
+            else:
+                cells = (
+                    (key, data) for key, data in level.items()
+                    if x0 <= key[0] <= x1 and y0 <= key[1] <= y1
+                )
+
+            features = []
+            for _, data in cells:
+                if zoom >= self.max_zoom or len(data.ids) == 1:
+                    for image_id in data.ids:
+                        point = self._points[image_id]
+                        if min_lat <= point["lat"] <= max_lat and min_lng <= point["lng"] <= max_lng:
+                            features.append({"type": "point", **point})
+                    continue
+                count = len(data.ids)
+                features.append({
+                    "type": "cluster",
+                    "lat": data.sum_lat / count,
+                    "lng": data.sum_lng / count,
+                    "count": count,
+                    "representative": self._points[data.representative],
+                })
+            return features
@@ -0,0 +1,151 @@
+"""
+🌿 Catálogo de especies en memoria
+
+- Conteo de imágenes por especie, con desglose por estado
+- Primer y último avistamiento (fecha_subida)
+- Actualización incremental en altas, cambios y bajas de imágenes
+- Búsqueda por prefijo (autocompletado) con bisect sobre una lista ordenada
+"""
+import bisect
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+# Columnas necesarias para construir el catálogo
+CATALOG_COLUMNS = ("id", "planta_id", "estado", "fecha_subida")
+
+
+class _Species:
+    __slots__ = ("name", "fechas", "estados", "primer", "ultimo")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.fechas: Dict[int, str] = {}  # image_id -> fecha_subida
+        self.estados: Counter = Counter()
+        self.primer: Optional[str] = None
+        self.ultimo: Optional[str] = None
+
+    def add_fecha(self, image_id: int, fecha: Optional[str]):
+        self.fechas[image_id] = fecha
+        if fecha:
+            if self.primer is None or fecha < self.primer:
+                self.primer = fecha
+            if self.ultimo is None or fecha > self.ultimo:
+                self.ultimo = fecha
+
+    def remove_fecha(self, image_id: int):
+        fecha = self.fechas.pop(image_id, None)
+        # Solo se recalcula si se quitó un extremo
+        if fecha and fecha in (self.primer, self.ultimo):
+            fechas = [f for f in self.fechas.values() if f]
+            self.primer = min(fechas) if fechas else None
+            self.ultimo = max(fechas) if fechas else None
+
+    def to_dict(self) -> dict:
+        return {
+            "planta_id": self.name,
+            "total": len(self.fechas),
+            "publicadas": self.estados.get("publicada", 0),
+            "pendientes": self.estados.get("pendiente", 0),
+            "por_estado": dict(self.estados),
+            "primer_avistamiento": self.primer,
+            "ultimo_avistamiento": self.ultimo,
+        }
+
+
+class SpeciesCatalog:
+    """Catálogo incremental de especies (planta_id) a partir de la tabla imagenes"""
+
+    def __init__(self):
+        self.loaded = False
+        self._species: Dict[str, _Species] = {}
+        self._images: Dict[int, tuple] = {}  # image_id -> (planta_id, estado)
+        self._sorted_keys: List[str] = []    # nombres en minúsculas, ordenados
+        self._names: Dict[str, set] = {}     # minúsculas -> nombres originales
+        self._lock = threading.Lock()
+
+    def _add(self, row: dict):
+        name = row.get("planta_id")
+        image_id = row.get("id")
+        if not name or image_id is None:
+            return
+        species = self._species.get(name)
+        if species is None:
+            species = self._species[name] = _Species(name)
+            key = name.lower()
+            if key not in self._names:
+                self._names[key] = set()
+                bisect.insort(self._sorted_keys, key)
+            self._names[key].add(name)
+        species.add_fecha(image_id, row.get("fecha_subida"))
+        species.estados[row.get("estado")] += 1
+        self._images[image_id] = (name, row.get("estado"))
+
+    def _remove(self, image_id: int):
+        previous = self._images.pop(image_id, None)
+        if previous is None:
+            return
+        name, estado = previous
+        species = self._species[name]
+        species.remove_fecha(image_id)
+        species.estados[estado] -= 1
+        if species.estados[estado] <= 0:
+            del species.estados[estado]
+        if not species.fechas:
+            del self._species[name]
+            key = name.lower()
+            # Puede haber otra especie con el mismo nombre en minúsculas
+            self._names[key].discard(name)
+            if not self._names[key]:
+                del self._names[key]
+                index = bisect.bisect_left(self._sorted_keys, key)
+                del self._sorted_keys[index]
+
+    def load(self, rows: Iterable[dict]):
+        """Construye el catálogo completo desde cero"""
+        with self._lock:
+            self._species = {}
+            self._images = {}
+            self._sorted_keys = []
+            self._names = {}
+            for row in rows:
+                self._add(row)
+            self.loaded = True
+
+    def upsert(self, row: dict):
+        """Alta o cambio de una imagen (se usa la fila completa tras escribir)"""
+        if not self.loaded or row.get("id") is None:
+            return
+        with self._lock:
+            previous = self._images.get(row["id"])
+            fecha = None
+            if previous is not None:
+                fecha = self._species[previous[0]].fechas.get(row["id"])
+            self._remove(row["id"])
+            if "fecha_subida" not in row and fecha is not None:
+                row = {**row, "fecha_subida": fecha}
+            self._add(row)
+
+    def remove(self, image_id: int):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove(image_id)
+
+    def species(self, prefix: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Especies ordenadas por nombre; con `prefix` solo las que empiezan así"""
+        with self._lock:
+            if prefix:
+                key = prefix.lower()
+                start = bisect.bisect_left(self._sorted_keys, key)
+                end = bisect.bisect_left(self._sorted_keys, key + "\uffff")
+                keys = self._sorted_keys[start:end]
+            else:
+                keys = self._sorted_keys
+            result = []
+            for key in keys:
+                for name in sorted(self._names[key]):
+                    result.append(self._species[name].to_dict())
+                if limit is not None and len(result) >= limit:
+                    return result[:limit]
+            return result
@@ -0,0 +1,53 @@
+"""
+🗃️ Base común de los almacenes SQLite (cola de trabajos, entregas, idempotencia)
+
+- Crear el objeto no toca el disco: la conexión se abre en el lifespan
+  (open) o, si nadie la abrió, en el primer uso
+- close() la cierra y deja el almacén listo para volver a abrirse
+"""
+import sqlite3
+import threading
+from typing import Optional
+
+
+class SQLiteStore:
+    """Conexión SQLite perezosa (autocommit + WAL) con el esquema de cada almacén"""
+
+    row_factory = None
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        # _lock serializa las operaciones de cada almacén; _open_lock, la apertura
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+
+    def _create_schema(self, db: sqlite3.Connection):
+        """Crea tablas e índices (cada almacén define el suyo)"""
+        raise NotImplementedError
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        conn = self._conn
+        return conn if conn is not None else self.open()
+
+    def open(self) -> sqlite3.Connection:
+        with self._open_lock:
+            if self._conn is None:
+                db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+                if self.row_factory is not None:
+                    db.row_factory = self.row_factory
+                db.execute("PRAGMA journal_mode=WAL")
+                self._create_schema(db)
+                self._conn = db
+            return self._conn
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    def close(self):
+        with self._lock, self._open_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
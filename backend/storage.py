@@ -0,0 +1,203 @@
+"""
+📦 Almacenamiento de imágenes
+
+- Lectura de uploads por bloques a un archivo temporal (memoria constante)
+- Límite de tamaño y validación del tipo real por magic bytes
+- Backends intercambiables: Supabase Storage o sistema de archivos local
+"""
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+
+from fastapi import UploadFile
+
+from metrics import timed
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")  # supabase | local
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "media")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8002/media")
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "15")) * 1024 * 1024)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "spool")  # Uploads pendientes de subir al almacenamiento
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """Archivo rechazado antes de guardarlo"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# =============================================================================
+# VALIDACIÓN Y LECTURA POR BLOQUES
+# =============================================================================
+
+def detect_image_type(header: bytes) -> Optional[Tuple[str, str]]:
+    """Devuelve (content_type, extensión) según los magic bytes, o None"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+
+async def spool_upload(
+    file: UploadFile,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    directory: Optional[str] = None,
+) -> Tuple[str, int, str, str]:
+    """
+    Copia el upload a un archivo temporal por bloques.
+    Devuelve (ruta_temporal, tamaño, content_type, extensión); el llamador borra el archivo.
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix="upload-", dir=directory)
+    size = 0
+    image_type = None
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                if image_type is None:
+                    image_type = detect_image_type(chunk[:16])
+                    if image_type is None:
+                        raise UploadRejected(415, "El archivo no es una imagen JPEG, PNG o WEBP válida")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(413, f"La imagen supera el máximo de {max_bytes // (1024 * 1024)} MB")
+                out.write(chunk)
+        if size == 0:
+            raise UploadRejected(400, "El archivo está vacío")
+        return tmp_path, size, image_type[0], image_type[1]
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class StorageBackend:
+    """Interfaz común (métodos síncronos: ejecutar fuera del event loop)"""
+
+    name = "base"
+
+    def upload(self, path: str, local_file: str, content_type: str):
+        raise NotImplementedError
+
+    def public_url(self, path: str) -> str:
+        raise NotImplementedError
+
+    def download(self, path: str) -> bytes:
+        raise NotImplementedError
+
+    def remove(self, paths: List[str]):
+        raise NotImplementedError
+
+    def ping(self):
+        """Comprobación barata de disponibilidad (lanza excepción si falla)"""
+        raise NotImplementedError
+
+    def prepare(self):
+        """Prepara recursos locales al arrancar (no al crear el backend)"""
+
+
+class SupabaseStorage(StorageBackend):
+    """Bucket de Supabase Storage"""
+
+    name = "supabase"
+
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+
+    def upload(self, path: str, local_file: str, content_type: str):
+        # Se pasa el archivo abierto: httpx lo envía por bloques sin cargarlo entero.
+        # upsert hace que reintentar la subida sea idempotente.
+        with open(local_file, "rb") as f, timed("storage", "upload"):
+            self.client.storage.from_(self.bucket).upload(
+                path=path,
+                file=f,
+                file_options={"content-type": content_type, "upsert": "true"},
+            )
+
+    def public_url(self, path: str) -> str:
+        return self.client.storage.from_(self.bucket).get_public_url(path)
+
+    def download(self, path: str) -> bytes:
+        with timed("storage", "download"):
+            return self.client.storage.from_(self.bucket).download(path)
+
+    def remove(self, paths: List[str]):
+        with timed("storage", "remove"):
+            self.client.storage.from_(self.bucket).remove(paths)
+
+    def ping(self):
+        self.client.storage.from_(self.bucket).list("public", {"limit": 1})
+
+
+class LocalStorage(StorageBackend):
+    """Carpeta local (desarrollo y pruebas sin conexión)"""
+
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR, base_url: str = LOCAL_STORAGE_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def prepare(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def _full_path(self, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Ruta fuera del almacenamiento: {path}")
+        return full
+
+    def upload(self, path: str, local_file: str, content_type: str):
+        full = self._full_path(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with timed("storage", "upload"):
+            shutil.copyfile(local_file, full)
+
+    def public_url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
+
+    def download(self, path: str) -> bytes:
+        with open(self._full_path(path), "rb") as f, timed("storage", "download"):
+            return f.read()
+
+    def remove(self, paths: List[str]):
+        with timed("storage", "remove"):
+            for path in paths:
+                try:
+                    os.remove(self._full_path(path))
+                except FileNotFoundError:
+                    pass
+
+    def ping(self):
+        if not os.access(self.root, os.W_OK):
+            raise OSError(f"Sin permiso de escritura en {self.root}")
+
+
+def create_storage(supabase_client, bucket: str) -> Optional[StorageBackend]:
+    """Crea el backend configurado en STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "local":
+        return LocalStorage()
+    if supabase_client is None:
+        return None
+    return SupabaseStorage(supabase_client, bucket)
@@ -0,0 +1,130 @@
+"""
+📧 Suscriptores: alta atómica, importación CSV y exportación en streaming
+
+- Alta con un solo upsert sobre la restricción única de `email`
+  (ON CONFLICT DO NOTHING): un viaje a la base de datos y sin carreras entre
+  altas simultáneas del mismo email. Requiere la restricción:
+      ALTER TABLE suscriptores ADD CONSTRAINT suscriptores_email_key UNIQUE (email);
+- Importación: el CSV se lee fila a fila y se inserta por lotes; cada fila
+  inválida o rechazada se informa con su número de línea
+- Exportación: páginas por id (keyset), una página en memoria como máximo
+"""
+import csv
+import io
+import json
+import os
+import re
+from email.utils import parseaddr
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+SUBSCRIBER_COLUMNS = ("id", "nombre", "email", "fecha_registro", "activo")
+# Columnas que se leen del CSV; activo es opcional (por defecto, activo)
+IMPORT_COLUMNS = ("nombre", "email", "activo")
+REQUIRED_IMPORT_COLUMNS = ("nombre", "email")
+
+SUBSCRIBER_IMPORT_BATCH = int(os.getenv("SUBSCRIBER_IMPORT_BATCH", "500"))
+SUBSCRIBER_EXPORT_PAGE = int(os.getenv("SUBSCRIBER_EXPORT_PAGE", "1000"))
+MAX_SUBSCRIBER_PAGE = 1000
+MAX_EMAIL_LENGTH = 254
+
+# local@dominio: dot-atom (RFC 5322) y etiquetas de dominio con TLD alfabético
+_EMAIL_PATTERN = re.compile(
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}"
+)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def is_valid_email(email: str) -> bool:
+    """
+    addr-spec ASCII sin comentarios ni nombre visible. El email acaba en la
+    cabecera To: de las notificaciones: CR/LF o caracteres de control no pasan
+    """
+    if len(email) > MAX_EMAIL_LENGTH or not _EMAIL_PATTERN.fullmatch(email):
+        return False
+    name, address = parseaddr(email)
+    return not name and address == email
+
+
+def missing_unique_constraint(error: Exception) -> bool:
+    """PostgREST 42P10: no hay restricción única que coincida con on_conflict"""
+    return "42P10" in str(error)
+
+
+def _parse_activo(value: Optional[str]) -> bool:
+    if value is None or not value.strip():
+        return True
+    normalized = value.strip().lower()
+    if normalized in ("1", "true", "si", "sí", "yes", "activo"):
+        return True
+    if normalized in ("0", "false", "no", "inactivo"):
+        return False
+    raise ValueError(f"Valor de activo no válido: {value}")
+
+
+def read_csv(binary_file) -> Iterator[Tuple[int, dict]]:
+    """Filas del CSV como (número de línea, dict), sin cargar el archivo entero"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        headers = {(h or "").strip().lower() for h in reader.fieldnames or ()}
+        missing = [c for c in REQUIRED_IMPORT_COLUMNS if c not in headers]
+        if missing:
+            raise ValueError(
+                f"Faltan columnas en el CSV: {', '.join(missing)} (columnas admitidas: {', '.join(IMPORT_COLUMNS)})"
+            )
+        for row in reader:
+            fields = {(k or "").strip().lower(): (v or "") for k, v in row.items() if k}
+            # Las demás columnas se ignoran
+            yield reader.line_num, {c: fields[c] for c in IMPORT_COLUMNS if c in fields}
+    finally:
+        # El archivo pertenece al llamador: no se cierra con el wrapper
+        text.detach()
+
+
+def validate_row(row: dict, fecha_registro: str) -> dict:
+    """Convierte una fila del CSV en el registro a insertar; ValueError si no es válida"""
+    email = normalize_email(row.get("email"))
+    if not is_valid_email(email):
+        raise ValueError("Email no válido")
+    nombre = (row.get("nombre") or "").strip()
+    if not nombre:
+        raise ValueError("Nombre vacío")
+    return {
+        "nombre": nombre[:200],
+        "email": email,
+        "fecha_registro": fecha_registro,
+        "activo": _parse_activo(row.get("activo")),
+    }
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch: list = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_csv(rows: List[dict], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=SUBSCRIBER_COLUMNS, extrasaction="ignore", lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def to_ndjson(rows: List[dict]) -> str:
+    return "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
@@ -0,0 +1,80 @@
+"""Las pruebas importan los módulos de backend/ igual que main.py (imports planos)"""
+import os
+import sys
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN = {"id": 1, "nombre_usuario": "admin"}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """
+    La API con Supabase en memoria (FakeSupabase), almacenamiento local y
+    almacenes SQLite en tmp_path. Los endpoints de admin no piden token y el
+    worker de trabajos no arranca: las pruebas los ejecutan con run_jobs()
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+    from fake_supabase import FakeSupabase
+    from identification import LocalSpeciesIndex
+    from identification_cache import IdentificationCache
+    from circuit_breaker import CircuitBreaker
+    from duplicate_index import DuplicateIndex
+    from plantnet import PlantNetClient
+    from principal_cache import PrincipalCache
+    from rate_limit import TokenBucketLimiter
+    from response_cache import ResponseCache
+    from schema import SchemaCapabilities
+    from spatial_index import SpatialIndex
+    from species_catalog import SpeciesCatalog
+    from storage import LocalStorage
+
+    # Los almacenes SQLite usan rutas relativas: se abren en tmp_path
+    monkeypatch.chdir(tmp_path)
+    fake = FakeSupabase()
+    monkeypatch.setattr(main, "supabase", fake)
+    monkeypatch.setattr(main, "storage", LocalStorage(str(tmp_path / "media"), "http://test/media"))
+    # Estado en memoria nuevo en cada prueba
+    for name, value in {
+        "schema": SchemaCapabilities(),
+        "spatial_index": SpatialIndex(),
+        "species_catalog": SpeciesCatalog(),
+        "local_species_index": LocalSpeciesIndex(excluded_species=("planta-desconocida",)),
+        "duplicate_index": DuplicateIndex(),
+        "response_cache": ResponseCache(),
+        "identification_cache": IdentificationCache(db_path=None),
+        "principal_cache": PrincipalCache(),
+        "plantnet_breaker": CircuitBreaker("plantnet"),
+        "plantnet_limiter": TokenBucketLimiter(1000, 1000),
+        "login_ip_limiter": TokenBucketLimiter(main.LOGIN_ATTEMPTS_PER_MINUTE_IP / 60, main.LOGIN_ATTEMPTS_PER_MINUTE_IP),
+        "login_user_limiter": TokenBucketLimiter(main.LOGIN_ATTEMPTS_PER_MINUTE_USER / 60, main.LOGIN_ATTEMPTS_PER_MINUTE_USER),
+        "_plantnet_client": None,
+        "_identification_router": None,
+    }.items():
+        monkeypatch.setattr(main, name, value)
+    monkeypatch.setattr(main.job_worker, "start", lambda: None)
+    monkeypatch.setitem(main.app.dependency_overrides, main.require_admin, lambda: ADMIN)
+
+    def use_plantnet(handler):
+        """Cliente PlantNet contra httpx.MockTransport(handler)"""
+        client = PlantNetClient("test-key", base_url="https://plantnet.test/identify",
+                                transport=httpx.MockTransport(handler), backoff_base=0.001, backoff_max=0.01)
+        monkeypatch.setattr(main, "_plantnet_client", client)
+        monkeypatch.setattr(main, "_identification_router", None)
+
+    with TestClient(main.app) as client:
+        def run_jobs() -> int:
+            """Ejecuta los trabajos listos en el event loop de la app; devuelve cuántos"""
+            done = 0
+            while client.portal.call(main.job_worker.run_one):
+                done += 1
+            return done
+
+        yield SimpleNamespace(client=client, supabase=fake, main=main, media=tmp_path / "media",
+                              use_plantnet=use_plantnet, run_jobs=run_jobs)
@@ -0,0 +1,155 @@
+"""
+Doble en memoria del cliente síncrono de supabase-py (solo tablas)
+
+Cubre los métodos del query builder que usa la API. Las columnas
+desconocidas fallan como en PostgREST (42703) si la tabla declara su
+esquema con `columns`. `calls` registra cada execute() como (tabla, operación).
+"""
+import itertools
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns: Optional[List[str]] = None
+        self.payload = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.orders = []
+        self._limit: Optional[int] = None
+        self._negate = False
+
+    # --- operaciones ---------------------------------------------------------
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self.op = "select"
+        self.columns = None if columns == "*" else [c.strip() for c in columns.split(",") if c.strip()]
+        return self
+
+    def insert(self, data):
+        self.op, self.payload = "insert", data
+        return self
+
+    def upsert(self, data, on_conflict: Optional[str] = None, ignore_duplicates: bool = False):
+        self.op, self.payload = "upsert", data
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    # --- filtros -------------------------------------------------------------
+
+    def _filter(self, test):
+        negate, self._negate = self._negate, False
+        self.filters.append((lambda row: not test(row)) if negate else test)
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] < value)
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] > value)
+
+    def is_(self, column, value):
+        assert value == "null"
+        return self._filter(lambda row: row.get(column) is None)
+
+    def or_(self, expression):
+        raise NotImplementedError("FakeSupabase no interpreta filtros or_")
+
+    def order(self, column, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    # --- ejecución -----------------------------------------------------------
+
+    def _check_columns(self, columns: Iterable[str]):
+        known = self.client.columns.get(self.table)
+        if known is None:
+            return
+        for column in columns:
+            if column not in known:
+                raise Exception(f"{{'code': '42703', 'message': 'column {self.table}.{column} does not exist'}}")
+
+    def execute(self):
+        self.client.calls.append((self.table, self.op))
+        if self.client.fail.get((self.table, self.op)):
+            raise self.client.fail[(self.table, self.op)]
+        rows = self.client.tables.setdefault(self.table, [])
+
+        if self.op in ("insert", "upsert"):
+            items = self.payload if isinstance(self.payload, list) else [self.payload]
+            created = []
+            for item in items:
+                self._check_columns(item)
+                if self.op == "upsert" and self.on_conflict:
+                    existing = next((r for r in rows if r.get(self.on_conflict) == item.get(self.on_conflict)), None)
+                    if existing is not None:
+                        if not self.ignore_duplicates:
+                            existing.update(item)
+                            created.append(dict(existing))
+                        continue
+                row = dict(item)
+                row.setdefault("id", next(self.client.ids))
+                rows.append(row)
+                created.append(dict(row))
+            return SimpleNamespace(data=created, count=len(created))
+
+        self._check_columns(self.columns or ())
+        matched = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.op == "update":
+            self._check_columns(self.payload)
+            for row in matched:
+                row.update(self.payload)
+            return SimpleNamespace(data=[dict(r) for r in matched], count=len(matched))
+        if self.op == "delete":
+            for row in matched:
+                rows.remove(row)
+            return SimpleNamespace(data=[dict(r) for r in matched], count=len(matched))
+
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda r: (r.get(column) is None, r.get(column) or 0), reverse=desc)
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        data = [{c: r.get(c) for c in self.columns} if self.columns else dict(r) for r in matched]
+        return SimpleNamespace(data=data, count=len(data))
+
+
+class FakeSupabase:
+    def __init__(self, columns: Optional[Dict[str, Iterable[str]]] = None):
+        self.tables: Dict[str, List[dict]] = {}
+        self.columns = {table: set(cols) for table, cols in (columns or {}).items()}
+        self.calls: List[tuple] = []
+        # (tabla, operación) -> excepción que lanzará execute()
+        self.fail: Dict[tuple, Exception] = {}
+        self.ids = itertools.count(1)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
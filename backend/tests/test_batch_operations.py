@@ -0,0 +1,40 @@
+"""📦 Operaciones por lote: una sentencia por lote y resultado por id con fallos parciales"""
+
+
+def imagen(image_id, estado="pendiente"):
+    return {"id": image_id, "filename": f"{image_id}.jpg", "planta_id": "Quercus", "estado": estado}
+
+
+def por_id(resultado) -> dict:
+    return {r["id"]: r["success"] for r in resultado["resultados"]}
+
+
+def test_cambiar_estado_lote_con_ids_inexistentes(api):
+    api.supabase.tables["imagenes"] = [imagen(1), imagen(2)]
+    response = api.client.put("/cambiar-estado-lote", json={"ids": [1, 99, 2, 1], "nuevo_estado": "rechazada"})
+    assert response.status_code == 200
+    resultado = response.json()
+    # Los ids repetidos cuentan una vez; el inexistente falla sin tumbar el lote
+    assert (resultado["success"], resultado["total"], resultado["exitosos"], resultado["fallidos"]) == (False, 3, 2, 1)
+    assert por_id(resultado) == {1: True, 99: False, 2: True}
+    assert {r["estado"] for r in api.supabase.tables["imagenes"]} == {"rechazada"}
+    assert api.supabase.calls.count(("imagenes", "update")) == 1
+
+
+def test_delete_images_con_ids_inexistentes(api):
+    api.supabase.tables["imagenes"] = [imagen(1), imagen(2), imagen(3)]
+    response = api.client.post("/delete-images", json={"ids": [3, 42, 1]})
+    assert response.status_code == 200
+    resultado = response.json()
+    assert por_id(resultado) == {3: True, 42: False, 1: True}
+    assert [r["id"] for r in api.supabase.tables["imagenes"]] == [2]
+    assert api.supabase.calls.count(("imagenes", "delete")) == 1
+    # Un solo trabajo de borrado en el almacenamiento para todo el lote
+    jobs = api.main.job_queue.list(status="queued", limit=10)
+    assert [j["kind"] for j in jobs] == ["delete_storage"]
+
+
+def test_lote_vacio_o_demasiado_grande(api):
+    assert api.client.post("/delete-images", json={"ids": []}).status_code == 400
+    ids = list(range(api.main.MAX_IMAGENES_POR_LOTE + 1))
+    assert api.client.put("/cambiar-estado-lote", json={"ids": ids, "nuevo_estado": "publicada"}).status_code == 400
@@ -0,0 +1,60 @@
+"""🪞 Casi duplicados al subir: marcar (flag), rechazar (reject) o ignorar (off)"""
+import io
+import os
+import random
+
+import pytest
+from PIL import Image
+
+
+def foto(seed: int, quality: int = 90) -> bytes:
+    """Ruido en gris ampliado: cada semilla da un hash perceptual distinto"""
+    rng = random.Random(seed)
+    small = Image.frombytes("L", (9, 8), bytes(rng.randrange(256) for _ in range(72)))
+    out = io.BytesIO()
+    small.resize((180, 160), Image.NEAREST).convert("RGB").save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def subir(client, content):
+    return client.post("/upload", files={"file": ("foto.jpg", content, "image/jpeg")}, data={"planta_id": "Quercus"})
+
+
+@pytest.fixture
+def duplicados(api, monkeypatch):
+    """Hash perceptual en hilos (sin pool de procesos) y la acción que elija cada prueba"""
+    monkeypatch.setattr(api.main, "get_pool", lambda: None)
+    return lambda action: monkeypatch.setattr(api.main, "DUPLICATE_ACTION", action)
+
+
+def test_flag_marca_la_copia_recomprimida(api, duplicados):
+    duplicados("flag")
+    original = subir(api.client, foto(1)).json()
+    assert original["duplicates"] == []
+    # La misma foto con otra compresión se marca; otra foto no
+    copia = subir(api.client, foto(1, quality=60)).json()
+    assert [d["image_id"] for d in copia["duplicates"]] == [original["image_id"]]
+    assert subir(api.client, foto(2)).json()["duplicates"] == []
+
+    filas = {r["id"]: r for r in api.supabase.tables["imagenes"]}
+    assert filas[copia["image_id"]]["duplicado_de"] == original["image_id"]
+    assert "duplicado_de" not in filas[original["image_id"]]
+
+
+def test_reject_responde_409_sin_guardar(api, duplicados):
+    duplicados("reject")
+    original = subir(api.client, foto(1)).json()
+    response = subir(api.client, foto(1, quality=60))
+    assert response.status_code == 409
+    assert f"id {original['image_id']}" in response.json()["detail"]
+    assert len(api.supabase.tables["imagenes"]) == 1
+    # El archivo rechazado no queda en la carpeta de cola (solo el del trabajo pendiente)
+    assert len(os.listdir("spool")) == 1
+
+
+def test_off_no_busca_duplicados(api, duplicados):
+    duplicados("off")
+    subir(api.client, foto(1)).raise_for_status()
+    copia = subir(api.client, foto(1)).json()
+    assert copia["duplicates"] == []
+    assert all(r.get("phash") for r in api.supabase.tables["imagenes"])
@@ -0,0 +1,83 @@
+"""🔁 Idempotency-Key en /identify-and-save: repetición, conflicto, petición en curso y reintentos"""
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from PIL import Image
+
+from idempotency import fingerprint
+
+
+def imagen(color=(30, 120, 40)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(out, "JPEG")
+    return out.getvalue()
+
+
+def guardar(client, key, content, **data):
+    return client.post("/identify-and-save", files={"file": ("foto.jpg", content, "image/jpeg")},
+                       data=data, headers={"Idempotency-Key": key})
+
+
+async def plantnet_lento(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(0.3)
+    return httpx.Response(200, json={"results": [
+        {"score": 0.9, "species": {"scientificName": "Quercus humboldtii", "scientificNameWithoutAuthor": "Quercus humboldtii"}}
+    ]})
+
+
+def test_reintento_devuelve_la_respuesta_original(api):
+    content = imagen()
+    first = guardar(api.client, "clave-1", content, description="roble")
+    assert first.status_code == 200
+    again = guardar(api.client, "clave-1", content, description="roble")
+    assert again.status_code == 200
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.json() == first.json()
+    assert api.supabase.calls.count(("imagenes", "insert")) == 1
+
+
+def test_misma_clave_con_otros_datos_responde_422(api):
+    content = imagen()
+    assert guardar(api.client, "clave-1", content, description="roble").status_code == 200
+    assert guardar(api.client, "clave-1", content, description="otro").status_code == 422
+    assert guardar(api.client, "clave-1", imagen((200, 10, 10)), description="roble").status_code == 422
+    assert api.supabase.calls.count(("imagenes", "insert")) == 1
+
+
+def test_clave_en_curso_responde_409(api):
+    content = imagen()
+    # Otra petición con la misma clave y los mismos datos reservó la clave y no ha terminado
+    huella = fingerprint(content, "auto", "usuario_web", "", None, None)
+    api.main.idempotency_store.begin("clave-1", huella)
+    response = guardar(api.client, "clave-1", content)
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "2"
+    assert ("imagenes", "insert") not in api.supabase.calls
+
+
+def test_peticiones_concurrentes_con_la_misma_clave(api):
+    api.use_plantnet(plantnet_lento)
+    content = imagen()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        respuestas = list(pool.map(lambda _: guardar(api.client, "clave-1", content), range(2)))
+    assert sorted(r.status_code for r in respuestas) == [200, 409]
+    assert api.supabase.calls.count(("imagenes", "insert")) == 1
+    # Claves distintas no se bloquean entre sí
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        respuestas = list(pool.map(lambda key: guardar(api.client, key, content), ["clave-2", "clave-3"]))
+    assert [r.status_code for r in respuestas] == [200, 200]
+    assert api.supabase.calls.count(("imagenes", "insert")) == 3
+
+
+def test_intento_fallido_se_retoma_con_la_misma_clave(api):
+    content = imagen()
+    api.supabase.fail[("imagenes", "insert")] = RuntimeError("conexión perdida")
+    assert guardar(api.client, "clave-1", content).status_code == 500
+    del api.supabase.fail[("imagenes", "insert")]
+
+    response = guardar(api.client, "clave-1", content)
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    assert len(api.supabase.tables["imagenes"]) == 1
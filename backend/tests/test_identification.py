@@ -0,0 +1,135 @@
+"""🔀 PlantNetBackend, su circuit breaker y el router entre motores"""
+import asyncio
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker
+from identification import IdentificationRouter, PlantNetBackend
+from plantnet import PlantNetError
+
+IMAGE = ("hoja.jpg", b"\xff\xd8\xff", "image/jpeg")
+
+
+class StubClient:
+    def __init__(self, error=None, delay=0.0):
+        self.error = error
+        self.delay = delay
+
+    async def identify(self, images, organs):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"results": []}
+
+
+def identify(backend: PlantNetBackend):
+    return asyncio.run(backend.identify([IMAGE], ["auto"]))
+
+
+def test_5xx_cuenta_como_fallo_y_4xx_no():
+    breaker = CircuitBreaker("test", min_calls=100)
+    with pytest.raises(PlantNetError):
+        identify(PlantNetBackend(StubClient(PlantNetError(503, "caído")), breaker=breaker))
+    with pytest.raises(PlantNetError):
+        identify(PlantNetBackend(StubClient(PlantNetError(400, "imagen no válida")), breaker=breaker))
+    assert [ok for _, _, ok in breaker._calls] == [False, True]
+
+
+def test_cancelacion_no_cuenta_para_el_breaker():
+    breaker = CircuitBreaker("test", min_calls=1)
+    backend = PlantNetBackend(StubClient(delay=10), breaker=breaker)
+
+    async def run():
+        task = asyncio.create_task(backend.identify([IMAGE], ["auto"]))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert len(breaker._calls) == 0
+    assert breaker.state == CLOSED
+
+
+def test_cancelar_la_prueba_en_semiabierto_libera_el_permiso():
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0)
+    breaker.record(0.1, False)  # abre el circuito; con open_seconds=0 pasa a semiabierto
+    assert breaker.state == HALF_OPEN
+    backend = PlantNetBackend(StubClient(delay=10), breaker=breaker)
+
+    async def run():
+        task = asyncio.create_task(backend.identify([IMAGE], ["auto"]))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    # Sin release() la siguiente llamada de prueba quedaría bloqueada para siempre
+    assert breaker.allow()
+
+
+class StubBackend:
+    def __init__(self, name, score=None, error=None, available=True):
+        self.name = name
+        self.score = score
+        self.error = error
+        self._available = available
+        self.calls = 0
+
+    def available(self):
+        return self._available
+
+    async def identify(self, images, organs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {"results": [{"score": self.score, "species": {"scientificName": self.name}}] if self.score else []}
+
+
+def route(router):
+    return asyncio.run(router.identify([IMAGE], ["auto"]))
+
+
+def test_router_usa_el_motor_local_si_tiene_confianza():
+    remote, local = StubBackend("plantnet", 0.8), StubBackend("local", 0.95)
+    router = IdentificationRouter(remote, local, confident_score=0.9)
+    assert route(router)[1] == "local"
+    assert remote.calls == 0
+    # Con poca confianza consulta PlantNet
+    local.score = 0.5
+    assert route(router)[1] == "plantnet"
+    assert router.stats()["routed"] == {"local_confident": 1, "plantnet": 1}
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_router_recurre_al_local_si_plantnet_falla(status_code):
+    remote = StubBackend("plantnet", error=PlantNetError(status_code, "caído"))
+    router = IdentificationRouter(remote, StubBackend("local", 0.4), confident_score=0.9)
+    data, engine = route(router)
+    assert engine == "local" and data["results"][0]["score"] == 0.4
+    assert router.routed["local_fallback"] == 1
+
+
+def test_router_propaga_errores_del_cliente_y_fallos_sin_respuesta_local():
+    router = IdentificationRouter(StubBackend("plantnet", error=PlantNetError(400, "imagen no válida")),
+                                  StubBackend("local", 0.4), confident_score=0.9)
+    with pytest.raises(PlantNetError) as error:
+        route(router)
+    assert error.value.status_code == 400
+    # Motor local sin coincidencias (o roto): el 503 de PlantNet llega al cliente
+    for local in (StubBackend("local"), StubBackend("local", error=RuntimeError("hash"))):
+        router = IdentificationRouter(StubBackend("plantnet", error=PlantNetError(503, "caído")), local)
+        with pytest.raises(PlantNetError) as error:
+            route(router)
+        assert error.value.status_code == 503
+
+
+def test_router_con_plantnet_no_disponible():
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=30)
+    breaker.record(0.1, False)
+    remote = PlantNetBackend(StubClient(), breaker=breaker)
+    assert route(IdentificationRouter(remote, StubBackend("local", 0.3)))[1] == "local"
+    with pytest.raises(PlantNetError) as error:
+        route(IdentificationRouter(remote, StubBackend("local", available=False)))
+    assert error.value.status_code == 503 and error.value.retry_after > 0
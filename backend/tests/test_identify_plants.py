@@ -0,0 +1,55 @@
+"""🔍 /identify-plants: lote de especímenes en NDJSON con PlantNet simulado"""
+import io
+import json
+import os
+
+import httpx
+from PIL import Image
+
+
+def imagen(color) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(out, "JPEG")
+    return out.getvalue()
+
+
+def plantnet(request: httpx.Request) -> httpx.Response:
+    # Una especie distinta según cuántas imágenes lleve la consulta
+    imagenes = request.content.count(b'name="images"')
+    return httpx.Response(200, json={"results": [
+        {"score": 0.9, "species": {"scientificName": f"Especie {imagenes}"}}
+    ]})
+
+
+def lineas(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_lote_de_especimenes_en_ndjson(api):
+    api.use_plantnet(plantnet)
+    files = [("files", (f"{n}.jpg", imagen((n * 40, 90, 20)), "image/jpeg")) for n in range(3)]
+    response = api.client.post("/identify-plants", files=files,
+                               data={"organs": ["leaf", "flower", "auto"], "specimens": ["a", "a", "b"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    *especimenes, resumen = lineas(response)
+    por_especimen = {r["specimen"]: r for r in especimenes}
+    assert resumen == {"done": True, "specimens": 2, "success": 2, "failed": 0}
+    assert por_especimen["a"]["files"] == ["0.jpg", "1.jpg"]
+    assert por_especimen["a"]["best_match"]["species"]["scientificName"] == "Especie 2"
+    assert por_especimen["b"]["best_match"]["species"]["scientificName"] == "Especie 1"
+    # Las copias en la carpeta de cola se borran al terminar la respuesta
+    assert os.listdir("spool") == []
+
+
+def test_archivo_que_no_es_imagen_rechaza_el_lote_antes_de_consultar(api):
+    consultas = []
+    api.use_plantnet(lambda request: consultas.append(request) or plantnet(request))
+    files = [("files", ("0.jpg", imagen((0, 90, 20)), "image/jpeg")),
+             ("files", ("1.jpg", b"no es una imagen", "image/jpeg"))]
+    response = api.client.post("/identify-plants", files=files)
+    assert response.status_code == 415
+    assert "1.jpg" in response.json()["detail"]
+    assert consultas == []
+    assert os.listdir("spool") == []
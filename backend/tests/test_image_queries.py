@@ -0,0 +1,60 @@
+"""📋 Cursores de paginación de imágenes"""
+import base64
+import json
+
+import pytest
+
+from image_queries import apply_keyset, decode_cursor, encode_cursor
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+class RecordingQuery:
+    def __init__(self):
+        self.filters = []
+
+    def or_(self, filters):
+        self.filters.append(filters)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+
+def test_cursor_ida_y_vuelta():
+    cursor = encode_cursor({"fecha_subida": "2025-03-01T10:20:30.123456+00:00", "id": 42})
+    assert decode_cursor(cursor) == ("2025-03-01T10:20:30.123456+00:00", 42)
+
+
+@pytest.mark.parametrize("value", [
+    ['2025-03-01",id.gt.0,or(id.gt.0', 1],
+    ["2025-03-01T10:00:00)", 1],
+    ["no es una fecha", 1],
+    [20250301, 1],
+    ["2025-03-01T10:00:00", "1"],
+    ["2025-03-01T10:00:00", True],
+    ["2025-03-01T10:00:00"],
+])
+def test_cursor_manipulado_es_invalido(value):
+    with pytest.raises(ValueError, match="Cursor no válido"):
+        decode_cursor(raw_cursor(value))
+
+
+def test_cursor_no_base64_es_invalido():
+    with pytest.raises(ValueError):
+        decode_cursor("%%%")
+
+
+def test_cursor_con_fecha_nula():
+    cursor = encode_cursor({"fecha_subida": None, "id": 7})
+    assert decode_cursor(cursor) == (None, 7)
+    query = apply_keyset(RecordingQuery(), cursor)
+    assert query.filters == ["and(fecha_subida.is.null,id.lt.7),fecha_subida.not.is.null"]
+    assert "None" not in query.filters[0]
+
+
+def test_filtro_usa_la_fecha_normalizada():
+    query = apply_keyset(RecordingQuery(), raw_cursor(["2025-03-01 10:00:00", 5]))
+    assert query.filters == ['fecha_subida.lt."2025-03-01T10:00:00",and(fecha_subida.eq."2025-03-01T10:00:00",id.lt.5)']
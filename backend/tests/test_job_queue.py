@@ -0,0 +1,61 @@
+"""⏳ Cola de trabajos: concesión de trabajos largos y encolado desde los endpoints"""
+import asyncio
+import threading
+
+from job_queue import JobQueue, JobWorker
+
+
+def test_heartbeat_impide_que_otro_worker_retome_un_trabajo_vivo(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0.3)
+    worker = JobWorker(queue)
+    runs = []
+
+    @worker.handler("largo")
+    async def largo(payload):
+        runs.append(payload)
+        await asyncio.sleep(1.0)  # más de tres concesiones
+
+    queue.enqueue("largo", {"n": 1})
+
+    async def run():
+        first = asyncio.create_task(worker.run_one())
+        await asyncio.sleep(0.6)
+        # Con la concesión vencida y sin heartbeat, este claim se lo llevaría
+        assert await asyncio.to_thread(queue.claim) is None
+        assert await first
+
+    asyncio.run(run())
+    assert runs == [{"n": 1}]
+    assert queue.stats()["done"] == 1
+
+
+def test_trabajo_abandonado_se_recupera(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0.05)
+    job_id = queue.enqueue("x", {})
+    assert queue.claim()["id"] == job_id
+    # El proceso "cae": nadie renueva la concesión
+    asyncio.run(asyncio.sleep(0.1))
+    again = queue.claim()
+    assert again["id"] == job_id and again["attempts"] == 2
+
+
+def test_endpoints_encolan_fuera_del_event_loop(api, monkeypatch):
+    loop_thread = api.client.portal.call(threading.get_ident)
+    enqueue = api.main.job_queue.enqueue
+    threads = []
+
+    def spy(kind, payload, **kwargs):
+        threads.append(threading.get_ident())
+        return enqueue(kind, payload, **kwargs)
+
+    monkeypatch.setattr(api.main.job_queue, "enqueue", spy)
+    api.supabase.tables["imagenes"] = [{"id": 1, "filename": "1.jpg", "planta_id": "Quercus", "estado": "publicada"}]
+    api.client.post("/reidentificar/1").raise_for_status()
+    api.client.delete("/delete-image/1").raise_for_status()
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+def test_delete_image_inexistente_responde_404(api):
+    response = api.client.delete("/delete-image/99")
+    assert response.status_code == 404
+    assert ("imagenes", "delete") not in api.supabase.calls
@@ -0,0 +1,69 @@
+"""🔌 Reconnector: reintentos al conectar y reconexión cuando se cae la conexión"""
+import asyncio
+
+from lifecycle import Reconnector
+
+
+class FakeDependency:
+    def __init__(self, fail_connects: int = 0):
+        self.fail_connects = fail_connects
+        self.clients = 0
+        self.installed = []
+        self.down = False
+
+    async def connect(self):
+        if self.down:
+            raise ConnectionError("sin conexión")
+        if self.fail_connects:
+            self.fail_connects -= 1
+            raise ConnectionError("sin conexión")
+        self.clients += 1
+        return f"cliente-{self.clients}"
+
+    async def on_connect(self, client):
+        self.installed.append(client)
+
+    async def check(self, client):
+        if self.down:
+            raise ConnectionError("conexión perdida")
+
+
+def test_reintenta_hasta_conectar():
+    dependency = FakeDependency(fail_connects=2)
+    connector = Reconnector("db", dependency.connect, dependency.on_connect, initial_delay=0.01)
+
+    async def run():
+        connector.start()
+        assert await connector.wait(timeout=2)
+        await connector.stop()
+
+    asyncio.run(run())
+    assert connector.attempts == 3
+    assert dependency.installed == ["cliente-1"]
+
+
+def test_reconecta_tras_fallos_seguidos_de_la_comprobacion():
+    dependency = FakeDependency()
+    connector = Reconnector(
+        "db", dependency.connect, dependency.on_connect, check=dependency.check,
+        initial_delay=0.01, check_interval=0.01, failure_threshold=3,
+    )
+
+    async def run():
+        connector.start()
+        assert await connector.wait(timeout=1)
+        # La vigilancia sigue en marcha mientras la conexión responde
+        await asyncio.sleep(0.05)
+        assert connector.running and connector.disconnects == 0
+        dependency.down = True
+        while connector.connected:
+            await asyncio.sleep(0.01)
+        # Hasta que haya cliente nuevo, el anterior sigue instalado
+        assert dependency.installed == ["cliente-1"]
+        dependency.down = False
+        assert await connector.wait(timeout=1)
+        await connector.stop()
+
+    asyncio.run(run())
+    assert connector.disconnects == 1
+    assert dependency.installed == ["cliente-1", "cliente-2"]
@@ -0,0 +1,40 @@
+"""🚦 Límite de intentos de login: 429 con Retry-After antes de tocar la base de datos"""
+from rate_limit import TokenBucketLimiter
+
+
+def login(client, usuario="admin"):
+    return client.post("/login", data={"nombre_usuario": usuario, "contraseña": "incorrecta"})
+
+
+def test_token_bucket_calcula_la_espera():
+    limiter = TokenBucketLimiter(rate=0.5, capacity=2)
+    assert limiter.allow("k") == (True, 0.0)
+    assert limiter.allow("k") == (True, 0.0)
+    allowed, retry_after = limiter.allow("k")
+    assert not allowed and 0 < retry_after <= 2.0
+    limiter.reset("k")
+    assert limiter.allow("k")[0]
+
+
+def test_limite_por_usuario_responde_429_con_retry_after(api):
+    intentos = int(api.main.LOGIN_ATTEMPTS_PER_MINUTE_USER)
+    for _ in range(intentos):
+        assert login(api.client).status_code == 401
+    consultas = len(api.supabase.calls)
+
+    response = login(api.client)
+    assert response.status_code == 429
+    # Una ficha cada 60/intentos segundos, redondeado hacia arriba
+    assert 1 <= int(response.headers["Retry-After"]) <= 60 // intentos + 1
+    assert len(api.supabase.calls) == consultas
+    # Otro usuario desde la misma IP aún puede intentarlo
+    assert login(api.client, "otro").status_code == 401
+
+
+def test_limite_por_ip_cubre_todos_los_usuarios(api):
+    intentos = int(api.main.LOGIN_ATTEMPTS_PER_MINUTE_IP)
+    for n in range(intentos):
+        assert login(api.client, f"usuario{n}").status_code == 401
+    response = login(api.client, "nuevo")
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
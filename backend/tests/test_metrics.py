@@ -0,0 +1,22 @@
+"""📈 Histogramas de latencia"""
+import json
+
+from metrics import LATENCY_BUCKETS, LatencyHistogram
+
+
+def test_cuantiles_por_bucket():
+    histogram = LatencyHistogram()
+    for value in (0.003, 0.02, 0.02, 0.4):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 0.025
+    assert histogram.quantile(0.99) == 0.5
+
+
+def test_desbordamiento_devuelve_el_ultimo_limite_finito():
+    histogram = LatencyHistogram()
+    histogram.observe(12.0, error=True)  # más que DB_TIMEOUT
+    assert histogram.quantile(0.99) == LATENCY_BUCKETS[-1]
+    snapshot = histogram.snapshot()
+    assert snapshot["p99_ms"] == LATENCY_BUCKETS[-1] * 1000
+    assert snapshot["buckets"]["+Inf"] == 1
+    json.dumps(snapshot, allow_nan=False)
@@ -0,0 +1,119 @@
+"""📬 Notificaciones: registro por lotes y despacho sin duplicados ni cabeceras inyectadas"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from notifications import DeliveryStore, NotificationDispatcher, RenderedMessage, SendError
+from rate_limit import TokenBucketLimiter
+
+EMAILS = [f"s{i}@mail.com" for i in range(40)]
+
+
+class RecordingPool:
+    """Pool SMTP falso: guarda cada envío"""
+
+    size = 4
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, sender, recipient, raw):
+        time.sleep(0.002)
+        with self._lock:
+            self.sent.append((recipient, raw))
+
+
+async def pages(emails, size=10):
+    for start in range(0, len(emails), size):
+        yield emails[start:start + size]
+
+
+def make_dispatcher(tmp_path, pool):
+    store = DeliveryStore(str(tmp_path / "notify.db"))
+    return store, NotificationDispatcher(store, pool, limiter=TokenBucketLimiter(10_000, 10_000))
+
+
+def test_dos_despachos_simultaneos_no_duplican(tmp_path):
+    pool = RecordingPool()
+    store, dispatcher = make_dispatcher(tmp_path, pool)
+    store.register("imagen-1")
+    message = RenderedMessage("Nueva noticia", "Hola")
+
+    async def run():
+        await asyncio.gather(
+            dispatcher.dispatch("imagen-1", message, pages(EMAILS)),
+            dispatcher.dispatch("imagen-1", message, pages(EMAILS)),
+        )
+
+    asyncio.run(run())
+    recipients = [recipient for recipient, _ in pool.sent]
+    assert sorted(recipients) == sorted(EMAILS)
+    assert store.counts("imagen-1")["sent"] == len(EMAILS)
+
+
+def test_reenvio_no_repite_destinatarios(tmp_path):
+    pool = RecordingPool()
+    store, dispatcher = make_dispatcher(tmp_path, pool)
+    message = RenderedMessage("Aviso", "Hola")
+    asyncio.run(dispatcher.dispatch("general-1", message, pages(EMAILS[:5])))
+    asyncio.run(dispatcher.dispatch("general-1", message, pages(EMAILS)))
+    assert len(pool.sent) == len(EMAILS)
+
+
+@pytest.mark.parametrize("email", ["ana@mail.com\r\nBcc: todos@example.com", "ana@mail.com\nX: y", "", "sin-dominio"])
+def test_to_rechaza_direcciones_no_validas(email):
+    with pytest.raises(SendError) as error:
+        RenderedMessage("Aviso", "Hola").for_recipient(email, "k")
+    assert error.value.permanent
+
+
+def test_direccion_con_salto_de_linea_queda_fallida(tmp_path):
+    pool = RecordingPool()
+    store, dispatcher = make_dispatcher(tmp_path, pool)
+    bad = "ana@mail.com\r\nBcc: todos@example.com"
+    asyncio.run(dispatcher.dispatch("general-2", RenderedMessage("Aviso", "Hola"), pages(["ok@mail.com", bad])))
+    assert [recipient for recipient, _ in pool.sent] == ["ok@mail.com"]
+    assert store.counts("general-2")["failed"] == 1
+
+
+def test_cabecera_to():
+    raw = RenderedMessage("Aviso", "Hola").for_recipient("ana@mail.com", "k")
+    assert raw.startswith(b"To: ana@mail.com\r\nMessage-ID: <")
+
+
+def test_register_many_solo_devuelve_las_nuevas(tmp_path):
+    store = DeliveryStore(str(tmp_path / "notify.db"))
+    assert store.register("imagen-1")
+    assert store.register_many(["imagen-1", "imagen-2", "imagen-3"]) == ["imagen-2", "imagen-3"]
+    assert store.register_many(["imagen-2"]) == []
+    assert store.status("imagen-3") == "queued"
+
+
+def test_publicar_noticias_en_lote_encola_un_aviso_por_imagen(api, monkeypatch):
+    loop_thread = api.client.portal.call(threading.get_ident)
+    threads = []
+    for store, name in ((api.main.delivery_store, "register_many"), (api.main.job_queue, "enqueue_many")):
+        def spy(*args, original=getattr(store, name)):
+            threads.append(threading.get_ident())
+            return original(*args)
+
+        monkeypatch.setattr(store, name, spy)
+
+    api.supabase.tables["imagenes"] = [
+        {"id": n, "filename": f"{n}.jpg", "planta_id": "Quercus", "estado": "pendiente",
+         "tipo_publicacion": "noticias" if n < 4 else "galeria"}
+        for n in range(1, 5)
+    ]
+    lote = {"ids": [1, 2, 3, 4], "nuevo_estado": "publicada"}
+    api.client.put("/cambiar-estado-lote", json=lote).raise_for_status()
+    # Volver a publicar no repite avisos
+    api.client.put("/cambiar-estado-lote", json=lote).raise_for_status()
+
+    jobs = api.main.job_queue.list(status="queued", limit=10)
+    assert sorted(j["payload"]["image_id"] for j in jobs) == [1, 2, 3]
+    assert loop_thread not in threads
+    # Primer lote: registro + encolado; segundo: solo el registro (sin claves nuevas)
+    assert len(threads) == 3
@@ -0,0 +1,125 @@
+"""🌿 PlantNetClient contra un servidor simulado (httpx.MockTransport)"""
+import asyncio
+
+import httpx
+import pytest
+
+from plantnet import PlantNetClient, PlantNetError
+
+IMAGE = ("hoja.jpg", b"\xff\xd8\xff", "image/jpeg")
+
+
+def make_client(handler, **kwargs) -> PlantNetClient:
+    kwargs.setdefault("backoff_base", 0.001)
+    kwargs.setdefault("backoff_max", 0.01)
+    return PlantNetClient("test-key", base_url="https://plantnet.test/identify",
+                          transport=httpx.MockTransport(handler), **kwargs)
+
+
+def identify(client: PlantNetClient, **kwargs) -> dict:
+    async def run():
+        try:
+            return await client.identify([IMAGE], **kwargs)
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+def test_reintenta_5xx_y_devuelve_resultado():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503, json={"error": "ocupado"})
+        return httpx.Response(200, json={"results": [{"score": 0.9}]})
+
+    result = identify(make_client(handler, max_retries=2))
+    assert result == {"results": [{"score": 0.9}]}
+    assert len(calls) == 3
+    assert calls[0].url.params["api-key"] == "test-key"
+
+
+def test_429_agota_reintentos_con_retry_after():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429, headers={"Retry-After": "0"}, json={"error": "cuota"})
+
+    with pytest.raises(PlantNetError) as error:
+        identify(make_client(handler, max_retries=2))
+    assert error.value.status_code == 429
+    assert error.value.detail == "cuota"
+    assert len(calls) == 3
+
+
+def test_error_no_reintentable_falla_al_primer_intento():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, text="imagen no válida")
+
+    with pytest.raises(PlantNetError) as error:
+        identify(make_client(handler, max_retries=2))
+    assert error.value.status_code == 400
+    assert len(calls) == 1
+
+
+def test_404_es_sin_resultados():
+    result = identify(make_client(lambda request: httpx.Response(404, json={"error": "Species not found"})))
+    assert result == {"results": []}
+
+
+def test_error_de_red_reintenta_y_devuelve_502():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("sin red", request=request)
+
+    with pytest.raises(PlantNetError) as error:
+        identify(make_client(handler, max_retries=1))
+    assert error.value.status_code == 502
+    assert len(calls) == 2
+
+
+def test_respuesta_200_no_json_reintenta_y_devuelve_502():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, text='{"results": [', headers={"Content-Type": "application/json"})
+
+    with pytest.raises(PlantNetError) as error:
+        identify(make_client(handler, max_retries=1))
+    assert error.value.status_code == 502
+    assert len(calls) == 2
+
+
+def test_respuesta_200_truncada_se_recupera_al_reintentar():
+    bodies = iter([b"<html>proxy</html>", b'{"results": []}'])
+    result = identify(make_client(lambda request: httpx.Response(200, content=next(bodies))))
+    assert result == {"results": []}
+
+
+def test_semaforo_limita_llamadas_concurrentes():
+    state = {"in_flight": 0, "max": 0}
+
+    async def handler(request):
+        state["in_flight"] += 1
+        state["max"] = max(state["max"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return httpx.Response(200, json={"results": []})
+
+    async def run():
+        client = make_client(handler, max_concurrency=2)
+        try:
+            await asyncio.gather(*(client.identify([IMAGE]) for _ in range(8)))
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert state["max"] == 2
@@ -0,0 +1,39 @@
+"""📦 Caché de respuestas: ETag / If-None-Match → 304 e invalidación con cada escritura"""
+
+
+def imagen(image_id, planta_id="Quercus"):
+    return {"id": image_id, "filename": f"{image_id}.jpg", "planta_id": planta_id, "estado": "publicada",
+            "url_imagen": f"http://test/media/public/{image_id}.jpg", "fecha_subida": f"2025-01-0{image_id}T10:00:00"}
+
+
+def test_if_none_match_responde_304_sin_consultar(api):
+    api.supabase.tables["imagenes"] = [imagen(1), imagen(2, "Espeletia")]
+    first = api.client.get("/list-images")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "public, no-cache"
+    consultas = len(api.supabase.calls)
+
+    for tag in (etag, f"W/{etag}", f'"otro", {etag}', "*"):
+        response = api.client.get("/list-images", headers={"If-None-Match": tag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+    assert len(api.supabase.calls) == consultas
+
+    stale = api.client.get("/list-images", headers={"If-None-Match": '"otro"'})
+    assert stale.status_code == 200 and stale.json() == first.json()
+
+
+def test_escritura_cambia_el_etag(api):
+    api.supabase.tables["imagenes"] = [imagen(1), imagen(2, "Espeletia")]
+    first = api.client.get("/plantas")
+    etag = first.headers["ETag"]
+    last_modified = first.headers["Last-Modified"]
+    assert api.client.get("/plantas", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    api.client.delete("/delete-image/2").raise_for_status()
+    response = api.client.get("/plantas", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["plantas"] == ["Quercus"]
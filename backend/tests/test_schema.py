@@ -0,0 +1,48 @@
+"""🧩 Detección de columnas opcionales: un select para todo el esquema"""
+from fake_supabase import FakeQuery, FakeSupabase
+from schema import OPTIONAL_IMAGE_COLUMNS, SchemaCapabilities
+
+BASE_COLUMNS = ("id", "filename", "planta_id", "url_imagen", "estado", "fecha_subida")
+
+
+def test_esquema_completo_en_una_consulta():
+    client = FakeSupabase(columns={"imagenes": BASE_COLUMNS + OPTIONAL_IMAGE_COLUMNS})
+    schema = SchemaCapabilities()
+    assert all(schema.detect(client).values())
+    assert client.calls == [("imagenes", "select")]
+    assert schema.stats()["detect_queries"] == 1
+
+
+def test_cada_columna_que_falta_cuesta_una_consulta():
+    client = FakeSupabase(columns={"imagenes": BASE_COLUMNS + ("description", "lat", "lng", "tipo_publicacion")})
+    schema = SchemaCapabilities()
+    columns = schema.detect(client)
+    assert schema.missing() == ("variantes", "phash", "duplicado_de")
+    assert list(columns) == list(OPTIONAL_IMAGE_COLUMNS)
+    assert len(client.calls) == 4 == schema.stats()["detect_queries"]
+
+
+def test_error_sin_nombre_de_columna_prueba_una_por_una(monkeypatch):
+    client = FakeSupabase(columns={"imagenes": BASE_COLUMNS + ("lat", "lng")})
+    schema = SchemaCapabilities(optional_columns=("lat", "lng", "phash"))
+    execute = FakeQuery.execute
+
+    def sin_nombre(query):
+        try:
+            return execute(query)
+        except Exception:
+            raise Exception("{'code': '42703'}")
+
+    monkeypatch.setattr(FakeQuery, "execute", sin_nombre)
+    assert schema.detect(client) == {"lat": True, "lng": True, "phash": False}
+    # Un intento conjunto + uno por columna
+    assert schema.stats()["detect_queries"] == 4
+
+
+def test_build_payload_cuenta_escrituras_y_viajes_ahorrados():
+    schema = SchemaCapabilities()
+    schema.detect(FakeSupabase(columns={"imagenes": BASE_COLUMNS + ("lat", "lng")}))
+    assert schema.build_payload({"planta_id": "Quercus", "lat": 5.3, "phash": "ab"}) == {"planta_id": "Quercus", "lat": 5.3}
+    assert schema.build_payload({"planta_id": "Quercus"}) == {"planta_id": "Quercus"}
+    stats = schema.stats()
+    assert (stats["writes"], stats["round_trips_saved"]) == (2, 1)
@@ -0,0 +1,46 @@
+"""🗺️ Índice espacial: se mantiene con cada escritura sin recargar la tabla"""
+from spatial_index import SpatialIndex
+
+BBOX = {"min_lat": 5.0, "min_lng": -74.0, "max_lat": 5.6, "max_lng": -73.5}
+
+
+def imagen(image_id, estado="publicada", lat=5.3, lng=-73.8, **extra):
+    return {"id": image_id, "filename": f"{image_id}.jpg", "planta_id": "Quercus humboldtii",
+            "url_imagen": f"http://test/media/public/{image_id}.jpg", "estado": estado,
+            "fecha_subida": f"2025-01-0{image_id}T10:00:00", "lat": lat, "lng": lng, **extra}
+
+
+def puntos(client) -> set:
+    response = client.get("/map-clusters", params={**BBOX, "zoom": 16})
+    assert response.status_code == 200
+    return {f["id"] for f in response.json()["features"]}
+
+
+def test_upsert_mueve_y_quita_puntos():
+    index = SpatialIndex()
+    index.load([imagen(1), imagen(2, estado="pendiente")])
+    assert len(index) == 1
+    index.upsert(imagen(2))
+    index.upsert(imagen(1, lat=5.31, lng=-73.81))
+    features = {f["id"]: f for f in index.query(5.0, -74.0, 5.6, -73.5, 16)}
+    assert set(features) == {1, 2} and features[1]["lat"] == 5.31
+    # Deja de estar publicada o pierde coordenadas: sale del índice
+    index.upsert(imagen(1, estado="rechazada"))
+    index.upsert(imagen(2, lat=None))
+    assert len(index) == 0
+
+
+def test_escrituras_actualizan_el_mapa_sin_recargar(api):
+    api.supabase.tables["imagenes"] = [imagen(1), imagen(2, estado="pendiente"), imagen(3)]
+    assert puntos(api.client) == {1, 3}
+    selects = api.supabase.calls.count(("imagenes", "select"))
+
+    api.client.put("/cambiar-estado/2", params={"nuevo_estado": "publicada"}).raise_for_status()
+    api.client.put("/cambiar-estado-lote", json={"ids": [3], "nuevo_estado": "rechazada"}).raise_for_status()
+    assert puntos(api.client) == {1, 2}
+
+    api.client.delete("/delete-image/1").raise_for_status()
+    api.client.post("/delete-images", json={"ids": [2]}).raise_for_status()
+    assert puntos(api.client) == set()
+    # Solo los select de las bajas: el índice no se volvió a cargar
+    assert api.supabase.calls.count(("imagenes", "select")) == selects + 2
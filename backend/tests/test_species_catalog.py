@@ -0,0 +1,41 @@
+"""🌿 Catálogo de especies: conteos incrementales en altas, cambios y bajas"""
+from species_catalog import SpeciesCatalog
+
+
+def imagen(image_id, planta_id, estado="publicada", fecha=None):
+    return {"id": image_id, "filename": f"{image_id}.jpg", "planta_id": planta_id, "estado": estado,
+            "fecha_subida": fecha or f"2025-01-{image_id:02d}T10:00:00"}
+
+
+def especies(client) -> dict:
+    response = client.get("/plantas")
+    assert response.status_code == 200
+    return {e["planta_id"]: e for e in response.json()["especies"]}
+
+
+def test_upsert_cambia_de_especie_y_remove_quita_la_vacia():
+    catalog = SpeciesCatalog()
+    catalog.load([imagen(1, "Espeletia"), imagen(2, "Espeletia"), imagen(3, "Quercus")])
+    # Un update sin fecha_subida conserva la fecha conocida
+    catalog.upsert({"id": 2, "planta_id": "Quercus", "estado": "publicada"})
+    catalog.remove(3)
+    por_nombre = {e["planta_id"]: e for e in catalog.species()}
+    assert por_nombre["Espeletia"]["total"] == 1
+    assert por_nombre["Quercus"]["total"] == 1
+    assert por_nombre["Quercus"]["primer_avistamiento"] == "2025-01-02T10:00:00"
+    catalog.remove(2)
+    assert [e["planta_id"] for e in catalog.species(prefix="q")] == []
+
+
+def test_escrituras_actualizan_plantas_sin_recargar(api):
+    api.supabase.tables["imagenes"] = [imagen(1, "Espeletia"), imagen(2, "Espeletia", "pendiente"), imagen(3, "Quercus")]
+    assert {nombre: e["total"] for nombre, e in especies(api.client).items()} == {"Espeletia": 2, "Quercus": 1}
+    selects = api.supabase.calls.count(("imagenes", "select"))
+
+    api.client.put("/editar-imagen/2", params={"nuevo_nombre": "Quercus"}).raise_for_status()
+    api.client.delete("/delete-image/1").raise_for_status()
+    catalogo = especies(api.client)
+    assert set(catalogo) == {"Quercus"}
+    assert catalogo["Quercus"]["total"] == 2
+    assert catalogo["Quercus"]["pendientes"] == 1
+    assert api.supabase.calls.count(("imagenes", "select")) == selects + 1
@@ -0,0 +1,74 @@
+"""🚀 Arranque en frío: presupuesto, importación sin efectos y varios lifespans por proceso"""
+import os
+import subprocess
+import sys
+import textwrap
+
+import check_startup
+from lifecycle import STARTUP_BUDGET_SECONDS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cliente de Supabase mínimo: cualquier consulta devuelve cero filas
+FAKE_SUPABASE = """
+from types import SimpleNamespace
+
+class _Query:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return SimpleNamespace(data=[], count=0)
+
+class FakeSupabase:
+    def table(self, name):
+        return _Query()
+"""
+
+
+def run_child(code: str, cwd) -> subprocess.CompletedProcess:
+    """Ejecuta `code` con main importable, en `cwd` y sin red hacia Supabase"""
+    env = {
+        **os.environ,
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        "SUPABASE_KEY": "test-startup",
+        "STARTUP_CONNECT_WAIT": "0",
+        "STORAGE_BACKEND": "local",
+        "LOG_LEVEL": "ERROR",
+    }
+    script = f"import sys\nsys.path.insert(0, {BACKEND_DIR!r})\n" + textwrap.dedent(code)
+    result = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return result
+
+
+def test_arranque_en_frio_dentro_del_presupuesto():
+    phases = check_startup.measure(STARTUP_BUDGET_SECONDS)
+    for phase in ("import", "ready", "first_request"):
+        assert phases[phase] <= STARTUP_BUDGET_SECONDS, phases
+
+
+def test_importar_main_no_escribe_en_disco(tmp_path):
+    run_child("import main", tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_dos_lifespans_en_el_mismo_proceso(tmp_path):
+    result = run_child(FAKE_SUPABASE + """
+import main
+from fastapi.testclient import TestClient
+
+main.usar_supabase(FakeSupabase())
+for _ in range(2):
+    with TestClient(main.app) as client:
+        ready = client.get("/health/ready", params={"force": "true"}).json()
+        assert ready["dependencies"]["database"]["status"] == "ok", ready
+        assert ready["dependencies"]["job_queue"]["status"] == "ok", ready
+        hashed = client.portal.call(main.get_password_hash_async, "clave")
+        assert client.portal.call(main.verify_password_async, "clave", hashed)
+print("ok")
+""", tmp_path)
+    assert result.stdout.strip().endswith("ok")
+    # Los almacenes se abrieron en el lifespan, dentro de la carpeta de trabajo
+    assert {"jobs.db", "idempotency.db", "media"} <= set(os.listdir(tmp_path))
@@ -0,0 +1,59 @@
+"""📦 spool_upload: lectura por bloques con límite de tamaño y tipo real por magic bytes"""
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+
+from storage import UploadRejected, spool_upload
+
+
+def imagen(fmt: str = "JPEG") -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (64, 48), (30, 120, 40)).save(out, fmt)
+    return out.getvalue()
+
+
+def spool(data: bytes, directory, **kwargs):
+    upload = UploadFile(io.BytesIO(data), filename="foto.jpg")
+    return asyncio.run(spool_upload(upload, directory=str(directory), chunk_size=32, **kwargs))
+
+
+def test_copia_por_bloques_y_detecta_el_tipo_real(tmp_path):
+    data = imagen("PNG")
+    path, size, content_type, extension = spool(data, tmp_path)
+    # El nombre dice .jpg, pero los magic bytes mandan
+    assert (content_type, extension) == ("image/png", "png")
+    assert size == len(data)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+@pytest.mark.parametrize("data, status_code", [
+    (b"%PDF-1.7\n" + b"x" * 100, 415),
+    (b"GIF89a" + b"\x00" * 100, 415),
+    (b"", 400),
+])
+def test_rechaza_archivos_que_no_son_imagen(tmp_path, data, status_code):
+    with pytest.raises(UploadRejected) as error:
+        spool(data, tmp_path)
+    assert error.value.status_code == status_code
+    assert os.listdir(tmp_path) == []
+
+
+def test_rechaza_al_superar_el_maximo_sin_dejar_archivo(tmp_path):
+    data = imagen()
+    with pytest.raises(UploadRejected) as error:
+        spool(data, tmp_path, max_bytes=len(data) - 1)
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+    assert spool(data, tmp_path, max_bytes=len(data))[1] == len(data)
+
+
+def test_upload_rechazado_no_escribe_en_la_base_de_datos(api):
+    response = api.client.post("/upload", files={"file": ("foto.jpg", b"no es una imagen", "image/jpeg")})
+    assert response.status_code == 415
+    assert ("imagenes", "insert") not in api.supabase.calls
+    assert os.listdir("spool") == []
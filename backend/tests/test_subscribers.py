@@ -0,0 +1,103 @@
+"""📧 Validación de emails, importación CSV y exportación de suscriptores"""
+import csv
+import io
+import json
+import os
+
+import pytest
+
+from subscribers import is_valid_email, normalize_email, validate_row
+
+
+@pytest.mark.parametrize("email", [
+    "ana@mail.com",
+    "ana.maria+plantas@sub.dominio.co",
+    "o'brien@example.org",
+])
+def test_emails_validos(email):
+    assert is_valid_email(email)
+
+
+@pytest.mark.parametrize("email", [
+    "ana@mail.com\r\nBcc: todos@example.com",
+    "ana@mail.com\nX: y",
+    "ana\r@mail.com",
+    "ana@mail.com\x00",
+    "ana\t@mail.com",
+    "Ana <ana@mail.com>",
+    "ana@mail.com (comentario)",
+    "ana maria@mail.com",
+    "ana..maria@mail.com",
+    ".ana@mail.com",
+    "ana@mail",
+    "ana@-mail.com",
+    "ana@mail.c0m",
+    "@mail.com",
+    "ana@",
+    "a" * 250 + "@mail.com",
+])
+def test_emails_no_validos(email):
+    assert not is_valid_email(email)
+
+
+def test_fila_csv_con_salto_de_linea_en_el_email():
+    with pytest.raises(ValueError):
+        validate_row({"nombre": "Ana", "email": "ana@mail.com\r\nBcc: x@y.co"}, "2025-01-01")
+
+
+def test_normaliza_espacios_y_mayusculas():
+    assert normalize_email("  Ana@Mail.COM ") == "ana@mail.com"
+
+
+def importar(client, texto: str):
+    response = client.post("/suscriptores/importar", files={"file": ("suscriptores.csv", texto.encode(), "text/csv")})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_importar_csv_informa_cada_fila_rechazada(api):
+    api.supabase.tables["suscriptores"] = [{"id": 1, "nombre": "Eva", "email": "eva@mail.com", "activo": True}]
+    lineas = importar(api.client, (
+        "Nombre,Email,Activo,Ciudad\n"
+        "Ana,ana@mail.com,si,Bogotá\n"
+        "Luis,no-es-un-email,,\n"
+        "Eva,EVA@mail.com,,\n"
+        "Ana bis,ana@mail.com,,\n"
+        "Juan,juan@mail.com,no,\n"
+    ))
+    assert lineas[-1] == {"done": True, "rows": 5, "inserted": 2, "existing": 1, "failed": 2}
+    assert {(e["line"], e["error"]) for e in lineas if "line" in e} == {
+        (3, "Email no válido"), (5, "Email repetido en el archivo")
+    }
+    nuevos = {r["email"]: r for r in api.supabase.tables["suscriptores"]}
+    assert set(nuevos) == {"eva@mail.com", "ana@mail.com", "juan@mail.com"}
+    assert nuevos["juan@mail.com"]["activo"] is False
+    # Solo se guardan las columnas del import
+    assert "ciudad" not in nuevos["ana@mail.com"]
+    assert os.listdir("spool") == []
+
+
+def test_importar_csv_sin_columnas_obligatorias(api):
+    lineas = importar(api.client, "email\nana@mail.com\n")
+    assert "nombre" in lineas[0]["error"]
+    assert lineas[-1] == {"done": True, "rows": 0, "inserted": 0, "existing": 0, "failed": 0}
+    assert "suscriptores" not in api.supabase.tables
+
+
+@pytest.mark.parametrize("formato", ["csv", "ndjson"])
+def test_exportar_por_paginas(api, monkeypatch, formato):
+    monkeypatch.setattr(api.main, "SUBSCRIBER_EXPORT_PAGE", 2)
+    api.supabase.tables["suscriptores"] = [
+        {"id": n, "nombre": f"S{n}", "email": f"s{n}@mail.com", "fecha_registro": "2025-01-01", "activo": True}
+        for n in range(5, 0, -1)
+    ]
+    response = api.client.get("/suscriptores/exportar", params={"formato": formato})
+    assert response.status_code == 200
+    assert f'.{formato}"' in response.headers["content-disposition"]
+    if formato == "csv":
+        filas = list(csv.DictReader(io.StringIO(response.text)))
+    else:
+        filas = [json.loads(line) for line in response.text.splitlines()]
+    assert [int(f["id"]) for f in filas] == [1, 2, 3, 4, 5]
+    assert api.supabase.calls.count(("suscriptores", "select")) == 3
+    assert api.client.get("/suscriptores/exportar", params={"formato": "xml"}).status_code == 400
@@ -0,0 +1,64 @@
+"""🖼️ Variantes responsivas: tamaños, formatos, orientación EXIF y subida al almacenamiento"""
+import io
+
+import pytest
+from PIL import Image
+
+import thumbnails
+from thumbnails import VARIANT_FORMATS, VARIANT_SIZES, render_variants
+
+# Orientación EXIF 6: la cámara guardó la foto girada 90°
+ORIENTATION = 0x0112
+
+
+def foto(width=1600, height=800, orientation=None) -> bytes:
+    image = Image.new("RGB", (width, height), (30, 120, 40))
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+
+@pytest.fixture
+def sin_pool_de_procesos(monkeypatch):
+    """Pillow corre en el executor por defecto del loop: las pruebas no lanzan procesos"""
+    import main
+    monkeypatch.setattr(thumbnails, "get_pool", lambda: None)
+    monkeypatch.setattr(main, "get_pool", lambda: None)
+
+
+def test_render_aplica_orientacion_y_descarta_exif(tmp_path):
+    src = tmp_path / "foto.jpg"
+    src.write_bytes(foto(orientation=6))
+    out = tmp_path / "out"
+    out.mkdir()
+
+    rendered = render_variants(str(src), str(out))
+    assert set(rendered) == set(VARIANT_SIZES)
+    for variant, size in VARIANT_SIZES.items():
+        assert set(rendered[variant]) == set(VARIANT_FORMATS)
+        for fmt, path in rendered[variant].items():
+            with Image.open(path) as image:
+                assert image.format == VARIANT_FORMATS[fmt][0]
+                # 1600x800 girada queda vertical y encaja en size x size
+                assert image.size == (size // 2, size)
+                assert ORIENTATION not in image.getexif()
+
+
+def test_upload_genera_y_guarda_las_variantes(api, sin_pool_de_procesos):
+    response = api.client.post("/upload", files={"file": ("foto.jpg", foto(), "image/jpeg")},
+                               data={"planta_id": "Espeletia"})
+    assert response.status_code == 200
+    assert api.run_jobs() >= 1
+
+    row = api.supabase.tables["imagenes"][0]
+    variantes = row["variantes"]
+    assert set(variantes) == set(VARIANT_SIZES)
+    for variant in VARIANT_SIZES:
+        for fmt in VARIANT_FORMATS:
+            path = thumbnails.variant_path(row["filename"], variant, fmt)
+            assert variantes[variant][fmt] == api.main.storage.public_url(path)
+            assert (api.media / path).is_file()
+    assert row["phash"]
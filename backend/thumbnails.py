@@ -0,0 +1,93 @@
+"""
+🖼️ Miniaturas y variantes responsivas
+
+- Variantes `thumb` y `medium` en WebP y JPEG, sin metadatos EXIF
+- El trabajo de Pillow corre en un pool de procesos (no retiene el GIL de la API)
+- Las URLs resultantes se guardan en la columna `variantes` de `imagenes`
+"""
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+# Ancho/alto máximo por variante
+VARIANT_SIZES = {
+    "thumb": 320,
+    "medium": 1024,
+}
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def variant_path(filename: str, variant: str, fmt: str) -> str:
+    """Ruta en el almacenamiento de una variante: public/variants/<nombre>_<variante>.<ext>"""
+    stem = filename.rsplit(".", 1)[0]
+    ext = "jpg" if fmt == "jpeg" else fmt
+    return f"public/variants/{stem}_{variant}.{ext}"
+
+
+def all_variant_paths(filename: str) -> List[str]:
+    return [variant_path(filename, v, f) for v in VARIANT_SIZES for f in VARIANT_FORMATS]
+
+
+def render_variants(src_path: str, out_dir: str) -> Dict[str, Dict[str, str]]:
+    """
+    Genera todas las variantes de una imagen (se ejecuta en un proceso del pool).
+    Devuelve {variante: {formato: ruta_local}}.
+    """
+    from PIL import Image, ImageOps
+
+    result: Dict[str, Dict[str, str]] = {}
+    with Image.open(src_path) as original:
+        # Aplicar la orientación EXIF antes de descartar los metadatos
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        for variant, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            result[variant] = {}
+            for fmt, (pil_format, _) in VARIANT_FORMATS.items():
+                out_path = os.path.join(out_dir, f"{variant}.{fmt}")
+                # Al no pasar exif=..., Pillow guarda la imagen sin metadatos
+                resized.save(out_path, pil_format, quality=82, optimize=True)
+                result[variant][fmt] = out_path
+    return result
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def generate_variants(storage, filename: str, src_path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Genera las variantes en el pool de procesos, las sube al almacenamiento
+    y devuelve {variante: {formato: url_pública}}.
+    """
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryDirectory(prefix="variants-") as out_dir:
+        rendered = await loop.run_in_executor(get_pool(), render_variants, src_path, out_dir)
+        urls: Dict[str, Dict[str, str]] = {}
+        for variant, formats in rendered.items():
+            urls[variant] = {}
+            for fmt, local_path in formats.items():
+                path = variant_path(filename, variant, fmt)
+                await asyncio.to_thread(storage.upload, path, local_path, VARIANT_FORMATS[fmt][1])
+                urls[variant][fmt] = storage.public_url(path)
+    return urls